@@ -0,0 +1,62 @@
+"""
+Stage Executor
+
+Chạy các bước blocking (parse, gọi OpenAI, ChromaDB, chấm điểm) của API trong một thread pool
+có giới hạn để event loop không bị chặn, với giới hạn số tác vụ đồng thời riêng cho từng stage.
+"""
+
+import asyncio
+import functools
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class StageExecutor:
+    """Thread pool dùng chung + semaphore theo stage"""
+
+    def __init__(self, max_workers: int, stage_limits: Optional[Dict[str, int]] = None):
+        """
+        Khởi tạo StageExecutor
+
+        Args:
+            max_workers: Số thread tối đa của pool
+            stage_limits: Số tác vụ đồng thời tối đa cho từng stage (stage không có trong dict
+                chỉ bị giới hạn bởi max_workers)
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="api-stage")
+        self.stage_limits = dict(stage_limits or {})
+        # Semaphore gắn với event loop, tạo riêng cho mỗi loop (ví dụ: mỗi TestClient)
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = \
+            weakref.WeakKeyDictionary()
+
+    async def run(self, stage: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Chạy func(*args, **kwargs) trong thread pool, chờ nếu stage đã đạt giới hạn
+
+        Args:
+            stage: Tên stage (parse, structuring, embedding, store, scoring)
+            func: Hàm blocking cần chạy
+
+        Returns:
+            Kết quả của func
+        """
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, **kwargs)
+
+        semaphore = self._semaphore(loop, stage)
+        if semaphore is None:
+            return await loop.run_in_executor(self.executor, call)
+
+        async with semaphore:
+            return await loop.run_in_executor(self.executor, call)
+
+    def _semaphore(self, loop: asyncio.AbstractEventLoop, stage: str) -> Optional[asyncio.Semaphore]:
+        limit = self.stage_limits.get(stage)
+        if not limit:
+            return None
+
+        semaphores = self._semaphores.setdefault(loop, {})
+        if stage not in semaphores:
+            semaphores[stage] = asyncio.Semaphore(limit)
+        return semaphores[stage]
@@ -0,0 +1,159 @@
+"""
+Job Runner
+
+Chạy các job xử lý nền (POST /jobs/cv) trên một thread pool, ghi thời gian từng stage vào
+JobStore và gọi callback URL (nếu có) khi job kết thúc.
+
+Mỗi JobRunner (một process API) là một owner: job chỉ chạy sau khi claim thành công, và lease
+của các job đang chạy được gia hạn định kỳ để worker khác không xếp lại job đó.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Set
+
+import requests
+
+from app.services.job_store import JobStore
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimer:
+    """Đo thời gian (ms) từng stage của một job và lưu lại sau mỗi stage"""
+
+    def __init__(self, on_update: Optional[Callable[[Dict[str, float]], None]] = None):
+        self.timings: Dict[str, float] = {}
+        self._on_update = on_update
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round((time.perf_counter() - start) * 1000, 2)
+            if self._on_update:
+                self._on_update(dict(self.timings))
+
+
+# pipeline(job_id, payload, filename, timer) -> result (dict JSON-serializable)
+# Job có thể chạy lại sau khi khởi động lại, pipeline cần idempotent theo job_id
+JobPipeline = Callable[[str, bytes, Optional[str], StageTimer], Dict[str, Any]]
+
+
+class JobRunner:
+    """Thread pool chạy job theo job_id đã lưu trong JobStore"""
+
+    def __init__(
+        self,
+        job_store: JobStore,
+        pipelines: Dict[str, JobPipeline],
+        workers: int = 2,
+        callback_timeout: float = 10.0,
+        lease_seconds: float = 60.0
+    ):
+        """
+        Khởi tạo JobRunner
+
+        Args:
+            job_store: Kho trạng thái job
+            pipelines: Hàm xử lý theo loại job (kind)
+            workers: Số job chạy đồng thời
+            callback_timeout: Timeout (giây) khi gọi callback URL
+            lease_seconds: Job running không được gia hạn trong khoảng này được coi là của worker
+                đã dừng (lease được gia hạn mỗi lease_seconds / 3)
+        """
+        self.job_store = job_store
+        self.pipelines = pipelines
+        self.callback_timeout = callback_timeout
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="api-job")
+
+        self._running: Set[str] = set()
+        self._running_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._lease_thread = threading.Thread(target=self._renew_leases, name="api-job-lease", daemon=True)
+        self._lease_thread.start()
+
+    def submit(self, job_id: str) -> None:
+        self.executor.submit(self._run, job_id)
+
+    def resume_unfinished(self) -> int:
+        """
+        Xếp lại các job queued và job running đã hết lease (worker đã dừng), trả về số job
+        được xếp lại. Job cũng được worker khác xếp lại chỉ chạy ở worker claim được trước.
+        """
+        job_ids = self.job_store.requeue_unfinished(self.lease_seconds)
+        for job_id in job_ids:
+            self.submit(job_id)
+        if job_ids:
+            logger.info(f"Đã xếp lại {len(job_ids)} job chưa hoàn thành")
+        return len(job_ids)
+
+    def _run(self, job_id: str) -> None:
+        job = self.job_store.get_job(job_id)
+        if job is None:
+            logger.warning(f"Job {job_id} không tồn tại")
+            return
+
+        if not self.job_store.claim_job(job_id, self.owner):
+            logger.info(f"Job {job_id} đã được worker khác nhận hoặc đã kết thúc")
+            return
+
+        with self._running_lock:
+            self._running.add(job_id)
+        try:
+            pipeline = self.pipelines.get(job["kind"])
+            payload = self.job_store.get_payload(job_id)
+            timer = StageTimer(lambda timings: self.job_store.save_timings(job_id, timings))
+
+            try:
+                if pipeline is None:
+                    raise ValueError(f"Loại job không được hỗ trợ: {job['kind']}")
+                if payload is None:
+                    raise ValueError("Job không còn dữ liệu đầu vào")
+
+                start = time.perf_counter()
+                result = pipeline(job_id, payload, job["filename"], timer)
+                timer.timings["total"] = round((time.perf_counter() - start) * 1000, 2)
+                self.job_store.mark_succeeded(job_id, result, timer.timings)
+            except Exception as e:
+                logger.error(f"Job {job_id} thất bại: {str(e)}")
+                self.job_store.mark_failed(job_id, str(e), timer.timings)
+        finally:
+            with self._running_lock:
+                self._running.discard(job_id)
+
+        if job["callback_url"]:
+            self._send_callback(job_id, job["callback_url"])
+
+    def _renew_leases(self) -> None:
+        """Thread nền: gia hạn lease của các job đang chạy trong process này"""
+        while not self._stopped.wait(self.lease_seconds / 3):
+            with self._running_lock:
+                job_ids = list(self._running)
+            try:
+                self.job_store.renew_leases(job_ids, self.owner)
+            except Exception as e:
+                logger.warning(f"Không thể gia hạn lease job: {str(e)}")
+
+    def _send_callback(self, job_id: str, callback_url: str) -> None:
+        """Gửi trạng thái cuối của job tới callback URL (lỗi callback không ảnh hưởng job)"""
+        job = self.job_store.get_job(job_id)
+        job.pop("callback_url", None)
+        try:
+            response = requests.post(callback_url, json=job, timeout=self.callback_timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logger.warning(f"Không thể gọi callback cho job {job_id}: {str(e)}")
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._stopped.set()
+        self.executor.shutdown(wait=wait)
@@ -1,17 +1,32 @@
 import uuid
-import tempfile
 import os
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
+import logging
+import asyncio
+import json
+from typing import Any, Dict, List, Optional
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from openai import OpenAI
 
 from core.config import settings
-from core.schemas import StructuredData, ScoreResponse, ProcessResponse, JDInput, ScoreBreakdown
+from core.schemas import (
+    StructuredData, ScoreResponse, ProcessResponse, JDInput, ScoreBreakdown,
+    RankResponse, RankedCandidate, JobSubmitResponse, JobStatusResponse,
+    BatchFileResult, BatchProcessResponse, MatchBatchRequest, MatchBatchItem, MatchBatchResponse
+)
 from app.services.parser_service import ParserService
 from app.services.structuring_service import StructuringService
-from app.services.embedding_service import EmbeddingService
+from app.services.cache import SQLiteCache
+from app.services.embedding_service import EmbeddingService, EmbeddingCache
 from app.services.vector_store import VectorStoreService
-from app.services.scoring_service import ScoringService
+from app.services.scoring_service import ScoringService, to_percent
+from app.services.scoring_profile import build_scoring_profile, build_scoring_profiles
+from app.services.metadata_filters import DEGREE_LEVELS, build_where
+from app.services.job_store import JobStore
+from app.api.executor import StageExecutor
+from app.api.jobs import JobRunner, StageTimer
+
+logger = logging.getLogger(__name__)
 
 # Khởi tạo FastAPI app
 app = FastAPI(
@@ -24,12 +39,105 @@ app = FastAPI(
 openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
 
 # Khởi tạo các services
-parser_service = ParserService()
-structuring_service = StructuringService(openai_client)
-embedding_service = EmbeddingService(openai_client)
+parser_cache = SQLiteCache(
+    os.path.join(settings.CACHE_DIR, "parsed_text.sqlite3"),
+    max_entries=settings.PARSER_CACHE_MAX_ENTRIES
+) if settings.PARSER_CACHE_ENABLED else None
+parser_service = ParserService(
+    pdf_backend=settings.PDF_PARSER_BACKEND,
+    parallel_workers=settings.PDF_PARALLEL_WORKERS,
+    parallel_min_pages=settings.PDF_PARALLEL_MIN_PAGES,
+    cache=parser_cache,
+    memory_items=settings.PARSER_CACHE_MEMORY_ITEMS
+)
+structuring_cache = SQLiteCache(
+    os.path.join(settings.CACHE_DIR, "structuring.sqlite3"),
+    max_entries=settings.STRUCTURING_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.STRUCTURING_CACHE_TTL_SECONDS
+) if settings.STRUCTURING_CACHE_ENABLED else None
+structuring_service = StructuringService(openai_client, cache=structuring_cache)
+embedding_cache = EmbeddingCache(
+    os.path.join(settings.CACHE_DIR, "embeddings.sqlite3"),
+    memory_items=settings.EMBEDDING_CACHE_MEMORY_ITEMS,
+    max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES
+) if settings.EMBEDDING_CACHE_ENABLED else None
+embedding_service = EmbeddingService(openai_client, cache=embedding_cache)
 vector_store_service = VectorStoreService()
 scoring_service = ScoringService(embedding_service)
 
+# Các bước blocking chạy trong thread pool để không chặn event loop
+stage_executor = StageExecutor(
+    max_workers=settings.API_EXECUTOR_WORKERS,
+    stage_limits={
+        "parse": settings.API_PARSE_CONCURRENCY,
+        "structuring": settings.API_STRUCTURING_CONCURRENCY,
+        "embedding": settings.API_EMBEDDING_CONCURRENCY,
+        "store": settings.API_STORE_CONCURRENCY,
+        "scoring": settings.API_SCORING_CONCURRENCY,
+    }
+)
+
+SUPPORTED_CV_EXTENSIONS = ['.pdf', '.docx']
+
+
+def _run_cv_job(job_id: str, content: bytes, filename: Optional[str], timer: StageTimer) -> Dict[str, Any]:
+    """
+    Pipeline xử lý CV cho job nền (chạy trong thread của JobRunner)
+    
+    CV được lưu với doc_id = job_id: job chạy lại sau khi khởi động lại sẽ ghi đè bản cũ
+    thay vì tạo thêm bản sao.
+    """
+    file_extension = os.path.splitext(filename or "")[1].lower()
+    
+    with timer.stage("parse"):
+        text_content = parser_service.parse_bytes(
+            content,
+            file_extension,
+            max_tokens=settings.PARSER_MAX_TOKENS or None
+        )
+    
+    with timer.stage("structuring"):
+        structured_json = structuring_service.get_structured_data(text_content, StructuredData)
+    
+    with timer.stage("embedding"):
+        embedding = embedding_service.get_embedding(text_content)
+    
+    cv_id = job_id
+    with timer.stage("store"):
+        vector_store_service.add_document(
+            collection_name="cv_collection",
+            doc_id=cv_id,
+            embedding=embedding,
+            metadata=structured_json
+        )
+    
+    with timer.stage("scoring_profile"):
+        _store_scoring_profile("cv_collection", cv_id, structured_json)
+    
+    return {"doc_id": cv_id, "structured_data": structured_json}
+
+
+# Job nền: trạng thái lưu trong SQLite, job chưa xong được xếp lại khi khởi động
+job_store = JobStore(settings.JOB_STORE_PATH)
+job_runner = JobRunner(
+    job_store,
+    pipelines={"cv": _run_cv_job},
+    workers=settings.JOB_WORKERS,
+    callback_timeout=settings.JOB_CALLBACK_TIMEOUT_SECONDS,
+    lease_seconds=settings.JOB_LEASE_SECONDS
+)
+
+
+@app.on_event("startup")
+def resume_jobs():
+    job_runner.resume_unfinished()
+
+
+@app.on_event("shutdown")
+def stop_jobs():
+    # Không chờ job đang chạy: job chưa xong vẫn ở trạng thái queued/running và được xếp lại khi lease hết hạn
+    job_runner.shutdown(wait=False)
+
 
 @app.get("/")
 async def root():
@@ -39,8 +147,14 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "process_cv": "POST /process/cv",
+            "process_cv_stream": "POST /process/cv/stream",
+            "process_cvs": "POST /process/cvs",
             "process_jd": "POST /process/jd",
-            "match": "GET /match/{cv_id}/{jd_id}"
+            "match": "GET /match/{cv_id}/{jd_id}",
+            "match_batch": "POST /match/batch",
+            "rank": "GET /rank/{jd_id}?k=50",
+            "submit_cv_job": "POST /jobs/cv",
+            "job_status": "GET /jobs/{job_id}"
         }
     }
 
@@ -62,62 +176,348 @@ async def process_cv(file: UploadFile = File(...)):
             raise HTTPException(status_code=400, detail="Tên file không được để trống")
         
         file_extension = os.path.splitext(file.filename)[1].lower()
-        if file_extension not in ['.pdf', '.docx']:
+        if file_extension not in SUPPORTED_CV_EXTENSIONS:
             raise HTTPException(
                 status_code=400,
                 detail=f"Định dạng file không được hỗ trợ: {file_extension}. Chỉ hỗ trợ .pdf và .docx"
             )
         
-        # Lưu file tạm thời
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_file_path = tmp_file.name
+        # Đọc nội dung file vào bộ nhớ (không ghi file tạm)
+        content = await file.read()
+        
+        # Bước 1: Parse file để lấy text
+        text_content = await stage_executor.run(
+            "parse",
+            parser_service.parse_bytes,
+            content,
+            file_extension,
+            max_tokens=settings.PARSER_MAX_TOKENS or None
+        )
+        
+        # Bước 2: Trích xuất structured data bằng GPT-4o-mini
+        structured_json = await stage_executor.run(
+            "structuring",
+            structuring_service.get_structured_data,
+            text_content,
+            StructuredData
+        )
+        
+        # Bước 3: Tạo embedding từ text content
+        embedding = await stage_executor.run("embedding", embedding_service.get_embedding, text_content)
+        
+        # Bước 4: Tạo CV ID
+        cv_id = str(uuid.uuid4())
+        
+        # Bước 5: Lưu vào vector store
+        # Metadata sẽ chứa structured_json
+        await stage_executor.run(
+            "store",
+            vector_store_service.add_document,
+            collection_name="cv_collection",
+            doc_id=cv_id,
+            embedding=embedding,
+            metadata=structured_json
+        )
+        
+        # Bước 6: Tính sẵn scoring profile để /match không cần gọi lại embedding
+        await stage_executor.run("embedding", _store_scoring_profile, "cv_collection", cv_id, structured_json)
+        
+        # Parse structured_json thành StructuredData object
+        structured_data = StructuredData(**structured_json)
+        
+        return ProcessResponse(
+            doc_id=cv_id,
+            structured_data=structured_data
+        )
         
-        try:
-            # Bước 1: Parse file để lấy text
-            text_content = parser_service.parse_file(tmp_file_path)
-            
-            # Bước 2: Trích xuất structured data bằng GPT-4o-mini
-            structured_json = structuring_service.get_structured_data(
-                text_content,
-                StructuredData
-            )
-            
-            # Bước 3: Tạo embedding từ text content
-            embedding = embedding_service.get_embedding(text_content)
-            
-            # Bước 4: Tạo CV ID
-            cv_id = str(uuid.uuid4())
-            
-            # Bước 5: Lưu vào vector store
-            # Metadata sẽ chứa structured_json
-            vector_store_service.add_document(
-                collection_name="cv_collection",
-                doc_id=cv_id,
-                embedding=embedding,
-                metadata=structured_json
-            )
-            
-            # Parse structured_json thành StructuredData object
-            structured_data = StructuredData(**structured_json)
-            
-            return ProcessResponse(
-                doc_id=cv_id,
-                structured_data=structured_data
-            )
-            
-        finally:
-            # Xóa file tạm thời
-            if os.path.exists(tmp_file_path):
-                os.remove(tmp_file_path)
-                
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi khi xử lý CV: {str(e)}")
 
 
+@app.post("/process/cv/stream")
+async def process_cv_stream(file: UploadFile = File(...)):
+    """
+    Xử lý CV như /process/cv nhưng trả về Server-Sent Events khi từng stage hoàn tất
+    
+    Events (theo thứ tự): parsed, structured (kèm structured_data), embedded, stored (kèm doc_id).
+    Nếu một stage lỗi, stream gửi event error (kèm stage, detail) rồi kết thúc.
+    
+    Args:
+        file: File CV (PDF hoặc DOCX)
+        
+    Returns:
+        StreamingResponse dạng text/event-stream
+    """
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="Tên file không được để trống")
+    
+    file_extension = os.path.splitext(file.filename)[1].lower()
+    if file_extension not in SUPPORTED_CV_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Định dạng file không được hỗ trợ: {file_extension}. Chỉ hỗ trợ .pdf và .docx"
+        )
+    
+    # Đọc file trước khi trả response (UploadFile có thể bị đóng khi stream bắt đầu)
+    content = await file.read()
+    
+    return StreamingResponse(
+        _process_cv_events(content, file_extension),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Định dạng một Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _process_cv_events(content: bytes, file_extension: str):
+    """Pipeline xử lý CV, yield một SSE event sau mỗi stage"""
+    stage = "parse"
+    try:
+        text_content = await stage_executor.run(
+            "parse",
+            parser_service.parse_bytes,
+            content,
+            file_extension,
+            max_tokens=settings.PARSER_MAX_TOKENS or None
+        )
+        yield _sse_event("parsed", {"characters": len(text_content)})
+        
+        stage = "structuring"
+        structured_json = await stage_executor.run(
+            "structuring",
+            structuring_service.get_structured_data,
+            text_content,
+            StructuredData
+        )
+        structured_data = StructuredData(**structured_json)
+        yield _sse_event("structured", {"structured_data": structured_data.model_dump()})
+        
+        stage = "embedding"
+        embedding = await stage_executor.run("embedding", embedding_service.get_embedding, text_content)
+        yield _sse_event("embedded", {"dimensions": len(embedding)})
+        
+        stage = "store"
+        cv_id = str(uuid.uuid4())
+        await stage_executor.run(
+            "store",
+            vector_store_service.add_document,
+            collection_name="cv_collection",
+            doc_id=cv_id,
+            embedding=embedding,
+            metadata=structured_json
+        )
+        await stage_executor.run("embedding", _store_scoring_profile, "cv_collection", cv_id, structured_json)
+        yield _sse_event("stored", {"doc_id": cv_id})
+        
+    except Exception as e:
+        logger.error(f"Lỗi khi xử lý CV (stream) ở stage {stage}: {str(e)}")
+        yield _sse_event("error", {"stage": stage, "detail": f"Lỗi khi xử lý CV: {str(e)}"})
+
+
+@app.post("/process/cvs", response_model=BatchProcessResponse)
+async def process_cvs(files: List[UploadFile] = File(...)):
+    """
+    Xử lý nhiều CV trong một request
+    
+    Parse song song, structuring với số request đồng thời giới hạn, embedding theo batch
+    và ghi tất cả CV vào vector store trong một lần ghi hàng loạt. Lỗi của từng file không
+    làm hỏng cả batch.
+    
+    Args:
+        files: Các file CV (PDF hoặc DOCX)
+        
+    Returns:
+        BatchProcessResponse chứa doc_id hoặc lỗi của từng file (theo thứ tự upload)
+    """
+    if len(files) > settings.API_BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Tối đa {settings.API_BATCH_MAX_FILES} file mỗi request, nhận được {len(files)}"
+        )
+    
+    results = [BatchFileResult(filename=file.filename or "") for file in files]
+    
+    def fail(index: int, stage: str, error: str) -> None:
+        results[index].stage = stage
+        results[index].error = error
+    
+    # Kiểm tra định dạng và đọc nội dung file
+    pending: Dict[int, Any] = {}
+    for index, file in enumerate(files):
+        file_extension = os.path.splitext(file.filename or "")[1].lower()
+        if file_extension not in SUPPORTED_CV_EXTENSIONS:
+            fail(index, "validate", f"Định dạng file không được hỗ trợ: {file_extension}. Chỉ hỗ trợ .pdf và .docx")
+            continue
+        pending[index] = (await file.read(), file_extension)
+    
+    # Bước 1: Parse song song (giới hạn bởi stage "parse")
+    outcomes = await asyncio.gather(
+        *[
+            stage_executor.run(
+                "parse",
+                parser_service.parse_bytes,
+                content,
+                file_extension,
+                max_tokens=settings.PARSER_MAX_TOKENS or None
+            )
+            for content, file_extension in pending.values()
+        ],
+        return_exceptions=True
+    )
+    texts: Dict[int, str] = {}
+    for index, outcome in zip(pending, outcomes):
+        if isinstance(outcome, Exception):
+            fail(index, "parse", str(outcome))
+        else:
+            texts[index] = outcome
+    
+    # Bước 2: Structuring, số request đồng thời giới hạn bởi stage "structuring"
+    outcomes = await asyncio.gather(
+        *[
+            stage_executor.run("structuring", structuring_service.get_structured_data, text, StructuredData)
+            for text in texts.values()
+        ],
+        return_exceptions=True
+    )
+    structured: Dict[int, Dict[str, Any]] = {}
+    structured_models: Dict[int, StructuredData] = {}
+    for index, outcome in zip(texts, outcomes):
+        if isinstance(outcome, Exception):
+            fail(index, "structuring", str(outcome))
+            continue
+        # Kiểm tra schema trước khi lưu: file không hợp lệ chỉ lỗi riêng, không làm hỏng cả batch
+        try:
+            structured_models[index] = StructuredData(**outcome)
+            structured[index] = outcome
+        except Exception as e:
+            fail(index, "structuring", f"Structured data không hợp lệ: {str(e)}")
+    
+    if structured:
+        indices = list(structured)
+        structured_jsons = [structured[index] for index in indices]
+        
+        try:
+            # Bước 3: Embedding toàn văn trong một lần gọi batch
+            embeddings = await stage_executor.run(
+                "embedding",
+                embedding_service.get_embeddings_batch,
+                [texts[index] for index in indices]
+            )
+        except Exception as e:
+            for index in indices:
+                fail(index, "embedding", str(e))
+            indices = []
+        
+        if indices:
+            cv_ids = [str(uuid.uuid4()) for _ in indices]
+            try:
+                # Bước 4: Ghi tất cả CV trong một lần ghi hàng loạt
+                await stage_executor.run(
+                    "store",
+                    vector_store_service.upsert_documents,
+                    "cv_collection",
+                    cv_ids,
+                    embeddings,
+                    structured_jsons
+                )
+            except Exception as e:
+                for index in indices:
+                    fail(index, "store", str(e))
+                indices = []
+        
+        if indices:
+            # Bước 5: Scoring profile (batch); lỗi chỉ làm /match tự embed lại khi chấm điểm
+            try:
+                profiles = await stage_executor.run(
+                    "embedding", build_scoring_profiles, structured_jsons, embedding_service
+                )
+                await stage_executor.run(
+                    "store",
+                    vector_store_service.save_scoring_profiles,
+                    "cv_collection",
+                    dict(zip(cv_ids, profiles))
+                )
+            except Exception as e:
+                logger.warning(f"Không thể lưu scoring profile cho batch CV: {str(e)}")
+            
+            for index, cv_id in zip(indices, cv_ids):
+                results[index].doc_id = cv_id
+                results[index].structured_data = structured_models[index]
+    
+    succeeded = sum(1 for result in results if result.doc_id)
+    return BatchProcessResponse(
+        succeeded=succeeded,
+        failed=len(results) - succeeded,
+        results=results
+    )
+
+
+@app.post("/jobs/cv", response_model=JobSubmitResponse, status_code=202)
+async def submit_cv_job(
+    file: UploadFile = File(...),
+    callback_url: Optional[str] = Form(None, description="URL nhận POST trạng thái job khi kết thúc")
+):
+    """
+    Tạo job xử lý CV nền: trả về job_id ngay, pipeline chạy trên worker pool
+    
+    Args:
+        file: File CV (PDF hoặc DOCX)
+        callback_url: URL (http/https) được gọi khi job kết thúc
+        
+    Returns:
+        JobSubmitResponse chứa job_id (theo dõi qua GET /jobs/{job_id})
+    """
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="Tên file không được để trống")
+    
+    file_extension = os.path.splitext(file.filename)[1].lower()
+    if file_extension not in SUPPORTED_CV_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Định dạng file không được hỗ trợ: {file_extension}. Chỉ hỗ trợ .pdf và .docx"
+        )
+    
+    if callback_url and not callback_url.startswith(("http://", "https://")):
+        raise HTTPException(status_code=400, detail="callback_url phải là URL http hoặc https")
+    
+    content = await file.read()
+    job_id = await stage_executor.run(
+        "store",
+        job_store.create_job,
+        "cv",
+        content,
+        filename=file.filename,
+        callback_url=callback_url
+    )
+    job_runner.submit(job_id)
+    
+    return JobSubmitResponse(job_id=job_id, status="queued")
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: str):
+    """
+    Trạng thái job nền
+    
+    Args:
+        job_id: ID của job
+        
+    Returns:
+        JobStatusResponse chứa status, thời gian từng stage (ms) và kết quả/lỗi
+    """
+    job = await stage_executor.run("store", job_store.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Không tìm thấy job với ID: {job_id}")
+    
+    return JobStatusResponse(**job)
+
+
 @app.post("/process/jd", response_model=ProcessResponse)
 async def process_jd(jd_input: JDInput):
     """
@@ -136,25 +536,32 @@ async def process_jd(jd_input: JDInput):
             raise HTTPException(status_code=400, detail="Nội dung Job Description không được để trống")
         
         # Bước 1: Trích xuất structured data bằng GPT-4o-mini
-        structured_json = structuring_service.get_structured_data(
+        structured_json = await stage_executor.run(
+            "structuring",
+            structuring_service.get_structured_data,
             text_content,
             StructuredData
         )
         
         # Bước 2: Tạo embedding từ text content
-        embedding = embedding_service.get_embedding(text_content)
+        embedding = await stage_executor.run("embedding", embedding_service.get_embedding, text_content)
         
         # Bước 3: Tạo JD ID
         jd_id = str(uuid.uuid4())
         
         # Bước 4: Lưu vào vector store
-        vector_store_service.add_document(
+        await stage_executor.run(
+            "store",
+            vector_store_service.add_document,
             collection_name="jd_collection",
             doc_id=jd_id,
             embedding=embedding,
             metadata=structured_json
         )
         
+        # Bước 5: Tính sẵn scoring profile để /match không cần gọi lại embedding
+        await stage_executor.run("embedding", _store_scoring_profile, "jd_collection", jd_id, structured_json)
+        
         # Parse structured_json thành StructuredData object
         structured_data = StructuredData(**structured_json)
         
@@ -183,8 +590,8 @@ async def match_cv_jd(cv_id: str, jd_id: str):
     """
     try:
         # Lấy dữ liệu từ vector store
-        cv_doc = vector_store_service.get_document_by_id("cv_collection", cv_id)
-        jd_doc = vector_store_service.get_document_by_id("jd_collection", jd_id)
+        cv_doc = await stage_executor.run("store", vector_store_service.get_document_by_id, "cv_collection", cv_id)
+        jd_doc = await stage_executor.run("store", vector_store_service.get_document_by_id, "jd_collection", jd_id)
         
         if not cv_doc:
             raise HTTPException(status_code=404, detail=f"Không tìm thấy CV với ID: {cv_id}")
@@ -192,19 +599,28 @@ async def match_cv_jd(cv_id: str, jd_id: str):
         if not jd_doc:
             raise HTTPException(status_code=404, detail=f"Không tìm thấy Job Description với ID: {jd_id}")
         
-        # Chuẩn bị dữ liệu
+        # Chuẩn bị dữ liệu (kèm scoring profile đã tính sẵn lúc ingest, nếu có)
+        cv_profiles = await stage_executor.run(
+            "store", vector_store_service.get_scoring_profiles, "cv_collection", [cv_id]
+        )
+        jd_profiles = await stage_executor.run(
+            "store", vector_store_service.get_scoring_profiles, "jd_collection", [jd_id]
+        )
+        
         cv_data = {
             "embedding": cv_doc["embedding"],
-            "structured_json": cv_doc["metadata"]
+            "structured_json": cv_doc["metadata"],
+            "scoring_profile": cv_profiles.get(cv_id)
         }
         
         jd_data = {
             "embedding": jd_doc["embedding"],
-            "structured_json": jd_doc["metadata"]
+            "structured_json": jd_doc["metadata"],
+            "scoring_profile": jd_profiles.get(jd_id)
         }
         
         # Tính điểm số
-        score_result = scoring_service.calculate_match_score(cv_data, jd_data)
+        score_result = await stage_executor.run("scoring", scoring_service.calculate_match_score, cv_data, jd_data)
         
         # Tạo response
         breakdown = ScoreBreakdown(**score_result["breakdown"])
@@ -220,6 +636,235 @@ async def match_cv_jd(cv_id: str, jd_id: str):
         raise HTTPException(status_code=500, detail=f"Lỗi khi so khớp CV-JD: {str(e)}")
 
 
+@app.post("/match/batch", response_model=MatchBatchResponse)
+async def match_batch(request: MatchBatchRequest):
+    """
+    So khớp một JD với danh sách CV: một lần đọc hàng loạt và một lượt chấm điểm vector hóa
+    
+    Args:
+        request: MatchBatchRequest chứa jd_id, cv_ids và phân trang (offset, limit)
+        
+    Returns:
+        MatchBatchResponse chứa kết quả sắp xếp theo total_score giảm dần
+    """
+    try:
+        cv_ids = list(dict.fromkeys(request.cv_ids))
+        if not cv_ids:
+            raise HTTPException(status_code=400, detail="cv_ids không được để trống")
+        if len(cv_ids) > settings.MATCH_BATCH_MAX_CVS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Tối đa {settings.MATCH_BATCH_MAX_CVS} cv_ids mỗi request, nhận được {len(cv_ids)}"
+            )
+        
+        # Chấm điểm chỉ cần structured data + scoring profile, không cần đọc embeddings
+        jd_docs = await stage_executor.run(
+            "store",
+            vector_store_service.get_documents_by_ids,
+            "jd_collection",
+            [request.jd_id],
+            include_embeddings=False
+        )
+        jd_doc = jd_docs.get(request.jd_id)
+        if not jd_doc:
+            raise HTTPException(status_code=404, detail=f"Không tìm thấy Job Description với ID: {request.jd_id}")
+        
+        cv_docs = await stage_executor.run(
+            "store",
+            vector_store_service.get_documents_by_ids,
+            "cv_collection",
+            cv_ids,
+            include_embeddings=False
+        )
+        scorable_ids = [cv_id for cv_id in cv_ids if cv_id in cv_docs and "hard_skills" in cv_docs[cv_id]["metadata"]]
+        missing_cv_ids = [cv_id for cv_id in cv_ids if cv_id not in scorable_ids]
+        
+        cv_profiles = await stage_executor.run(
+            "store", vector_store_service.get_scoring_profiles, "cv_collection", scorable_ids
+        )
+        jd_profiles = await stage_executor.run(
+            "store", vector_store_service.get_scoring_profiles, "jd_collection", [request.jd_id]
+        )
+        
+        # JD được embed (hoặc lấy từ profile) một lần cho cả lượt chấm điểm
+        jd_data = {
+            "structured_json": jd_doc["metadata"],
+            "scoring_profile": jd_profiles.get(request.jd_id)
+        }
+        score_results = await stage_executor.run(
+            "scoring",
+            scoring_service.score_many,
+            jd_data,
+            [
+                {"structured_json": cv_docs[cv_id]["metadata"], "scoring_profile": cv_profiles.get(cv_id)}
+                for cv_id in scorable_ids
+            ]
+        ) if scorable_ids else []
+        
+        items = [
+            MatchBatchItem(
+                cv_id=cv_id,
+                total_score=to_percent(score_result["total_score"]),
+                breakdown=_to_score_breakdown(score_result["breakdown"])
+            )
+            for cv_id, score_result in zip(scorable_ids, score_results)
+        ]
+        items.sort(key=lambda item: item.total_score, reverse=True)
+        
+        end = request.offset + request.limit if request.limit else None
+        return MatchBatchResponse(
+            jd_id=request.jd_id,
+            total=len(items),
+            offset=request.offset,
+            limit=request.limit,
+            missing_cv_ids=missing_cv_ids,
+            results=items[request.offset:end]
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lỗi khi so khớp hàng loạt: {str(e)}")
+
+
+@app.get("/rank/{jd_id}", response_model=RankResponse)
+async def rank_candidates(
+    jd_id: str,
+    k: int = Query(50, ge=1, le=settings.RANK_MAX_K),
+    min_years: Optional[float] = Query(None, ge=0, description="Số năm kinh nghiệm tối thiểu"),
+    min_degree: Optional[str] = Query(None, description="Trình độ tối thiểu: associate, bachelor, master, doctorate"),
+    languages: Optional[List[str]] = Query(None, description="Mã ngôn ngữ ISO 639-1 bắt buộc, ví dụ: en"),
+    relocation: Optional[bool] = Query(None, description="Yêu cầu sẵn sàng chuyển nơi ở")
+):
+    """
+    Xếp hạng top-k CV cho một Job Description
+    
+    Lấy shortlist CV gần nhất với embedding của JD: không có điều kiện lọc thì brute-force
+    top-k trên embedding matrix (chính xác, không qua index), có điều kiện lọc thì vector search
+    trong ChromaDB (lọc ngay trong index). Sau đó rerank shortlist bằng ScoringService
+    (6 tiêu chí) trong một lần chấm điểm theo batch.
+    
+    Args:
+        jd_id: ID của Job Description
+        k: Số CV trả về
+        min_years: Số năm kinh nghiệm tối thiểu
+        min_degree: Trình độ học vấn tối thiểu
+        languages: Các ngôn ngữ CV bắt buộc phải có
+        relocation: Lọc theo sẵn sàng chuyển nơi ở
+        
+    Returns:
+        RankResponse chứa danh sách CV sắp xếp theo total_score giảm dần
+    """
+    try:
+        if min_degree is not None and min_degree.lower() not in DEGREE_LEVELS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"min_degree không hợp lệ: {min_degree}. Chọn một trong: {', '.join(DEGREE_LEVELS)}"
+            )
+        where = build_where(
+            min_years=min_years,
+            min_degree_level=DEGREE_LEVELS[min_degree.lower()] if min_degree else None,
+            languages=languages,
+            relocation=relocation
+        )
+        
+        jd_doc = await stage_executor.run("store", vector_store_service.get_document_by_id, "jd_collection", jd_id)
+        if not jd_doc:
+            raise HTTPException(status_code=404, detail=f"Không tìm thấy Job Description với ID: {jd_id}")
+        
+        # Bước 1: Lấy shortlist (brute-force trên embedding matrix, hoặc vector search đã lọc theo metadata)
+        shortlist_k = k * settings.RANK_SHORTLIST_MULTIPLIER
+        if where is None:
+            shortlist = await stage_executor.run(
+                "store",
+                vector_store_service.search_embeddings,
+                "cv_collection",
+                jd_doc["embedding"],
+                k=shortlist_k
+            )
+        else:
+            shortlist = await stage_executor.run(
+                "store",
+                vector_store_service.query,
+                "cv_collection",
+                jd_doc["embedding"],
+                k=shortlist_k,
+                where=where
+            )
+        
+        # Bỏ qua CV lưu theo schema cũ (không chấm điểm được)
+        shortlist = [hit for hit in shortlist if "hard_skills" in hit["metadata"]]
+        
+        # Bước 2: Rerank bằng ScoringService
+        cv_profiles = await stage_executor.run(
+            "store", vector_store_service.get_scoring_profiles, "cv_collection", [hit["id"] for hit in shortlist]
+        )
+        jd_profiles = await stage_executor.run(
+            "store", vector_store_service.get_scoring_profiles, "jd_collection", [jd_id]
+        )
+        jd_data = {
+            "embedding": jd_doc["embedding"],
+            "structured_json": jd_doc["metadata"],
+            "scoring_profile": jd_profiles.get(jd_id)
+        }
+        score_results = await stage_executor.run(
+            "scoring",
+            scoring_service.score_many,
+            jd_data,
+            [
+                {"structured_json": hit["metadata"], "scoring_profile": cv_profiles.get(hit["id"])}
+                for hit in shortlist
+            ]
+        )
+        
+        candidates = [
+            RankedCandidate(
+                cv_id=hit["id"],
+                total_score=to_percent(score_result["total_score"]),
+                vector_distance=hit["distance"],
+                breakdown=_to_score_breakdown(score_result["breakdown"])
+            )
+            for hit, score_result in zip(shortlist, score_results)
+        ]
+        candidates.sort(key=lambda candidate: candidate.total_score, reverse=True)
+        
+        return RankResponse(
+            jd_id=jd_id,
+            shortlist_size=len(shortlist),
+            candidates=candidates[:k]
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lỗi khi xếp hạng CV: {str(e)}")
+
+
+def _store_scoring_profile(collection_name: str, doc_id: str, structured_json: Dict[str, Any]) -> None:
+    """
+    Tính và lưu scoring profile của document
+    
+    Profile chỉ là tối ưu hóa: nếu lỗi, /match sẽ tự embed lại các field khi chấm điểm.
+    """
+    try:
+        profile = build_scoring_profile(structured_json, embedding_service)
+        vector_store_service.save_scoring_profile(collection_name, doc_id, profile)
+    except Exception as e:
+        logger.warning(f"Không thể lưu scoring profile cho {doc_id}: {str(e)}")
+
+
+def _to_score_breakdown(breakdown: Dict[str, Any]) -> ScoreBreakdown:
+    """Chuyển breakdown của ScoringService (key theo category, thang 0-1) sang ScoreBreakdown (thang 0-100)"""
+    return ScoreBreakdown(
+        hard_skills_score=to_percent(breakdown.get("hard_skills", 0.0)),
+        work_experience_score=to_percent(breakdown.get("work_experience", 0.0)),
+        responsibilities_achievements_score=to_percent(breakdown.get("responsibilities", 0.0)),
+        soft_skills_score=to_percent(breakdown.get("soft_skills", 0.0)),
+        education_training_score=to_percent(breakdown.get("education", 0.0)),
+        additional_factors_score=to_percent(breakdown.get("additional_factors", 0.0))
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,362 @@
+"""
+Bulk Ingestion CLI
+
+Nạp hàng loạt CV (PDF/DOCX) từ một thư mục vào vector store:
+- Parse file bằng process pool
+- Trích xuất structured data với số request LLM đồng thời có giới hạn
+- Tạo embeddings theo batch
+- Ghi vào VectorStoreService theo batch (một lần upsert cho mỗi batch)
+- Ghi tiến độ vào manifest JSONL để chạy lại tiếp tục từ chỗ bị dừng
+
+Usage:
+    python -m app.ingest <dir> [--manifest ingest_manifest.jsonl] [--batch-size 32]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from openai import OpenAI
+
+from core.config import settings
+from core.schemas import StructuredData
+from app.services.cache import SQLiteCache
+from app.services.embedding_service import EmbeddingService, EmbeddingCache
+from app.services.parser_service import ParserService
+from app.services.scoring_profile import build_scoring_profiles
+from app.services.structuring_service import StructuringService
+from app.services.vector_store import VectorStoreService
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx')
+COLLECTION_NAME = "cv_collection"
+
+# ParserService riêng cho mỗi process worker (khởi tạo lần đầu dùng)
+_worker_parser: Optional[ParserService] = None
+
+
+def _parse_in_worker(path: str, max_tokens: Optional[int]) -> Dict[str, Any]:
+    """
+    Đọc và parse một file trong process worker
+
+    Returns:
+        Dict {"path", "sha256", "text"} hoặc {"path", "error"}
+    """
+    global _worker_parser
+    if _worker_parser is None:
+        parser_cache = SQLiteCache(
+            os.path.join(settings.CACHE_DIR, "parsed_text.sqlite3"),
+            max_entries=settings.PARSER_CACHE_MAX_ENTRIES
+        ) if settings.PARSER_CACHE_ENABLED else None
+        # Không lồng process pool: mỗi worker parse tuần tự một file
+        _worker_parser = ParserService(pdf_backend=settings.PDF_PARSER_BACKEND, cache=parser_cache)
+
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        result = _worker_parser.parse_document(data, os.path.splitext(path)[1], max_tokens=max_tokens)
+        if not result.text.strip():
+            return {"path": path, "error": "Empty content extracted (PDF may be image-based or scanned)"}
+        return {"path": path, "sha256": hashlib.sha256(data).hexdigest(), "text": result.text}
+    except Exception as e:
+        return {"path": path, "error": f"{type(e).__name__}: {str(e)}"}
+
+
+def discover_files(directory: str) -> List[str]:
+    """Tìm toàn bộ file PDF/DOCX trong thư mục (đệ quy), sắp xếp ổn định"""
+    return sorted(
+        str(path) for path in Path(directory).rglob("*")
+        if path.is_file() and path.suffix.lower() in SUPPORTED_EXTENSIONS
+    )
+
+
+def load_completed(manifest_path: str) -> Set[str]:
+    """Đọc manifest, trả về tập file đã ingest thành công (kể cả file trùng nội dung đã bỏ qua)"""
+    completed: Set[str] = set()
+    if not os.path.exists(manifest_path):
+        return completed
+
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Dòng cuối có thể bị ghi dở khi tiến trình bị kill
+                continue
+            if entry.get("status") in ("ok", "skipped"):
+                completed.add(entry["path"])
+    return completed
+
+
+def _batches(items: List[str], size: int) -> Iterator[List[str]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class BulkIngestor:
+    """Pipeline ingest hàng loạt: parse -> structuring -> embedding -> lưu vector store"""
+
+    def __init__(
+        self,
+        structuring_service: StructuringService,
+        embedding_service: EmbeddingService,
+        vector_store_service: VectorStoreService,
+        parse_workers: int = 4,
+        structuring_concurrency: int = 8,
+        batch_size: int = 32,
+        max_tokens: Optional[int] = None
+    ):
+        """
+        Khởi tạo BulkIngestor
+
+        Args:
+            structuring_service: Service trích xuất structured data
+            embedding_service: Service tạo embeddings
+            vector_store_service: Vector store đích
+            parse_workers: Số process parse file
+            structuring_concurrency: Số request structuring (LLM) chạy đồng thời
+            batch_size: Số document mỗi batch (embedding + ghi vector store + checkpoint)
+            max_tokens: Budget text của mỗi CV (None = không giới hạn)
+        """
+        self.structuring_service = structuring_service
+        self.embedding_service = embedding_service
+        self.vector_store_service = vector_store_service
+        self.parse_workers = parse_workers
+        self.structuring_concurrency = structuring_concurrency
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+
+    def run(self, directory: str, manifest_path: str) -> Dict[str, Any]:
+        """
+        Ingest toàn bộ file trong thư mục, bỏ qua file đã có trong manifest
+
+        Returns:
+            Dict thống kê: total, skipped (đã ingest hoặc trùng nội dung), succeeded, failed,
+            elapsed_seconds, docs_per_second
+        """
+        files = discover_files(directory)
+        completed = load_completed(manifest_path)
+        pending = [path for path in files if path not in completed]
+        logger.info(f"Tìm thấy {len(files)} file, {len(completed & set(files))} đã ingest, {len(pending)} cần xử lý")
+
+        stats = {"total": len(files), "skipped": len(files) - len(pending), "succeeded": 0, "failed": 0}
+        status_stats = {"ok": "succeeded", "skipped": "skipped", "error": "failed"}
+        processed = 0
+        start_time = time.perf_counter()
+
+        with ProcessPoolExecutor(
+                max_workers=self.parse_workers,
+                mp_context=multiprocessing.get_context("spawn")
+        ) as parse_pool, \
+                ThreadPoolExecutor(max_workers=self.structuring_concurrency) as structuring_pool, \
+                open(manifest_path, "a", encoding="utf-8") as manifest:
+            batches = list(_batches(pending, self.batch_size))
+            # Parse batch kế tiếp trong lúc batch hiện tại đang structuring/embedding
+            next_parse = self._submit_parse(parse_pool, batches[0]) if batches else []
+
+            for index in range(len(batches)):
+                parse_futures = next_parse
+                next_parse = self._submit_parse(parse_pool, batches[index + 1]) if index + 1 < len(batches) else []
+
+                entries = self._process_batch([future.result() for future in parse_futures], structuring_pool)
+                for entry in entries:
+                    manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                    stats[status_stats[entry["status"]]] += 1
+                processed += len(entries)
+                manifest.flush()
+                os.fsync(manifest.fileno())
+
+                elapsed = time.perf_counter() - start_time
+                logger.info(
+                    f"Batch {index + 1}/{len(batches)}: {processed}/{len(pending)} file "
+                    f"({processed / elapsed:.2f} docs/sec)"
+                )
+
+        elapsed = time.perf_counter() - start_time
+        stats["elapsed_seconds"] = round(elapsed, 2)
+        stats["docs_per_second"] = round(processed / elapsed, 2) if elapsed > 0 else 0.0
+        return stats
+
+    def _submit_parse(self, parse_pool: ProcessPoolExecutor, paths: List[str]) -> List[Future]:
+        return [parse_pool.submit(_parse_in_worker, path, self.max_tokens) for path in paths]
+
+    def _process_batch(self, parsed: List[Dict[str, Any]], structuring_pool: ThreadPoolExecutor) -> List[Dict[str, Any]]:
+        """Structuring, embedding và lưu một batch; trả về các dòng manifest"""
+        entries = [
+            {"path": item["path"], "status": "error", "stage": "parse", "error": item["error"]}
+            for item in parsed if "error" in item
+        ]
+
+        # File trùng nội dung (cùng sha256 -> cùng doc_id) chỉ xử lý một lần; ChromaDB không nhận
+        # doc_id trùng trong một lần upsert
+        documents = []
+        duplicates = []
+        originals: Dict[str, str] = {}
+        for item in parsed:
+            if "error" in item:
+                continue
+            original = originals.setdefault(item["sha256"], item["path"])
+            if original == item["path"]:
+                documents.append(item)
+            else:
+                duplicates.append((item, original))
+
+        entries.extend(self._process_documents(documents, structuring_pool))
+
+        # File trùng lấy kết quả của file gốc: skipped nếu file gốc đã ingest, ngược lại cùng lỗi
+        results = {entry["path"]: entry for entry in entries}
+        for item, original in duplicates:
+            result = results[original]
+            if result["status"] == "ok":
+                entries.append({
+                    "path": item["path"],
+                    "status": "skipped",
+                    "duplicate_of": original,
+                    "doc_id": result["doc_id"],
+                    "sha256": item["sha256"],
+                })
+            else:
+                entries.append({**result, "path": item["path"], "duplicate_of": original})
+        return entries
+
+    def _process_documents(self, documents: List[Dict[str, Any]], structuring_pool: ThreadPoolExecutor) -> List[Dict[str, Any]]:
+        """Structuring, embedding và lưu các document đã parse (không trùng sha256)"""
+        entries: List[Dict[str, Any]] = []
+
+        # Structuring: mỗi document một request LLM, giới hạn bởi structuring_pool
+        structuring_futures = [
+            structuring_pool.submit(self.structuring_service.get_structured_data, doc["text"], StructuredData)
+            for doc in documents
+        ]
+        structured_docs = []
+        for doc, future in zip(documents, structuring_futures):
+            try:
+                structured_json = future.result()
+            except Exception as e:
+                entries.append({"path": doc["path"], "status": "error", "stage": "structuring", "error": str(e)})
+                continue
+            # Kiểm tra schema trước khi lưu: document không hợp lệ chỉ lỗi riêng, không làm hỏng cả batch
+            try:
+                StructuredData(**structured_json)
+            except Exception as e:
+                entries.append({
+                    "path": doc["path"],
+                    "status": "error",
+                    "stage": "structuring",
+                    "error": f"Structured data không hợp lệ: {str(e)}"
+                })
+                continue
+            doc["structured_json"] = structured_json
+            structured_docs.append(doc)
+
+        if not structured_docs:
+            return entries
+
+        try:
+            # Embedding: một lần gọi batch cho toàn văn, một lần cho các list field của scoring profile
+            embeddings = self.embedding_service.get_embeddings_batch([doc["text"] for doc in structured_docs])
+            profiles = build_scoring_profiles([doc["structured_json"] for doc in structured_docs], self.embedding_service)
+        except Exception as e:
+            entries.extend(
+                {"path": doc["path"], "status": "error", "stage": "embedding", "error": str(e)}
+                for doc in structured_docs
+            )
+            return entries
+
+        # ID theo nội dung file: chạy lại cùng file sẽ ghi đè đúng document cũ
+        doc_ids = [str(uuid.uuid5(uuid.NAMESPACE_OID, doc["sha256"])) for doc in structured_docs]
+        try:
+            self.vector_store_service.upsert_documents(
+                COLLECTION_NAME,
+                doc_ids,
+                embeddings,
+                [doc["structured_json"] for doc in structured_docs]
+            )
+            self.vector_store_service.save_scoring_profiles(COLLECTION_NAME, dict(zip(doc_ids, profiles)))
+        except Exception as e:
+            entries.extend(
+                {"path": doc["path"], "status": "error", "stage": "store", "error": str(e)}
+                for doc in structured_docs
+            )
+            return entries
+
+        entries.extend(
+            {"path": doc["path"], "status": "ok", "doc_id": doc_id, "sha256": doc["sha256"]}
+            for doc, doc_id in zip(structured_docs, doc_ids)
+        )
+        return entries
+
+
+def build_ingestor(args: argparse.Namespace) -> BulkIngestor:
+    """Khởi tạo services và BulkIngestor theo cấu hình"""
+    openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
+    structuring_cache = SQLiteCache(
+        os.path.join(settings.CACHE_DIR, "structuring.sqlite3"),
+        max_entries=settings.STRUCTURING_CACHE_MAX_ENTRIES,
+        ttl_seconds=settings.STRUCTURING_CACHE_TTL_SECONDS
+    ) if settings.STRUCTURING_CACHE_ENABLED else None
+    embedding_cache = EmbeddingCache(
+        os.path.join(settings.CACHE_DIR, "embeddings.sqlite3"),
+        memory_items=settings.EMBEDDING_CACHE_MEMORY_ITEMS,
+        max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES
+    ) if settings.EMBEDDING_CACHE_ENABLED else None
+
+    return BulkIngestor(
+        structuring_service=StructuringService(openai_client, cache=structuring_cache),
+        embedding_service=EmbeddingService(openai_client, cache=embedding_cache),
+        vector_store_service=VectorStoreService(persist_directory=args.persist_directory),
+        parse_workers=args.parse_workers,
+        structuring_concurrency=args.structuring_concurrency,
+        batch_size=args.batch_size,
+        max_tokens=settings.PARSER_MAX_TOKENS or None
+    )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Ingest hàng loạt CV (PDF/DOCX) từ thư mục vào vector store")
+    parser.add_argument("directory", help="Thư mục chứa file CV")
+    parser.add_argument("--manifest", help="File manifest JSONL (mặc định: <directory>/ingest_manifest.jsonl)")
+    parser.add_argument("--persist-directory", default="./chroma_db", help="Thư mục ChromaDB")
+    parser.add_argument("--parse-workers", type=int, default=os.cpu_count() or 1, help="Số process parse file")
+    parser.add_argument("--structuring-concurrency", type=int, default=8, help="Số request structuring đồng thời")
+    parser.add_argument("--batch-size", type=int, default=32, help="Số document mỗi batch embedding/ghi")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+
+    args = parse_args(argv)
+    if not os.path.isdir(args.directory):
+        logger.error(f"Thư mục không tồn tại: {args.directory}")
+        return 1
+
+    manifest_path = args.manifest or os.path.join(args.directory, "ingest_manifest.jsonl")
+    stats = build_ingestor(args).run(args.directory, manifest_path)
+
+    logger.info("=" * 80)
+    logger.info(
+        f"Hoàn thành: {stats['succeeded']} thành công, {stats['failed']} lỗi, "
+        f"{stats['skipped']} bỏ qua (đã ingest) / {stats['total']} file"
+    )
+    logger.info(f"Thời gian: {stats['elapsed_seconds']}s, throughput: {stats['docs_per_second']} docs/sec")
+    logger.info(f"Manifest: {manifest_path}")
+    return 0 if stats["failed"] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
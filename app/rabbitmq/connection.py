@@ -20,10 +20,13 @@ class RabbitMQConnection:
         self.connection: Optional[pika.BlockingConnection] = None
         self.channel: Optional[pika.channel.Channel] = None
         
-    def connect(self) -> pika.channel.Channel:
+    def connect(self, prefetch_count: Optional[int] = None) -> pika.channel.Channel:
         """
         Tạo kết nối đến RabbitMQ CloudAMQP
         
+        Args:
+            prefetch_count: Prefetch count cho channel (mặc định: RABBITMQ_PREFETCH_COUNT)
+        
         Returns:
             pika.channel.Channel: Channel để giao tiếp với RabbitMQ
         """
@@ -69,7 +72,7 @@ class RabbitMQConnection:
             self._declare_queues()
             
             # Set QoS (Quality of Service) - prefetch count
-            self.channel.basic_qos(prefetch_count=settings.RABBITMQ_PREFETCH_COUNT)
+            self.channel.basic_qos(prefetch_count=prefetch_count or settings.RABBITMQ_PREFETCH_COUNT)
             
             logger.info(f"Đã kết nối thành công đến RabbitMQ tại {settings.RABBITMQ_HOST}")
             return self.channel
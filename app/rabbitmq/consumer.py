@@ -6,12 +6,20 @@ Thực hiện error handling theo quy trình:
 - Thành công: Gửi kết quả -> ACK
 - Lỗi dữ liệu (JSON sai): Log lỗi -> ACK (bỏ qua tin nhắn lỗi)
 - Lỗi hệ thống (Mất mạng, bug): NACK -> Tin nhắn được re-queue
+
+Chế độ concurrent (RABBITMQ_CONSUMER_WORKERS > 1): mỗi delivery được xử lý trên một
+worker thread; việc gửi response và ACK/NACK được chuyển về connection thread qua
+add_callback_threadsafe (pika BlockingConnection không thread-safe), nhờ vậy connection
+thread vẫn tiếp tục xử lý heartbeat trong lúc các worker đang chạy.
 """
 
+import functools
 import json
 import logging
 import pika
-from typing import Callable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
 from core.config import settings
 from .connection import RabbitMQConnection
 from .producer import RabbitMQProducer
@@ -23,19 +31,36 @@ logger = logging.getLogger(__name__)
 class RabbitMQConsumer:
     """Consumer nhận messages từ Spring Boot"""
     
-    def __init__(self):
+    def __init__(self, worker_count: Optional[int] = None):
+        """
+        Khởi tạo RabbitMQConsumer
+        
+        Args:
+            worker_count: Số message xử lý đồng thời (mặc định: RABBITMQ_CONSUMER_WORKERS).
+                1 = xử lý tuần tự ngay trong callback như trước
+        """
         self.connection_manager = RabbitMQConnection()
         self.producer = RabbitMQProducer()
         self.message_handlers = MessageHandlers()
         self.channel = None
         self.is_consuming = False
+        
+        self.worker_count = max(1, worker_count or settings.RABBITMQ_CONSUMER_WORKERS)
+        self.executor: Optional[ThreadPoolExecutor] = None
+        if self.worker_count > 1:
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.worker_count,
+                thread_name_prefix="rabbitmq-worker"
+            )
     
     def start_consuming(self):
         """Bắt đầu consume messages từ queue"""
         try:
             # Connect to RabbitMQ
             logger.info("Starting RabbitMQ Consumer...")
-            self.channel = self.connection_manager.connect()
+            # Prefetch đủ cho toàn bộ worker pool
+            prefetch_count = max(settings.RABBITMQ_PREFETCH_COUNT, self.worker_count)
+            self.channel = self.connection_manager.connect(prefetch_count=prefetch_count)
             self.producer.connect()
             
             # Set up consumer
@@ -47,6 +72,7 @@ class RabbitMQConsumer:
             
             self.is_consuming = True
             logger.info(f"Consumer đang lắng nghe queue: {settings.RABBITMQ_INPUT_QUEUE}")
+            logger.info(f"Workers: {self.worker_count}, prefetch: {prefetch_count}")
             logger.info("Đang chờ messages từ Spring Boot... (Ctrl+C để dừng)")
             
             # Start consuming
@@ -61,7 +87,7 @@ class RabbitMQConsumer:
     
     def _on_message_callback(self, ch, method, properties, body):
         """
-        Callback xử lý message
+        Callback xử lý message (chạy trên connection thread)
         
         Args:
             ch: Channel
@@ -69,6 +95,67 @@ class RabbitMQConsumer:
             properties: Message properties
             body: Message body
         """
+        delivery_tag = method.delivery_tag
+        
+        if self.executor is None:
+            response_data, ack = self._process_message(properties, body)
+            self._finish_delivery(ch, delivery_tag, response_data, ack)
+            return
+        
+        self.executor.submit(self._process_in_worker, ch, delivery_tag, properties, body)
+    
+    def _process_in_worker(self, ch, delivery_tag, properties, body):
+        """Xử lý message trên worker thread, sau đó chuyển ACK/NACK về connection thread"""
+        try:
+            response_data, ack = self._process_message(properties, body)
+        except BaseException as e:
+            logger.error(f"Critical error trong worker: {str(e)}", exc_info=True)
+            response_data, ack = None, False
+        
+        try:
+            self.connection_manager.connection.add_callback_threadsafe(
+                functools.partial(self._finish_delivery, ch, delivery_tag, response_data, ack)
+            )
+        except Exception as e:
+            # Connection đã đóng: message chưa ACK sẽ được broker re-deliver
+            logger.error(f"Không thể gửi ACK/NACK về connection thread: {str(e)}")
+    
+    def _finish_delivery(self, ch, delivery_tag, response_data: Optional[Dict[str, Any]], ack: bool):
+        """
+        Gửi response (nếu có) và ACK/NACK message (luôn chạy trên connection thread)
+        
+        Args:
+            ch: Channel
+            delivery_tag: Delivery tag của message
+            response_data: Response gửi về Spring Boot, None nếu không gửi
+            ack: True -> ACK, False -> NACK (re-queue)
+        """
+        if response_data is not None:
+            try:
+                self.producer.send_direct_response(response_data)
+            except Exception as e:
+                # Không gửi được kết quả -> NACK để message được xử lý lại
+                logger.error(f"Không thể gửi response: {str(e)}", exc_info=True)
+                ack = False
+        
+        try:
+            if ack:
+                ch.basic_ack(delivery_tag=delivery_tag)
+            else:
+                ch.basic_nack(delivery_tag=delivery_tag, requeue=True)
+                logger.warning("NACK - Message sẽ được re-queue")
+        except Exception as e:
+            logger.error(f"Không thể ACK/NACK message: {str(e)}")
+    
+    def _process_message(self, properties, body) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        Xử lý nội dung message (không gọi API của pika, an toàn khi chạy trên worker thread)
+        
+        Returns:
+            Tuple[response_data, ack]
+            - response_data: Response cần gửi về Spring Boot (None nếu không gửi)
+            - ack: True -> ACK, False -> NACK (re-queue)
+        """
         application_id = None
         
         try:
@@ -91,7 +178,6 @@ class RabbitMQConsumer:
                 error_msg = f"Invalid JSON format: {str(e)}"
                 
                 # Tạo error response theo format mới
-                from datetime import datetime
                 error_response = {
                     "applicationId": application_id,
                     "isSuccess": False,
@@ -101,13 +187,8 @@ class RabbitMQConsumer:
                     "data": None
                 }
                 
-                # Gửi error response
-                self.producer.send_direct_response(error_response)
-                
-                # ACK để bỏ qua message lỗi
-                ch.basic_ack(delivery_tag=method.delivery_tag)
                 logger.info("ACK - Message JSON lỗi đã được bỏ qua")
-                return
+                return error_response, True
             
             # Xử lý message
             try:
@@ -118,59 +199,39 @@ class RabbitMQConsumer:
                 
                 if success:
                     # THÀNH CÔNG -> Gửi kết quả -> ACK
-                    self.producer.send_direct_response(response_data)
-                    ch.basic_ack(delivery_tag=method.delivery_tag)
                     logger.info("ACK - Message đã được xử lý thành công")
-                    
-                else:
-                    # CÓ LỖI
-                    error_message = response_data.get("error", "Unknown error")
-                    
-                    if error_type == "DATA_ERROR":
-                        # LỖI DỮ LIỆU -> Gửi error response -> ACK
-                        self.producer.send_direct_response(response_data)
-                        ch.basic_ack(delivery_tag=method.delivery_tag)
-                        logger.warning(f"ACK - Data error: {error_message}")
-                        
-                    else:
-                        # LỖI HỆ THỐNG -> NACK (re-queue)
-                        logger.error(f"System error: {error_message}")
-                        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
-                        logger.warning("NACK - Message sẽ được re-queue")
+                    return response_data, True
+                
+                # CÓ LỖI
+                error_message = response_data.get("error", "Unknown error")
+                
+                if error_type == "DATA_ERROR":
+                    # LỖI DỮ LIỆU -> Gửi error response -> ACK
+                    logger.warning(f"ACK - Data error: {error_message}")
+                    return response_data, True
+                
+                # LỖI HỆ THỐNG -> NACK (re-queue)
+                logger.error(f"System error: {error_message}")
+                return None, False
                         
             except Exception as e:
-                # LỖI HỆ THỐNG (Code bug, mất mạng) -> NACK
+                # LỖI HỆ THỐNG (Code bug, mất mạng) -> Gửi error response (nếu có thể) -> NACK
                 logger.error(f"System error trong xử lý: {str(e)}", exc_info=True)
                 
-                try:
-                    # Thử gửi error response (nếu có thể)
-                    from datetime import datetime
-                    error_response = {
-                        "applicationId": application_id,
-                        "isSuccess": False,
-                        "version": None,
-                        "timestamp": datetime.utcnow().isoformat() + "Z",
-                        "error": f"System error: {str(e)}",
-                        "data": None
-                    }
-                    self.producer.send_direct_response(error_response)
-                except:
-                    logger.error("Không thể gửi error response")
-                
-                # NACK để re-queue message
-                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
-                logger.warning("NACK - Message sẽ được re-queue do lỗi hệ thống")
+                error_response = {
+                    "applicationId": application_id,
+                    "isSuccess": False,
+                    "version": None,
+                    "timestamp": datetime.utcnow().isoformat() + "Z",
+                    "error": f"System error: {str(e)}",
+                    "data": None
+                }
+                return error_response, False
                 
         except Exception as e:
-            # Lỗi nghiêm trọng trong callback
+            # Lỗi nghiêm trọng trong callback -> NACK
             logger.error(f"Critical error trong message callback: {str(e)}", exc_info=True)
-            
-            # NACK message
-            try:
-                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
-                logger.warning("NACK - Message sẽ được re-queue do lỗi nghiêm trọng")
-            except:
-                logger.error("Không thể NACK message")
+            return None, False
     
     def stop_consuming(self):
         """Dừng consume messages"""
@@ -180,6 +241,12 @@ class RabbitMQConsumer:
                 self.channel.stop_consuming()
                 self.is_consuming = False
             
+            if self.executor is not None:
+                # Chờ các worker xong rồi xử lý các ACK/NACK còn chờ trên connection thread
+                self.executor.shutdown(wait=True)
+                if self.connection_manager.is_connected():
+                    self.connection_manager.connection.process_data_events(time_limit=1)
+            
             # Close connections
             self.connection_manager.close()
             self.producer.close()
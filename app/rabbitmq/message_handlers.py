@@ -17,10 +17,11 @@ Xử lý messages từ Spring Boot theo format:
 import json
 import logging
 import requests
-import tempfile
+import threading
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Optional, Tuple
 from openai import OpenAI
 from openai import BadRequestError
 
@@ -28,12 +29,17 @@ from core.config import settings
 from core.schemas import StructuredData
 from app.services.parser_service import ParserService
 from app.services.structuring_service import StructuringService
-from app.services.embedding_service import EmbeddingService
-from app.services.scoring_service import ScoringService
+from app.services.cache import SQLiteCache, SingleFlightCache, make_cache_key
+from app.services.embedding_service import EmbeddingService, EmbeddingCache
+from app.services.scoring_service import ScoringService, to_percent
 
 logger = logging.getLogger(__name__)
 
 
+class BranchCancelled(Exception):
+    """Nhánh xử lý bị dừng vì nhánh song song đã lỗi"""
+
+
 class MessageHandlers:
     """Xử lý messages từ RabbitMQ"""
     
@@ -42,11 +48,41 @@ class MessageHandlers:
         self.openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
         
         # Khởi tạo các services
-        self.parser_service = ParserService()
-        self.structuring_service = StructuringService(self.openai_client)
-        self.embedding_service = EmbeddingService(self.openai_client)
+        parser_cache = SQLiteCache(
+            os.path.join(settings.CACHE_DIR, "parsed_text.sqlite3"),
+            max_entries=settings.PARSER_CACHE_MAX_ENTRIES
+        ) if settings.PARSER_CACHE_ENABLED else None
+        self.parser_service = ParserService(
+            pdf_backend=settings.PDF_PARSER_BACKEND,
+            parallel_workers=settings.PDF_PARALLEL_WORKERS,
+            parallel_min_pages=settings.PDF_PARALLEL_MIN_PAGES,
+            cache=parser_cache,
+            memory_items=settings.PARSER_CACHE_MEMORY_ITEMS
+        )
+        structuring_cache = SQLiteCache(
+            os.path.join(settings.CACHE_DIR, "structuring.sqlite3"),
+            max_entries=settings.STRUCTURING_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.STRUCTURING_CACHE_TTL_SECONDS
+        ) if settings.STRUCTURING_CACHE_ENABLED else None
+        self.structuring_service = StructuringService(self.openai_client, cache=structuring_cache)
+        embedding_cache = EmbeddingCache(
+            os.path.join(settings.CACHE_DIR, "embeddings.sqlite3"),
+            memory_items=settings.EMBEDDING_CACHE_MEMORY_ITEMS,
+            max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES
+        ) if settings.EMBEDDING_CACHE_ENABLED else None
+        self.embedding_service = EmbeddingService(self.openai_client, cache=embedding_cache)
         self.scoring_service = ScoringService(self.embedding_service)
         
+        # Cache JD theo nội dung: một job posting nhận hàng trăm application với JD giống hệt nhau
+        self.jd_memo = SingleFlightCache(max_items=settings.JD_MEMO_MAX_ITEMS)
+        
+        # Thread pool cho nhánh JD (chạy song song với nhánh CV trong handle_message)
+        self.branch_executor = ThreadPoolExecutor(
+            # Mỗi message đang xử lý cần một thread cho nhánh JD
+            max_workers=max(settings.RABBITMQ_BRANCH_WORKERS, settings.RABBITMQ_CONSUMER_WORKERS),
+            thread_name_prefix="jd-branch"
+        )
+        
         logger.info("MessageHandlers đã được khởi tạo")
     
     def handle_message(self, message_data: Dict[str, Any]) -> Tuple[bool, Dict[str, Any], str]:
@@ -113,37 +149,7 @@ class MessageHandlers:
                     "data": None
                 }, "DATA_ERROR"
             
-            # Bước 1: Tải và parse CV từ fileUrl
-            logger.info(f"Bước 1: Tải CV từ URL: {file_url}")
-            cv_result = self._download_and_parse_cv(file_url)
-            
-            if cv_result is None:
-                # Lỗi download (network, timeout) - SYSTEM_ERROR để retry
-                return False, {
-                    "applicationId": application_id,
-                    "isSuccess": False,
-                    "version": version,
-                    "timestamp": datetime.utcnow().isoformat() + "Z",
-                    "error": "Failed to download CV file. Please check the file URL and network connection.",
-                    "data": None
-                }, "SYSTEM_ERROR"
-            elif isinstance(cv_result, tuple) and len(cv_result) == 3:
-                # Lỗi parse (corrupt file, unsupported format) - DATA_ERROR để discard
-                error_type, error_msg, exception_detail = cv_result
-                logger.error(f"Lỗi parse CV: {error_msg}. Chi tiết: {exception_detail}")
-                return False, {
-                    "applicationId": application_id,
-                    "isSuccess": False,
-                    "version": version,
-                    "timestamp": datetime.utcnow().isoformat() + "Z",
-                    "error": f"Failed to parse CV file: {error_msg}. File may be corrupted, image-based PDF, or unsupported format.",
-                    "data": None
-                }, "DATA_ERROR"
-            else:
-                # Thành công
-                cv_content = cv_result
-            
-            # Bước 2: Kết hợp thông tin JD thành một đoạn text
+            # Bước 2 (làm trước để chạy song song): Kết hợp thông tin JD thành một đoạn text
             logger.info("Bước 2: Tổng hợp thông tin Job Description...")
             jd_content = self._build_jd_content(
                 job_title, 
@@ -153,149 +159,38 @@ class MessageHandlers:
                 experience_level
             )
             
-            # Bước 3: Trích xuất structured data từ CV
-            logger.info("Bước 3: Trích xuất thông tin từ CV...")
-            try:
-                cv_structured_json = self.structuring_service.get_structured_data(
-                    cv_content,
-                    StructuredData
-                )
-            except RuntimeError as e:
-                error_str = str(e)
-                # Trường hợp input quá dài dẫn tới vượt giới hạn context/tokens của model
-                if "maximum context length" in error_str or (
-                    "rate_limit_exceeded" in error_str
-                    and "Request too large" in error_str
-                ):
-                    logger.error(
-                        f"CV content quá dài, vượt quá token limit hoặc context limit: "
-                        f"{len(cv_content)} chars. Chi tiết: {error_str}"
-                    )
-                    return False, {
-                        "applicationId": application_id,
-                        "isSuccess": False,
-                        "version": version,
-                        "timestamp": datetime.utcnow().isoformat() + "Z",
-                        "error": (
-                            "CV content is too long and exceeds the model's limits. "
-                            "Please provide a shorter or more concise CV file."
-                        ),
-                        "data": None
-                    }, "DATA_ERROR"
-                # Các RuntimeError khác vẫn được xử lý ở except tổng phía dưới
-                raise
-            except BadRequestError as e:
-                if "maximum context length" in str(e):
-                    logger.error(f"CV content quá dài, vượt quá token limit: {len(cv_content)} chars")
-                    return False, {
-                        "applicationId": application_id,
-                        "isSuccess": False,
-                        "version": version,
-                        "timestamp": datetime.utcnow().isoformat() + "Z",
-                        "error": "CV content is too long and exceeds token limit. Please provide a shorter CV file",
-                        "data": None
-                    }, "DATA_ERROR"
-                raise
+            # Nhánh JD không phụ thuộc CV -> chạy song song với nhánh CV.
+            # Nhánh nào lỗi trước sẽ báo cho nhánh còn lại dừng qua cancel_event.
+            cancel_event = threading.Event()
+            jd_future = self.branch_executor.submit(
+                self._run_jd_branch, jd_content, application_id, version, cancel_event
+            )
             
-            # Bước 4: Trích xuất structured data từ JD
-            logger.info("Bước 4: Trích xuất thông tin từ Job Description...")
             try:
-                jd_structured_json = self.structuring_service.get_structured_data(
-                    jd_content,
-                    StructuredData
-                )
-            except RuntimeError as e:
-                error_str = str(e)
-                if "maximum context length" in error_str or (
-                    "rate_limit_exceeded" in error_str
-                    and "Request too large" in error_str
-                ):
-                    logger.error(
-                        f"JD content quá dài, vượt quá token limit hoặc context limit: "
-                        f"{len(jd_content)} chars. Chi tiết: {error_str}"
-                    )
-                    return False, {
-                        "applicationId": application_id,
-                        "isSuccess": False,
-                        "version": version,
-                        "timestamp": datetime.utcnow().isoformat() + "Z",
-                        "error": (
-                            "Job description is too long and exceeds the model's limits. "
-                            "Please provide a shorter job description."
-                        ),
-                        "data": None
-                    }, "DATA_ERROR"
-                raise
-            except BadRequestError as e:
-                if "maximum context length" in str(e):
-                    logger.error(f"JD content quá dài, vượt quá token limit: {len(jd_content)} chars")
-                    return False, {
-                        "applicationId": application_id,
-                        "isSuccess": False,
-                        "version": version,
-                        "timestamp": datetime.utcnow().isoformat() + "Z",
-                        "error": "Job description is too long and exceeds token limit. Please provide a shorter job description",
-                        "data": None
-                    }, "DATA_ERROR"
+                cv_result, cv_error = self._run_cv_branch(file_url, application_id, version, cancel_event)
+            except BranchCancelled:
+                # Nhánh JD đã lỗi -> trả về lỗi của nhánh JD
+                cv_result, cv_error = None, None
+            except BaseException:
+                cancel_event.set()
+                jd_future.cancel()
                 raise
             
-            # Bước 5: Tạo embeddings
-            logger.info("Bước 5: Tạo embeddings...")
-            try:
-                cv_embedding = self.embedding_service.get_embedding(cv_content)
-            except BadRequestError as e:
-                if "maximum context length" in str(e):
-                    logger.error(f"CV content quá dài cho embedding: {len(cv_content)} chars")
-                    return False, {
-                        "applicationId": application_id,
-                        "isSuccess": False,
-                        "version": version,
-                        "timestamp": datetime.utcnow().isoformat() + "Z",
-                        "error": "CV content is too long for embedding generation. Please provide a shorter CV file",
-                        "data": None
-                    }, "DATA_ERROR"
-                raise
-            except RuntimeError as e:
-                # RuntimeError được raise từ embedding_service khi có BadRequestError
-                if "maximum context length" in str(e):
-                    logger.error(f"CV content quá dài cho embedding: {len(cv_content)} chars")
-                    return False, {
-                        "applicationId": application_id,
-                        "isSuccess": False,
-                        "version": version,
-                        "timestamp": datetime.utcnow().isoformat() + "Z",
-                        "error": "CV content is too long for embedding generation. Please provide a shorter CV file",
-                        "data": None
-                    }, "DATA_ERROR"
-                raise
+            if cv_error is not None:
+                cancel_event.set()
+                jd_future.cancel()
+                return cv_error
             
             try:
-                jd_embedding = self.embedding_service.get_embedding(jd_content)
-            except BadRequestError as e:
-                if "maximum context length" in str(e):
-                    logger.error(f"JD content quá dài cho embedding: {len(jd_content)} chars")
-                    return False, {
-                        "applicationId": application_id,
-                        "isSuccess": False,
-                        "version": version,
-                        "timestamp": datetime.utcnow().isoformat() + "Z",
-                        "error": "Job description is too long for embedding generation. Please provide a shorter job description",
-                        "data": None
-                    }, "DATA_ERROR"
-                raise
-            except RuntimeError as e:
-                # RuntimeError được raise từ embedding_service khi có BadRequestError
-                if "maximum context length" in str(e):
-                    logger.error(f"JD content quá dài cho embedding: {len(jd_content)} chars")
-                    return False, {
-                        "applicationId": application_id,
-                        "isSuccess": False,
-                        "version": version,
-                        "timestamp": datetime.utcnow().isoformat() + "Z",
-                        "error": "Job description is too long for embedding generation. Please provide a shorter job description",
-                        "data": None
-                    }, "DATA_ERROR"
-                raise
+                jd_result, jd_error = jd_future.result()
+            except BranchCancelled:
+                # Không xảy ra: nhánh JD chỉ bị hủy khi nhánh CV đã lỗi
+                raise RuntimeError("JD branch was cancelled unexpectedly")
+            if jd_error is not None:
+                return jd_error
+            
+            cv_structured_json, cv_embedding = cv_result
+            jd_structured_json, jd_embedding = jd_result
             
             # Bước 6: Tính điểm matching
             logger.info("Bước 6: Tính điểm matching...")
@@ -323,14 +218,14 @@ class MessageHandlers:
                 "error": None,
                 "data": {
                     "applicationId": application_id,
-                    "matchScore": round(score_result["total_score"] * 100, 2),  # Convert to 0-100 scale
+                    "matchScore": to_percent(score_result["total_score"]),
                     "breakdown": {
-                        "hardSkillsScore": round(breakdown.get("hard_skills", 0) * 100, 2),
-                        "workExperienceScore": round(breakdown.get("work_experience", 0) * 100, 2),
-                        "responsibilitiesAchievementsScore": round(breakdown.get("responsibilities", 0) * 100, 2),
-                        "softSkillsScore": round(breakdown.get("soft_skills", 0) * 100, 2),
-                        "educationTrainingScore": round(breakdown.get("education", 0) * 100, 2),
-                        "additionalFactorsScore": round(breakdown.get("additional_factors", 0) * 100, 2)
+                        "hardSkillsScore": to_percent(breakdown.get("hard_skills", 0)),
+                        "workExperienceScore": to_percent(breakdown.get("work_experience", 0)),
+                        "responsibilitiesAchievementsScore": to_percent(breakdown.get("responsibilities", 0)),
+                        "softSkillsScore": to_percent(breakdown.get("soft_skills", 0)),
+                        "educationTrainingScore": to_percent(breakdown.get("education", 0)),
+                        "additionalFactorsScore": to_percent(breakdown.get("additional_factors", 0))
                     }
                 }
             }
@@ -375,6 +270,213 @@ class MessageHandlers:
                 "data": None
             }, "SYSTEM_ERROR"
     
+    def _run_cv_branch(self, file_url: str, application_id: Any, version: Any,
+                       cancel_event: threading.Event) -> Tuple[Optional[Tuple[dict, list]], Optional[tuple]]:
+        """
+        Nhánh CV: tải + parse -> structuring -> embedding
+        
+        Returns:
+            Tuple[(structured_json, embedding), error]. error là tuple kết quả của
+            handle_message (False, response_data, error_type) nếu có lỗi đã phân loại
+            
+        Raises:
+            BranchCancelled: Nếu nhánh JD đã lỗi trong lúc nhánh CV đang chạy
+            Exception: Lỗi hệ thống chưa phân loại (xử lý như SYSTEM_ERROR)
+        """
+        try:
+            # Bước 1: Tải và parse CV từ fileUrl
+            logger.info(f"Bước 1: Tải CV từ URL: {file_url}")
+            cv_result = self._download_and_parse_cv(file_url)
+            
+            if cv_result is None:
+                # Lỗi download (network, timeout) - SYSTEM_ERROR để retry
+                return None, self._error_result(
+                    application_id, version,
+                    "Failed to download CV file. Please check the file URL and network connection.",
+                    "SYSTEM_ERROR"
+                )
+            elif isinstance(cv_result, tuple) and len(cv_result) == 3:
+                # Lỗi parse (corrupt file, unsupported format) - DATA_ERROR để discard
+                error_type, error_msg, exception_detail = cv_result
+                logger.error(f"Lỗi parse CV: {error_msg}. Chi tiết: {exception_detail}")
+                return None, self._error_result(
+                    application_id, version,
+                    f"Failed to parse CV file: {error_msg}. File may be corrupted, image-based PDF, or unsupported format.",
+                    "DATA_ERROR"
+                )
+            else:
+                # Thành công
+                cv_content = cv_result
+            
+            self._check_cancelled(cancel_event)
+            
+            # Bước 3: Trích xuất structured data từ CV
+            logger.info("Bước 3: Trích xuất thông tin từ CV...")
+            try:
+                cv_structured_json = self.structuring_service.get_structured_data(
+                    cv_content,
+                    StructuredData
+                )
+            except RuntimeError as e:
+                error_str = str(e)
+                # Trường hợp input quá dài dẫn tới vượt giới hạn context/tokens của model
+                if self._is_too_large_error(error_str):
+                    logger.error(
+                        f"CV content quá dài, vượt quá token limit hoặc context limit: "
+                        f"{len(cv_content)} chars. Chi tiết: {error_str}"
+                    )
+                    return None, self._error_result(
+                        application_id, version,
+                        (
+                            "CV content is too long and exceeds the model's limits. "
+                            "Please provide a shorter or more concise CV file."
+                        ),
+                        "DATA_ERROR"
+                    )
+                # Các RuntimeError khác được xử lý như SYSTEM_ERROR ở handle_message
+                raise
+            except BadRequestError as e:
+                if "maximum context length" in str(e):
+                    logger.error(f"CV content quá dài, vượt quá token limit: {len(cv_content)} chars")
+                    return None, self._error_result(
+                        application_id, version,
+                        "CV content is too long and exceeds token limit. Please provide a shorter CV file",
+                        "DATA_ERROR"
+                    )
+                raise
+            
+            self._check_cancelled(cancel_event)
+            
+            # Bước 5a: Tạo embedding cho CV
+            logger.info("Bước 5a: Tạo embedding cho CV...")
+            try:
+                cv_embedding = self.embedding_service.get_embedding(cv_content)
+            except (BadRequestError, RuntimeError) as e:
+                # RuntimeError được raise từ embedding_service khi có BadRequestError
+                if "maximum context length" in str(e):
+                    logger.error(f"CV content quá dài cho embedding: {len(cv_content)} chars")
+                    return None, self._error_result(
+                        application_id, version,
+                        "CV content is too long for embedding generation. Please provide a shorter CV file",
+                        "DATA_ERROR"
+                    )
+                raise
+            
+            return (cv_structured_json, cv_embedding), None
+            
+        except BranchCancelled:
+            raise
+        except BaseException:
+            cancel_event.set()
+            raise
+    
+    def _run_jd_branch(self, jd_content: str, application_id: Any, version: Any,
+                       cancel_event: threading.Event) -> Tuple[Optional[Tuple[dict, list]], Optional[tuple]]:
+        """
+        Nhánh JD: structuring -> embedding (có memoization theo nội dung JD)
+        
+        Returns:
+            Tuple[(structured_json, embedding), error] giống _run_cv_branch
+        """
+        try:
+            result, error = self._process_jd(jd_content, application_id, version, cancel_event)
+        except BranchCancelled:
+            raise
+        except BaseException:
+            cancel_event.set()
+            raise
+        
+        if error is not None:
+            cancel_event.set()
+        return result, error
+    
+    def _process_jd(self, jd_content: str, application_id: Any, version: Any,
+                    cancel_event: threading.Event) -> Tuple[Optional[Tuple[dict, list]], Optional[tuple]]:
+        """Các bước xử lý JD, trả về kết quả hoặc lỗi đã phân loại"""
+        self._check_cancelled(cancel_event)
+        
+        # Bước 4: Trích xuất structured data từ JD
+        logger.info("Bước 4: Trích xuất thông tin từ Job Description...")
+        jd_key = make_cache_key(jd_content)
+        try:
+            jd_structured_json = self.jd_memo.get_or_compute(
+                f"structured:{jd_key}",
+                lambda: self.structuring_service.get_structured_data(jd_content, StructuredData)
+            )
+        except RuntimeError as e:
+            error_str = str(e)
+            if self._is_too_large_error(error_str):
+                logger.error(
+                    f"JD content quá dài, vượt quá token limit hoặc context limit: "
+                    f"{len(jd_content)} chars. Chi tiết: {error_str}"
+                )
+                return None, self._error_result(
+                    application_id, version,
+                    (
+                        "Job description is too long and exceeds the model's limits. "
+                        "Please provide a shorter job description."
+                    ),
+                    "DATA_ERROR"
+                )
+            raise
+        except BadRequestError as e:
+            if "maximum context length" in str(e):
+                logger.error(f"JD content quá dài, vượt quá token limit: {len(jd_content)} chars")
+                return None, self._error_result(
+                    application_id, version,
+                    "Job description is too long and exceeds token limit. Please provide a shorter job description",
+                    "DATA_ERROR"
+                )
+            raise
+        
+        self._check_cancelled(cancel_event)
+        
+        # Bước 5b: Tạo embedding cho JD
+        logger.info("Bước 5b: Tạo embedding cho Job Description...")
+        try:
+            jd_embedding = self.jd_memo.get_or_compute(
+                f"embedding:{jd_key}",
+                lambda: self.embedding_service.get_embedding(jd_content)
+            )
+        except (BadRequestError, RuntimeError) as e:
+            # RuntimeError được raise từ embedding_service khi có BadRequestError
+            if "maximum context length" in str(e):
+                logger.error(f"JD content quá dài cho embedding: {len(jd_content)} chars")
+                return None, self._error_result(
+                    application_id, version,
+                    "Job description is too long for embedding generation. Please provide a shorter job description",
+                    "DATA_ERROR"
+                )
+            raise
+        
+        return (jd_structured_json, jd_embedding), None
+    
+    @staticmethod
+    def _check_cancelled(cancel_event: threading.Event) -> None:
+        """Dừng nhánh hiện tại nếu nhánh song song đã lỗi"""
+        if cancel_event.is_set():
+            raise BranchCancelled()
+    
+    @staticmethod
+    def _is_too_large_error(error_str: str) -> bool:
+        """Lỗi do input vượt giới hạn context/tokens của model"""
+        return "maximum context length" in error_str or (
+            "rate_limit_exceeded" in error_str
+            and "Request too large" in error_str
+        )
+    
+    @staticmethod
+    def _error_result(application_id: Any, version: Any, error: str, error_type: str) -> Tuple[bool, Dict[str, Any], str]:
+        """Tạo kết quả lỗi theo format response của handle_message"""
+        return False, {
+            "applicationId": application_id,
+            "isSuccess": False,
+            "version": version,
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "error": error,
+            "data": None
+        }, error_type
+    
     def _download_and_parse_cv(self, file_url: str):
         """
         Tải CV từ URL và parse thành text
@@ -387,7 +489,6 @@ class MessageHandlers:
             None: Nếu lỗi download (SYSTEM_ERROR - có thể retry)
             tuple: (error_type, error_msg, exception_detail) nếu lỗi parse (DATA_ERROR - không retry)
         """
-        tmp_file_path = None
         try:
             # Download file
             logger.info(f"Đang tải file từ: {file_url}")
@@ -410,29 +511,46 @@ class MessageHandlers:
                     logger.error(f"Không xác định được loại file từ URL: {file_url}")
                     return ("PARSE_ERROR", "Unsupported file type", f"Could not determine file type from URL or Content-Type")
             
-            # Save to temp file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=extension) as tmp_file:
-                tmp_file.write(response.content)
-                tmp_file_path = tmp_file.name
-            
-            # Parse file
-            logger.info(f"Đang parse file: {tmp_file_path}")
+            # Parse trực tiếp từ bộ nhớ (không ghi file tạm)
+            logger.info(f"Đang parse file {extension} ({len(response.content)} bytes)")
             try:
-                text_content = self.parser_service.parse_file(tmp_file_path)
+                parse_result = self.parser_service.get_cached(
+                    response.content,
+                    extension,
+                    max_tokens=settings.PARSER_MAX_TOKENS or None
+                )
+                if parse_result is None:
+                    # Preflight (chỉ khi chưa có cache): loại PDF scan/ảnh ngay, không cần parse toàn bộ file
+                    if extension == '.pdf' and self._is_image_only_pdf(response.content):
+                        logger.warning(f"PDF không có text layer (scan/ảnh): {file_url}")
+                        return ("PARSE_ERROR", "Empty content extracted",
+                               "PDF is image-based or scanned. No text layer found.")
+                    
+                    parse_result = self.parser_service.parse_document(
+                        response.content,
+                        extension,
+                        max_tokens=settings.PARSER_MAX_TOKENS or None
+                    )
+                text_content = parse_result.text
                 
                 # Kiểm tra nếu text_content rỗng (có thể là PDF scan/image-based)
                 if not text_content or not text_content.strip():
                     return ("PARSE_ERROR", "Empty content extracted", 
                            "PDF may be image-based or scanned. No text content found.")
                 
-                logger.info(f"Đã parse thành công: {len(text_content)} ký tự")
+                logger.info(
+                    f"Đã parse thành công: {len(text_content)} ký tự "
+                    f"(backend: {parse_result.backend}, {parse_result.pages_parsed}/{parse_result.pages_total} trang)"
+                )
+                if parse_result.truncated:
+                    logger.warning(f"CV vượt budget {settings.PARSER_MAX_TOKENS} tokens, text đã được cắt bớt")
                 return text_content
                 
             except Exception as parse_error:
                 # Lỗi parse - đây là DATA_ERROR (file không hợp lệ, không nên retry)
                 error_type = type(parse_error).__name__
                 error_msg = str(parse_error)
-                logger.error(f"Lỗi khi parse file {tmp_file_path}: {error_type}: {error_msg}", exc_info=True)
+                logger.error(f"Lỗi khi parse file {file_url}: {error_type}: {error_msg}", exc_info=True)
                 return ("PARSE_ERROR", f"Failed to parse {extension} file", f"{error_type}: {error_msg}")
                     
         except requests.RequestException as e:
@@ -443,13 +561,18 @@ class MessageHandlers:
             # Lỗi không xác định trong quá trình download
             logger.error(f"Lỗi không xác định khi download/parse CV: {str(e)}", exc_info=True)
             return None
-        finally:
-            # Clean up temp file
-            if tmp_file_path and os.path.exists(tmp_file_path):
-                try:
-                    os.remove(tmp_file_path)
-                except Exception as cleanup_error:
-                    logger.warning(f"Không thể xóa temp file {tmp_file_path}: {str(cleanup_error)}")
+    
+    def _is_image_only_pdf(self, content: bytes) -> bool:
+        """Kiểm tra nhanh PDF chỉ chứa ảnh; lỗi preflight để bước parse đầy đủ xử lý"""
+        try:
+            content_type = self.parser_service.detect_pdf_content(
+                content,
+                max_pages=settings.PDF_PREFLIGHT_PAGES
+            )
+        except Exception as e:
+            logger.debug(f"Bỏ qua preflight PDF: {str(e)}")
+            return False
+        return content_type == "image"
     
     def _build_jd_content(
         self, 
@@ -0,0 +1,283 @@
+"""
+Cache primitives dùng chung cho các services
+
+- LRUCache: cache trong bộ nhớ (in-process), giới hạn theo số phần tử
+- SingleFlightCache: LRU memoization, mỗi key chỉ có một lần tính đang chạy
+- SQLiteCache: cache trên đĩa (key -> blob), giới hạn theo số phần tử, hỗ trợ TTL
+- CacheStats: bộ đếm hit/miss
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+def make_cache_key(*parts: str) -> str:
+    """
+    Tạo cache key dạng sha256 từ nhiều thành phần
+
+    Args:
+        parts: Các thành phần tạo nên key (model name, text, ...)
+
+    Returns:
+        Chuỗi hex sha256
+    """
+    hasher = hashlib.sha256()
+    for part in parts:
+        hasher.update(part.encode("utf-8"))
+        # Ký tự phân cách để ("ab", "c") khác ("a", "bc")
+        hasher.update(b"\x00")
+    return hasher.hexdigest()
+
+
+class CacheStats:
+    """Bộ đếm hit/miss thread-safe"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hits: int = 0, misses: int = 0) -> None:
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0
+            }
+
+
+class LRUCache:
+    """Cache trong bộ nhớ, loại bỏ phần tử ít dùng nhất khi vượt max_items"""
+
+    def __init__(self, max_items: int = 10000):
+        self.max_items = max_items
+        self._data: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key: str, value: Any) -> None:
+        if self.max_items <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SingleFlightCache:
+    """
+    Memoization có giới hạn bộ nhớ (LRU) với single-flight
+
+    Khi nhiều thread cùng yêu cầu một key chưa có trong cache, chỉ thread đầu tiên
+    thực hiện tính toán; các thread còn lại chờ và nhận cùng kết quả (hoặc cùng exception).
+    Exception không được cache.
+    """
+
+    def __init__(self, max_items: int = 256):
+        self._results = LRUCache(max_items=max_items)
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = CacheStats()
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                self.stats.record(hits=1)
+                return cached[0]
+
+            future = self._inflight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._inflight[key] = future
+                self.stats.record(misses=1)
+            else:
+                self.stats.record(hits=1)
+
+        if not is_owner:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            # Lưu dạng tuple để phân biệt giá trị None với cache miss
+            self._results.set(key, (value,))
+            self._inflight.pop(key, None)
+        future.set_result(value)
+        return value
+
+
+class SQLiteCache:
+    """
+    Cache key -> blob lưu trên đĩa bằng SQLite
+
+    Eviction theo số phần tử (xóa các entry truy cập lâu nhất) và theo TTL (nếu có).
+    """
+
+    # Chỉ chạy eviction sau mỗi N lần ghi để tránh COUNT(*) liên tục
+    _EVICT_EVERY = 100
+
+    def __init__(self, db_path: str, max_entries: int = 100000, ttl_seconds: Optional[float] = None):
+        """
+        Khởi tạo SQLiteCache
+
+        Args:
+            db_path: Đường dẫn file SQLite
+            max_entries: Số entry tối đa giữ trên đĩa
+            ttl_seconds: Thời gian sống của entry (None = không hết hạn)
+        """
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache(accessed_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        """Lấy nhiều entry trong một truy vấn, bỏ qua entry đã hết hạn"""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+
+        now = time.time()
+        found: Dict[str, bytes] = {}
+        expired: List[str] = []
+
+        with self._lock:
+            # SQLite giới hạn số tham số trong một câu lệnh
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value, created_at FROM cache WHERE key IN ({placeholders})",
+                    chunk
+                ).fetchall()
+                for key, value, created_at in rows:
+                    if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                        expired.append(key)
+                    else:
+                        found[key] = value
+
+            if found:
+                self._conn.executemany(
+                    "UPDATE cache SET accessed_at = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+            if expired:
+                self._conn.executemany("DELETE FROM cache WHERE key = ?", [(key,) for key in expired])
+            if found or expired:
+                self._conn.commit()
+
+        return found
+
+    def set(self, key: str, value: bytes) -> None:
+        self.set_many({key: value})
+
+    def set_many(self, items: Dict[str, bytes]) -> None:
+        """Ghi nhiều entry trong một transaction"""
+        if not items:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                [(key, sqlite3.Binary(value), now, now) for key, value in items.items()]
+            )
+            self._conn.commit()
+
+            self._writes_since_evict += len(items)
+            if self._writes_since_evict >= self._EVICT_EVERY:
+                self._writes_since_evict = 0
+                self._evict_locked()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def _evict_locked(self) -> None:
+        """Xóa entry hết hạn và các entry truy cập lâu nhất khi vượt max_entries"""
+        if self.ttl_seconds is not None:
+            self._conn.execute("DELETE FROM cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+
+        count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,)
+            )
+        self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,111 @@
+"""
+Document Store
+
+Kho SQLite nằm cạnh ChromaDB, lưu dữ liệu theo doc_id mà ChromaDB không lưu hiệu quả:
+- documents: structured JSON của document (một blob JSON gọn cho mỗi doc)
+- scoring_profiles: scoring profile dạng ma trận embedding
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional
+
+
+class DocumentStore:
+    """Kho blob theo (collection, doc_id) sử dụng SQLite"""
+
+    def __init__(self, db_path: str):
+        """
+        Khởi tạo DocumentStore
+
+        Args:
+            db_path: Đường dẫn file SQLite
+        """
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                collection TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (collection, doc_id)
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS scoring_profiles (
+                collection TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                profile BLOB NOT NULL,
+                PRIMARY KEY (collection, doc_id)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def save_documents(self, collection_name: str, documents: Dict[str, bytes]) -> None:
+        """Ghi structured data của nhiều document trong một transaction"""
+        if not documents:
+            return
+        
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO documents (collection, doc_id, data) VALUES (?, ?, ?)",
+                [(collection_name, doc_id, sqlite3.Binary(data)) for doc_id, data in documents.items()]
+            )
+            self._conn.commit()
+    
+    def get_documents(self, collection_name: str, doc_ids: Iterable[str]) -> Dict[str, bytes]:
+        """Lấy structured data của nhiều document trong một truy vấn"""
+        return self._get_many("documents", "data", collection_name, doc_ids)
+    
+    def save_profile(self, collection_name: str, doc_id: str, profile: bytes) -> None:
+        self.save_profiles(collection_name, {doc_id: profile})
+    
+    def save_profiles(self, collection_name: str, profiles: Dict[str, bytes]) -> None:
+        """Ghi profile của nhiều document trong một transaction"""
+        if not profiles:
+            return
+        
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO scoring_profiles (collection, doc_id, profile) VALUES (?, ?, ?)",
+                [(collection_name, doc_id, sqlite3.Binary(profile)) for doc_id, profile in profiles.items()]
+            )
+            self._conn.commit()
+
+    def get_profile(self, collection_name: str, doc_id: str) -> Optional[bytes]:
+        return self.get_profiles(collection_name, [doc_id]).get(doc_id)
+
+    def get_profiles(self, collection_name: str, doc_ids: Iterable[str]) -> Dict[str, bytes]:
+        """Lấy profile của nhiều document trong một truy vấn"""
+        return self._get_many("scoring_profiles", "profile", collection_name, doc_ids)
+    
+    def _get_many(self, table: str, column: str, collection_name: str, doc_ids: Iterable[str]) -> Dict[str, bytes]:
+        doc_ids = list(dict.fromkeys(doc_ids))
+        values: Dict[str, bytes] = {}
+        
+        with self._lock:
+            # SQLite giới hạn số tham số trong một câu lệnh
+            for start in range(0, len(doc_ids), 500):
+                chunk = doc_ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT doc_id, {column} FROM {table} WHERE collection = ? AND doc_id IN ({placeholders})",
+                    [collection_name, *chunk]
+                ).fetchall()
+                values.update({doc_id: bytes(value) for doc_id, value in rows})
+        
+        return values
+    
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,268 @@
+"""
+Embedding Matrix
+
+Snapshot embeddings đã chuẩn hóa (L2) của một collection dưới dạng ma trận float32 liên tục
+trong file .npy được memory-map, kèm file ids (mỗi dòng một doc_id, chỉ ghi nối thêm).
+
+- Khởi động: np.load(mmap_mode) gần như tức thì, không cần đọc embeddings từ ChromaDB
+- Ghi: cập nhật tại chỗ (doc_id đã có) hoặc ghi nối thêm hàng mới; file tự tăng capacity
+- Tìm kiếm: brute-force top-k bằng một phép nhân ma trận - vector (cosine similarity)
+
+Nhiều process (các worker của API, app.ingest) có thể cùng ghi: mỗi lần ghi giữ file lock
+<prefix>.lock và đọc lại snapshot trước khi nối thêm hàng. Snapshot thiếu hàng (document được
+thêm trước khi có embedding matrix) được bổ sung từ nguồn, không bao giờ bị xóa để dựng lại.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def _exclusive_file_lock(path: str) -> Iterator[None]:
+    """File lock độc quyền giữa các process (chờ tới khi lấy được lock)"""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class EmbeddingMatrix:
+    """Ma trận embedding memory-mapped của một collection, ánh xạ doc_id -> hàng"""
+
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self, path_prefix: str):
+        """
+        Khởi tạo EmbeddingMatrix (file chỉ được tạo khi ghi lần đầu)
+
+        Args:
+            path_prefix: Đường dẫn không có phần mở rộng; dùng <prefix>.npy và <prefix>.ids
+        """
+        directory = os.path.dirname(path_prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.matrix_path = path_prefix + ".npy"
+        self.ids_path = path_prefix + ".ids"
+        self.lock_path = path_prefix + ".lock"
+        self._lock = threading.RLock()
+        self._matrix: Optional[np.memmap] = None
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._ids_signature: Optional[Tuple[int, int, int]] = None
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return None if self._matrix is None else self._matrix.shape[1]
+
+    def _load(self) -> None:
+        """Memory-map snapshot trên đĩa (nếu có)"""
+        self._matrix = None
+        self._ids = []
+        self._rows = {}
+        self._ids_signature: Optional[Tuple[int, int, int]] = None
+
+        if not (os.path.exists(self.matrix_path) and os.path.exists(self.ids_path)):
+            return
+
+        self._matrix = np.load(self.matrix_path, mmap_mode="r+")
+        with open(self.ids_path, "rb") as f:
+            # Lấy signature trước khi đọc: nếu có process ghi thêm trong lúc đọc, lần refresh sau sẽ đọc lại
+            self._ids_signature = self._signature(f.fileno())
+            data = f.read()
+
+        # Dòng cuối không có "\n" là dòng ghi dở (tiến trình bị dừng giữa chừng) -> bỏ qua
+        ids = data.decode("utf-8").split("\n")[:-1]
+        self._ids = ids[:self._matrix.shape[0]]
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+
+    @staticmethod
+    def _signature(fd: int) -> Tuple[int, int, int]:
+        stat = os.fstat(fd)
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def refresh(self) -> None:
+        """Đọc lại snapshot nếu process khác đã ghi (file ids được ghi thêm hoặc tạo lại)"""
+        with self._lock:
+            try:
+                stat = os.stat(self.ids_path)
+                signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            except FileNotFoundError:
+                signature = None
+            if signature != self._ids_signature:
+                self._load()
+
+    def upsert(self, doc_ids: Sequence[str], embeddings: Iterable[Sequence[float]]) -> None:
+        """
+        Ghi embeddings (đã chuẩn hóa) cho các doc_id: ghi đè hàng cũ hoặc nối thêm hàng mới
+
+        Args:
+            doc_ids: Danh sách doc_id
+            embeddings: Embeddings tương ứng
+        """
+        with self._lock, _exclusive_file_lock(self.lock_path):
+            # Process khác có thể đã nối thêm hàng: đọc lại để không ghi đè lên hàng của họ
+            self.refresh()
+            self._upsert_locked(doc_ids, embeddings)
+
+    def backfill(
+        self,
+        min_rows: int,
+        pages: Iterable[Tuple[Sequence[str], Sequence[Sequence[float]]]]
+    ) -> bool:
+        """
+        Bổ sung hàng từ nguồn (ví dụ ChromaDB) nếu snapshot có ít hơn min_rows hàng
+
+        Số hàng được kiểm tra lại sau khi lấy file lock: chỉ một process bổ sung, các process
+        khác thấy đủ hàng và bỏ qua. Hàng đã có chỉ bị ghi đè, snapshot không bị xóa.
+
+        Args:
+            min_rows: Số hàng tối thiểu (số document của nguồn)
+            pages: Iterable (doc_ids, embeddings) chỉ được đọc khi cần bổ sung
+
+        Returns:
+            True nếu đã bổ sung
+        """
+        with self._lock:
+            self.refresh()
+            if len(self._ids) >= min_rows:
+                return False
+
+            with _exclusive_file_lock(self.lock_path):
+                self.refresh()
+                if len(self._ids) >= min_rows:
+                    return False
+                for doc_ids, embeddings in pages:
+                    self._upsert_locked(doc_ids, embeddings)
+                return True
+
+    def _upsert_locked(self, doc_ids: Sequence[str], embeddings: Iterable[Sequence[float]]) -> None:
+        """Ghi embeddings, gọi khi đã giữ self._lock và file lock"""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if not len(doc_ids):
+            return
+        vectors = _normalize(vectors.reshape(len(doc_ids), -1))
+
+        if self._matrix is None:
+            self._create(vectors.shape[1], max(self.INITIAL_CAPACITY, len(doc_ids)))
+        elif vectors.shape[1] != self._matrix.shape[1]:
+            raise ValueError(
+                f"Số chiều embedding không khớp: {vectors.shape[1]} != {self._matrix.shape[1]}"
+            )
+
+        # doc_id trùng trong cùng batch: giữ vector cuối cùng
+        latest = {doc_id: index for index, doc_id in enumerate(doc_ids)}
+        new_ids = [doc_id for doc_id in latest if doc_id not in self._rows]
+
+        for doc_id, index in latest.items():
+            row = self._rows.get(doc_id)
+            if row is not None:
+                self._matrix[row] = vectors[index]
+
+        if new_ids:
+            start = len(self._ids)
+            self._ensure_capacity(start + len(new_ids))
+            self._matrix[start:start + len(new_ids)] = vectors[[latest[doc_id] for doc_id in new_ids]]
+
+        # Ghi vector xuống đĩa trước, sau đó mới ghi ids (ids quyết định số hàng hợp lệ)
+        self._matrix.flush()
+        if new_ids:
+            with open(self.ids_path, "ab") as f:
+                f.write("".join(f"{doc_id}\n" for doc_id in new_ids).encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+                self._ids_signature = self._signature(f.fileno())
+            for doc_id in new_ids:
+                self._rows[doc_id] = len(self._ids)
+                self._ids.append(doc_id)
+
+    def top_k(self, embedding: Sequence[float], k: int = 50) -> List[Tuple[str, float]]:
+        """
+        Brute-force top-k theo cosine similarity
+
+        Args:
+            embedding: Vector truy vấn
+            k: Số kết quả
+
+        Returns:
+            List (doc_id, similarity) sắp xếp giảm dần
+        """
+        with self._lock:
+            count = len(self._ids)
+            if self._matrix is None or count == 0 or k <= 0:
+                return []
+
+            query = _normalize(np.asarray(embedding, dtype=np.float32))
+            scores = self._matrix[:count] @ query
+
+            k = min(k, count)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self._ids[row], float(scores[row])) for row in top]
+
+    def snapshot(self) -> Tuple[List[str], np.ndarray]:
+        """Danh sách doc_id và view (memory-mapped, chỉ đọc) của ma trận embedding tương ứng"""
+        with self._lock:
+            count = len(self._ids)
+            if self._matrix is None:
+                return [], np.empty((0, 0), dtype=np.float32)
+            view = self._matrix[:count]
+            view.flags.writeable = False
+            return list(self._ids), view
+
+    def _create(self, dimension: int, capacity: int) -> None:
+        open_memmap(self.matrix_path, mode="w+", dtype=np.float32, shape=(capacity, dimension)).flush()
+        open(self.ids_path, "wb").close()
+        self._load()
+
+    def _ensure_capacity(self, required: int) -> None:
+        """Tăng gấp đôi capacity (ghi file mới rồi thay thế) khi không đủ hàng"""
+        capacity, dimension = self._matrix.shape
+        if required <= capacity:
+            return
+
+        while capacity < required:
+            capacity *= 2
+
+        count = len(self._ids)
+        tmp_path = self.matrix_path + ".tmp.npy"
+        grown = open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(capacity, dimension))
+        grown[:count] = self._matrix[:count]
+        grown.flush()
+        del grown
+
+        # Bỏ tham chiếu tới file cũ trước khi thay thế (Windows không cho thay file đang được map)
+        self._matrix = None
+        os.replace(tmp_path, self.matrix_path)
+        self._matrix = np.load(self.matrix_path, mmap_mode="r+")
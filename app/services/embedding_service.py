@@ -1,54 +1,165 @@
+from array import array
 from openai import OpenAI
-from typing import List, Union
+from typing import Dict, List, Optional, Union
+
+from app.services.cache import CacheStats, LRUCache, SQLiteCache, make_cache_key
+
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+# Số input tối đa OpenAI chấp nhận trong một request embeddings
+MAX_BATCH_INPUTS = 2048
+
+
+class EmbeddingCache:
+    """
+    Cache 2 tầng cho embeddings: LRU trong bộ nhớ + SQLite trên đĩa
+
+    Key là sha256 của (model name, text chính xác), vector được lưu dạng float32.
+    """
+
+    def __init__(self, db_path: str, memory_items: int = 20000, max_entries: int = 500000):
+        """
+        Khởi tạo EmbeddingCache
+
+        Args:
+            db_path: Đường dẫn file SQLite lưu embeddings
+            memory_items: Số vector tối đa giữ trong bộ nhớ
+            max_entries: Số vector tối đa giữ trên đĩa
+        """
+        self.memory = LRUCache(max_items=memory_items)
+        self.disk = SQLiteCache(db_path, max_entries=max_entries)
+        self.stats = CacheStats()
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return make_cache_key(model, text)
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Lấy các vector đã cache (bộ nhớ trước, sau đó đĩa)
+
+        Args:
+            keys: Danh sách cache key (có thể trùng lặp)
+
+        Returns:
+            Dict key -> vector cho các key tìm thấy
+        """
+        unique_keys = list(dict.fromkeys(keys))
+        found: Dict[str, List[float]] = {}
+        disk_lookup = []
+
+        for key in unique_keys:
+            vector = self.memory.get(key)
+            if vector is not None:
+                found[key] = vector
+            else:
+                disk_lookup.append(key)
+
+        if disk_lookup:
+            for key, blob in self.disk.get_many(disk_lookup).items():
+                vector = array("f", blob).tolist()
+                self.memory.set(key, vector)
+                found[key] = vector
+
+        self.stats.record(hits=len(found), misses=len(unique_keys) - len(found))
+        return found
+
+    def set_many(self, items: Dict[str, List[float]]) -> None:
+        """Lưu vector vào cả hai tầng cache"""
+        for key, vector in items.items():
+            self.memory.set(key, vector)
+        self.disk.set_many({key: array("f", vector).tobytes() for key, vector in items.items()})
+
+    def get_stats(self) -> Dict[str, Union[int, float]]:
+        stats = self.stats.as_dict()
+        stats["memory_items"] = len(self.memory)
+        return stats
 
 
 class EmbeddingService:
     """Dịch vụ nhúng văn bản sử dụng text-embedding-3-small"""
-    
-    def __init__(self, openai_client: OpenAI):
+
+    def __init__(self, openai_client: OpenAI, cache: Optional[EmbeddingCache] = None):
         """
         Khởi tạo EmbeddingService
-        
+
         Args:
             openai_client: Client OpenAI đã được khởi tạo
+            cache: Cache embeddings (tùy chọn). Nếu None, mọi lần gọi đều đi qua OpenAI API
         """
         self.client = openai_client
-    
+        self.cache = cache
+
     def get_embedding(self, text: str) -> List[float]:
         """
         Tạo vector nhúng cho một đoạn văn bản
-        
+
         Args:
             text: Văn bản cần nhúng
-            
+
         Returns:
             List các số float biểu diễn vector nhúng
         """
+        if self.cache is not None:
+            key = self.cache.make_key(EMBEDDING_MODEL, text)
+            cached = self.cache.get_many([key])
+            if key in cached:
+                return cached[key]
+
         try:
             response = self.client.embeddings.create(
-                model="text-embedding-3-small",
+                model=EMBEDDING_MODEL,
                 input=text
             )
-            return response.data[0].embedding
+            embedding = response.data[0].embedding
         except Exception as e:
             raise RuntimeError(f"Lỗi khi tạo embedding: {e}")
-    
+
+        if self.cache is not None:
+            self.cache.set_many({key: embedding})
+        return embedding
+
     def get_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
         """
         Tạo vector nhúng cho nhiều đoạn văn bản cùng lúc (tối ưu hóa)
-        
+
+        Khi có cache, chỉ các text chưa có trong cache (đã loại trùng) mới được gửi lên API.
+
         Args:
             texts: Danh sách các văn bản cần nhúng
-            
+
         Returns:
             List các list float, mỗi list là một vector nhúng
         """
+        if self.cache is None:
+            return self._create_embeddings(texts)
+
+        keys = [self.cache.make_key(EMBEDDING_MODEL, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        # Text chưa có trong cache, loại trùng và giữ thứ tự
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+
+        if missing:
+            new_vectors = dict(zip(missing.keys(), self._create_embeddings(list(missing.values()))))
+            self.cache.set_many(new_vectors)
+            vectors.update(new_vectors)
+
+        return [vectors[key] for key in keys]
+
+    def _create_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Gọi OpenAI API cho một batch văn bản (chia nhỏ theo giới hạn số input của API)"""
         try:
-            response = self.client.embeddings.create(
-                model="text-embedding-3-small",
-                input=texts
-            )
-            return [item.embedding for item in response.data]
+            embeddings = []
+            for start in range(0, len(texts), MAX_BATCH_INPUTS):
+                response = self.client.embeddings.create(
+                    model=EMBEDDING_MODEL,
+                    input=texts[start:start + MAX_BATCH_INPUTS]
+                )
+                embeddings.extend(item.embedding for item in response.data)
+            return embeddings
         except Exception as e:
             raise RuntimeError(f"Lỗi khi tạo embeddings hàng loạt: {e}")
-
@@ -0,0 +1,204 @@
+"""
+Job Store
+
+Lưu trạng thái các job xử lý nền (POST /jobs/cv) trong SQLite để job đang chờ/đang chạy
+không bị mất khi API khởi động lại.
+
+Vòng đời: queued -> running -> succeeded | failed. Payload (nội dung file) chỉ được giữ
+tới khi job kết thúc.
+
+Nhiều worker (process) có thể dùng chung một file SQLite: job chỉ chạy sau khi được nhận
+(claim) nguyên tử từ queued sang running, kèm owner (hostname:pid). Worker gia hạn lease bằng
+cách cập nhật updated_at định kỳ; job running quá hạn lease (worker đã dừng) mới được xếp lại.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class JobStore:
+    """Kho trạng thái job sử dụng SQLite"""
+
+    def __init__(self, db_path: str):
+        """
+        Khởi tạo JobStore
+
+        Args:
+            db_path: Đường dẫn file SQLite
+        """
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                filename TEXT,
+                payload BLOB,
+                callback_url TEXT,
+                result TEXT,
+                error TEXT,
+                timings TEXT NOT NULL DEFAULT '{}',
+                owner TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        # File tạo bởi phiên bản cũ chưa có cột owner
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "owner" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+        self._conn.commit()
+
+    def create_job(
+        self,
+        kind: str,
+        payload: bytes,
+        filename: Optional[str] = None,
+        callback_url: Optional[str] = None
+    ) -> str:
+        """
+        Tạo job mới ở trạng thái queued
+
+        Returns:
+            job_id
+        """
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, kind, status, filename, payload, callback_url, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, JOB_QUEUED, filename, sqlite3.Binary(payload), callback_url, now, now)
+            )
+            self._conn.commit()
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Trạng thái job (không kèm payload), None nếu không tồn tại"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, kind, status, filename, callback_url, result, error, timings, created_at, updated_at "
+                "FROM jobs WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        job_id, kind, status, filename, callback_url, result, error, timings, created_at, updated_at = row
+        return {
+            "job_id": job_id,
+            "kind": kind,
+            "status": status,
+            "filename": filename,
+            "callback_url": callback_url,
+            "result": json.loads(result) if result else None,
+            "error": error,
+            "timings": json.loads(timings or "{}"),
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+
+    def get_payload(self, job_id: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return bytes(row[0]) if row and row[0] is not None else None
+
+    def claim_job(self, job_id: str, owner: str) -> bool:
+        """
+        Nhận job để chạy: chuyển nguyên tử queued -> running và ghi owner
+
+        Returns:
+            False nếu job không còn ở trạng thái queued (worker khác đã nhận hoặc job đã xong)
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = ?, updated_at = ? WHERE job_id = ? AND status = ?",
+                (JOB_RUNNING, owner, time.time(), job_id, JOB_QUEUED)
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def renew_leases(self, job_ids: List[str], owner: str) -> None:
+        """Gia hạn lease (cập nhật updated_at) cho các job đang chạy của owner"""
+        if not job_ids:
+            return
+        placeholders = ", ".join("?" for _ in job_ids)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET updated_at = ? WHERE status = ? AND owner = ? AND job_id IN ({placeholders})",
+                [time.time(), JOB_RUNNING, owner, *job_ids]
+            )
+            self._conn.commit()
+
+    def save_timings(self, job_id: str, timings: Dict[str, float]) -> None:
+        self._update(job_id, timings=json.dumps(timings))
+
+    def mark_succeeded(self, job_id: str, result: Dict[str, Any], timings: Dict[str, float]) -> None:
+        self._update(
+            job_id,
+            status=JOB_SUCCEEDED,
+            result=json.dumps(result, ensure_ascii=False),
+            timings=json.dumps(timings),
+            payload=None
+        )
+
+    def mark_failed(self, job_id: str, error: str, timings: Dict[str, float]) -> None:
+        self._update(job_id, status=JOB_FAILED, error=error, timings=json.dumps(timings), payload=None)
+
+    def requeue_unfinished(self, lease_seconds: float) -> List[str]:
+        """
+        Đưa các job running đã quá hạn lease (worker chạy job đã dừng) về queued; job của
+        worker còn sống (vẫn gia hạn lease) không bị động tới
+
+        Args:
+            lease_seconds: Thời gian (giây) không gia hạn thì lease hết hạn
+
+        Returns:
+            Danh sách job_id đang queued theo thứ tự tạo
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, updated_at = ? WHERE status = ? AND updated_at < ?",
+                (JOB_QUEUED, now, JOB_RUNNING, now - lease_seconds)
+            )
+            self._conn.commit()
+            rows = self._conn.execute(
+                "SELECT job_id FROM jobs WHERE status = ? ORDER BY created_at",
+                (JOB_QUEUED,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def _update(self, job_id: str, **fields: Any) -> None:
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE job_id = ?",
+                [*fields.values(), job_id]
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,138 @@
+"""
+Metadata Filters
+
+Trích các thông tin hay dùng để lọc ứng viên (số năm kinh nghiệm, trình độ học vấn,
+ngoại ngữ, sẵn sàng chuyển nơi ở/công tác) từ structured data thành metadata scalar
+có kiểu, để ChromaDB lọc trực tiếp trong lúc vector search (where filter).
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+# Trình độ học vấn chuẩn hóa thành số thứ tự để so sánh ">= bachelor"
+DEGREE_LEVELS = {
+    "none": 0,
+    "associate": 1,
+    "bachelor": 2,
+    "master": 3,
+    "doctorate": 4,
+}
+
+# Kiểm tra từ trình độ cao xuống thấp, lấy trình độ cao nhất khớp được
+_DEGREE_KEYWORDS = [
+    ("doctorate", ["phd", "ph.d", "doctor", "doctorate", "tiến sĩ", "tiến sỹ"]),
+    ("master", ["master", "msc", "m.sc", "mba", "m.eng", "thạc sĩ", "thạc sỹ", "cao học"]),
+    ("bachelor", ["bachelor", "bsc", "b.sc", "b.eng", "b.a", "cử nhân", "kỹ sư", "kĩ sư", "engineer", "đại học"]),
+    ("associate", ["associate", "cao đẳng", "college", "diploma", "trung cấp"]),
+]
+
+# Tên ngôn ngữ (tiếng Anh/tiếng Việt) -> mã ISO 639-1
+_LANGUAGE_CODES = {
+    "en": ["english", "tiếng anh", "anh văn", "ielts", "toeic", "toefl"],
+    "vi": ["vietnamese", "tiếng việt"],
+    "ja": ["japanese", "tiếng nhật", "jlpt"],
+    "ko": ["korean", "tiếng hàn", "topik"],
+    "zh": ["chinese", "mandarin", "cantonese", "tiếng trung", "tiếng hoa", "hsk"],
+    "fr": ["french", "tiếng pháp"],
+    "de": ["german", "tiếng đức"],
+    "es": ["spanish", "tiếng tây ban nha"],
+    "ru": ["russian", "tiếng nga"],
+    "th": ["thai", "tiếng thái"],
+}
+
+
+def _contains_keyword(text: str, keyword: str) -> bool:
+    # Khớp theo ranh giới từ để "ba" không khớp trong "basic"
+    return re.search(rf"(?<!\w){re.escape(keyword)}(?!\w)", text) is not None
+
+
+def degree_level(degrees: Iterable[str]) -> int:
+    """Trình độ cao nhất trong danh sách bằng cấp (0 nếu không xác định)"""
+    level = 0
+    for degree in degrees or []:
+        text = str(degree).lower()
+        for name, keywords in _DEGREE_KEYWORDS:
+            if any(_contains_keyword(text, keyword) for keyword in keywords):
+                level = max(level, DEGREE_LEVELS[name])
+                break
+    return level
+
+
+def language_codes(languages: Iterable[str]) -> List[str]:
+    """Chuẩn hóa danh sách ngôn ngữ thành mã ISO 639-1 (bỏ qua ngôn ngữ không nhận diện được)"""
+    codes = []
+    for language in languages or []:
+        text = str(language).lower()
+        for code, names in _LANGUAGE_CODES.items():
+            if code not in codes and any(_contains_keyword(text, name) for name in names):
+                codes.append(code)
+    return codes
+
+
+def flatten_filter_metadata(structured_json: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Trích metadata có kiểu để filter từ structured data
+
+    Returns:
+        Dict gồm total_years (float), degree_level (int), lang_<code> (bool),
+        relocation_willingness / travel_willingness (bool) nếu có thông tin
+    """
+    work_experience = structured_json.get("work_experience") or {}
+    education = structured_json.get("education_training") or {}
+    additional = structured_json.get("additional_factors") or {}
+
+    metadata: Dict[str, Any] = {}
+
+    total_years = work_experience.get("total_years")
+    if isinstance(total_years, (int, float)) and not isinstance(total_years, bool):
+        metadata["total_years"] = float(total_years)
+
+    metadata["degree_level"] = degree_level(education.get("degrees") or [])
+
+    for code in language_codes(additional.get("languages") or []):
+        metadata[f"lang_{code}"] = True
+
+    for key in ("relocation_willingness", "travel_willingness"):
+        if isinstance(additional.get(key), bool):
+            metadata[key] = additional[key]
+
+    return metadata
+
+
+def build_where(
+    min_years: Optional[float] = None,
+    min_degree_level: Optional[int] = None,
+    languages: Optional[Iterable[str]] = None,
+    relocation: Optional[bool] = None,
+    travel: Optional[bool] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Tạo where filter của ChromaDB từ các điều kiện lọc
+
+    Args:
+        min_years: Số năm kinh nghiệm tối thiểu
+        min_degree_level: Trình độ tối thiểu (giá trị trong DEGREE_LEVELS)
+        languages: Mã ngôn ngữ ISO 639-1 bắt buộc (tất cả)
+        relocation: Yêu cầu sẵn sàng chuyển nơi ở
+        travel: Yêu cầu sẵn sàng đi công tác
+
+    Returns:
+        Where filter, hoặc None nếu không có điều kiện nào
+    """
+    conditions: List[Dict[str, Any]] = []
+    if min_years is not None:
+        conditions.append({"total_years": {"$gte": float(min_years)}})
+    if min_degree_level is not None:
+        conditions.append({"degree_level": {"$gte": int(min_degree_level)}})
+    for code in languages or []:
+        conditions.append({f"lang_{code.lower()}": {"$eq": True}})
+    if relocation is not None:
+        conditions.append({"relocation_willingness": {"$eq": relocation}})
+    if travel is not None:
+        conditions.append({"travel_willingness": {"$eq": travel}})
+
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
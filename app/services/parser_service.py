@@ -1,12 +1,240 @@
+import hashlib
+import io
+import json
+import logging
+import math
+import multiprocessing
 import os
-from typing import Optional
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
 import pdfplumber
 from docx import Document
 
+from app.services.cache import CacheStats, LRUCache, SQLiteCache, make_cache_key
+
+# Backend PDF native (nhanh hơn pdfplumber nhiều lần) - optional
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+logger = logging.getLogger(__name__)
+
+# Tăng version mỗi khi sửa logic trích xuất/_clean_text để cache text cũ không còn được dùng
+PARSER_VERSION = "v1"
+
+
+@dataclass
+class ParseResult:
+    """Kết quả parse một document"""
+    text: str
+    backend: str
+    pages_total: int = 0
+    pages_parsed: int = 0
+    truncated: bool = False  # True nếu dừng sớm do vượt budget ký tự/token
+
+
+class _PdfDocument(ABC):
+    """Interface chung cho các PDF backend: đếm trang và lấy text theo từng trang"""
+    
+    name = ""
+    
+    @staticmethod
+    def available() -> bool:
+        return True
+    
+    @property
+    @abstractmethod
+    def page_count(self) -> int:
+        ...
+    
+    @abstractmethod
+    def page_text(self, index: int) -> str:
+        ...
+    
+    @abstractmethod
+    def page_layers(self, index: int) -> Tuple[int, int]:
+        """Thống kê nhanh một trang: (số ký tự trong text layer, số đối tượng ảnh)"""
+    
+    def close(self) -> None:
+        pass
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _PyMuPDFDocument(_PdfDocument):
+    name = "pymupdf"
+    
+    def __init__(self, data: bytes):
+        self._doc = fitz.open(stream=data, filetype="pdf")
+    
+    @staticmethod
+    def available() -> bool:
+        return fitz is not None
+    
+    @property
+    def page_count(self) -> int:
+        return self._doc.page_count
+    
+    def page_text(self, index: int) -> str:
+        # sort=True: sắp xếp block theo vị trí (trên xuống, trái sang phải) thay vì thứ tự trong content stream
+        return self._doc.load_page(index).get_text("text", sort=True)
+    
+    def page_layers(self, index: int) -> Tuple[int, int]:
+        page = self._doc.load_page(index)
+        image_count = len(page.get_images())
+        # Trang không dùng font nào thì không có text layer, bỏ qua bước trích xuất text
+        if not page.get_fonts():
+            return 0, image_count
+        return len(page.get_text("text").strip()), image_count
+    
+    def close(self) -> None:
+        self._doc.close()
+
+
+class _PdfiumDocument(_PdfDocument):
+    name = "pypdfium2"
+    
+    def __init__(self, data: bytes):
+        self._doc = pdfium.PdfDocument(data)
+    
+    @staticmethod
+    def available() -> bool:
+        return pdfium is not None
+    
+    @property
+    def page_count(self) -> int:
+        return len(self._doc)
+    
+    def page_text(self, index: int) -> str:
+        page = self._doc[index]
+        textpage = page.get_textpage()
+        try:
+            return textpage.get_text_range()
+        finally:
+            textpage.close()
+            page.close()
+    
+    def page_layers(self, index: int) -> Tuple[int, int]:
+        page = self._doc[index]
+        textpage = page.get_textpage()
+        try:
+            image_count = sum(1 for _ in page.get_objects(filter=[pdfium.raw.FPDF_PAGEOBJ_IMAGE]))
+            return len(textpage.get_text_range().strip()), image_count
+        finally:
+            textpage.close()
+            page.close()
+    
+    def close(self) -> None:
+        self._doc.close()
+
+
+class _PdfplumberDocument(_PdfDocument):
+    name = "pdfplumber"
+    
+    def __init__(self, data: bytes):
+        self._pdf = pdfplumber.open(io.BytesIO(data))
+    
+    @property
+    def page_count(self) -> int:
+        return len(self._pdf.pages)
+    
+    def page_text(self, index: int) -> str:
+        return self._pdf.pages[index].extract_text() or ""
+    
+    def page_layers(self, index: int) -> Tuple[int, int]:
+        page = self._pdf.pages[index]
+        text_chars = sum(1 for char in page.chars if not char["text"].isspace())
+        return text_chars, len(page.images)
+    
+    def close(self) -> None:
+        self._pdf.close()
+
+
+# Thứ tự ưu tiên: backend native trước, pdfplumber (chậm, khôi phục layout tốt) cuối cùng
+PDF_BACKENDS = {
+    backend.name: backend
+    for backend in (_PyMuPDFDocument, _PdfiumDocument, _PdfplumberDocument)
+}
+FALLBACK_PDF_BACKEND = "pdfplumber"
+
+# Trang có ít hơn số ký tự này trong text layer được coi là không có text
+MIN_TEXT_CHARS_PER_PAGE = 20
+
+# Số ký tự trên một token khi quy đổi budget, cố ý thấp (bảo thủ): tiếng Anh ~4 ký tự/token,
+# tiếng Việt có dấu chỉ ~2-3 ký tự/token với tokenizer cl100k_base của OpenAI
+CHARS_PER_TOKEN = 2
+
+
+def _needs_layout_fallback(text: str) -> bool:
+    """
+    Kiểm tra text từ backend native có cần parse lại bằng pdfplumber không:
+    không có text, hoặc phần lớn ký tự không decode được (font thiếu bảng ToUnicode)
+    """
+    if not text.strip():
+        return True
+    
+    undecoded = text.count("\ufffd") + text.count("(cid:")
+    return undecoded / len(text) > 0.05
+
+
+def _extract_page_range(backend: str, data: bytes, start: int, stop: int) -> List[str]:
+    """Trích xuất text các trang [start, stop) - chạy trong process worker"""
+    with PDF_BACKENDS[backend](data) as document:
+        return [document.page_text(index) for index in range(start, stop)]
+
 
 class ParserService:
     """Dịch vụ phân tích cú pháp để trích xuất văn bản từ PDF và DOCX"""
     
+    SUPPORTED_EXTENSIONS = ('.pdf', '.docx')
+    
+    def __init__(
+        self,
+        pdf_backend: str = "auto",
+        parallel_workers: int = 0,
+        parallel_min_pages: int = 12,
+        cache: Optional[SQLiteCache] = None,
+        memory_items: int = 0
+    ):
+        """
+        Khởi tạo ParserService
+        
+        Args:
+            pdf_backend: Backend parse PDF: "auto" (backend native đầu tiên có sẵn),
+                "pymupdf", "pypdfium2" hoặc "pdfplumber". Backend native tự fallback
+                về pdfplumber khi không lấy được text
+            parallel_workers: Số process parse PDF song song theo dải trang (<= 1: tắt)
+            parallel_min_pages: Chỉ parse song song khi PDF có từ số trang này trở lên
+            cache: Cache text đã parse trên đĩa (tùy chọn), key theo sha256 nội dung file
+            memory_items: Số kết quả parse giữ trong bộ nhớ (LRU) trước cache đĩa, 0 = tắt
+        """
+        if pdf_backend != "auto" and pdf_backend not in PDF_BACKENDS:
+            raise ValueError(
+                f"PDF backend không hợp lệ: {pdf_backend}. Chọn auto, {', '.join(PDF_BACKENDS)}"
+            )
+        self.pdf_backend = pdf_backend
+        self.parallel_workers = parallel_workers
+        self.parallel_min_pages = parallel_min_pages
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self.cache = cache
+        self.memory_cache = LRUCache(max_items=memory_items)
+        self.cache_stats = CacheStats()
+    
     def parse_file(self, file_path: str) -> str:
         """
         Trích xuất văn bản thô từ file PDF hoặc DOCX
@@ -24,39 +252,354 @@ class ParserService:
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File không tồn tại: {file_path}")
         
-        file_extension = os.path.splitext(file_path)[1].lower()
+        file_extension = self._check_extension(os.path.splitext(file_path)[1])
+        
+        with open(file_path, 'rb') as stream:
+            return self.parse_stream(stream, file_extension)
+    
+    def parse_bytes(
+        self,
+        data: bytes,
+        ext: str,
+        max_chars: Optional[int] = None,
+        max_tokens: Optional[int] = None
+    ) -> str:
+        """
+        Trích xuất văn bản thô từ nội dung file trong bộ nhớ (không ghi file tạm)
+        
+        Args:
+            data: Nội dung file (bytes)
+            ext: Phần mở rộng của file ('.pdf' hoặc '.docx', có thể bỏ dấu chấm)
+            max_chars: Số ký tự tối đa cần lấy (None = không giới hạn)
+            max_tokens: Số token ước lượng tối đa cần lấy (None = không giới hạn)
+            
+        Returns:
+            Chuỗi văn bản thô đã được dọn dẹp
+            
+        Raises:
+            ValueError: Nếu định dạng không phải là PDF hoặc DOCX
+        """
+        return self.parse_document(data, ext, max_chars=max_chars, max_tokens=max_tokens).text
+    
+    def parse_stream(self, stream: BinaryIO, ext: str) -> str:
+        """
+        Trích xuất văn bản thô từ file-like object (chế độ binary)
+        
+        Args:
+            stream: File-like object chứa nội dung file
+            ext: Phần mở rộng của file ('.pdf' hoặc '.docx', có thể bỏ dấu chấm)
+            
+        Returns:
+            Chuỗi văn bản thô đã được dọn dẹp
+            
+        Raises:
+            ValueError: Nếu định dạng không phải là PDF hoặc DOCX
+        """
+        return self.parse_document(stream.read(), ext).text
+    
+    def parse_document(
+        self,
+        data: bytes,
+        ext: str,
+        max_chars: Optional[int] = None,
+        max_tokens: Optional[int] = None
+    ) -> ParseResult:
+        """
+        Parse nội dung file và trả về text kèm thông tin backend, số trang
+        
+        Khi có budget, việc trích xuất dừng ngay khi đủ số ký tự (các trang còn lại
+        không được parse) và text được cắt theo budget, đánh dấu truncated.
+        
+        Args:
+            data: Nội dung file (bytes)
+            ext: Phần mở rộng của file ('.pdf' hoặc '.docx', có thể bỏ dấu chấm)
+            max_chars: Số ký tự tối đa cần lấy (None = không giới hạn)
+            max_tokens: Số token ước lượng tối đa cần lấy (None = không giới hạn)
+            
+        Returns:
+            ParseResult
+            
+        Raises:
+            ValueError: Nếu định dạng không phải là PDF hoặc DOCX
+        """
+        file_extension = self._check_extension(ext)
+        budget = self._char_budget(max_chars, max_tokens)
+        
+        cache_key = self._make_cache_key(data, file_extension, budget)
+        cached = self._get_cached(cache_key)
+        if cached is not None:
+            return cached
         
         if file_extension == '.pdf':
-            return self._parse_pdf(file_path)
-        elif file_extension == '.docx':
-            return self._parse_docx(file_path)
+            result = self._parse_pdf(data, budget)
+        else:
+            result = self._parse_docx(data, budget)
+        
+        self._set_cached(cache_key, result)
+        return result
+    
+    def get_cached(
+        self,
+        data: bytes,
+        ext: str,
+        max_chars: Optional[int] = None,
+        max_tokens: Optional[int] = None
+    ) -> Optional[ParseResult]:
+        """
+        Kết quả parse đã cache của file (cùng key với parse_document), None nếu chưa có
+        
+        Miss không được tính vào thống kê ở đây mà ở lần parse_document tiếp theo.
+        """
+        budget = self._char_budget(max_chars, max_tokens)
+        cache_key = self._make_cache_key(data, self._check_extension(ext), budget)
+        return self._get_cached(cache_key, record_miss=False)
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Thống kê hit/miss của cache text đã parse"""
+        stats = self.cache_stats.as_dict()
+        stats["memory_items"] = len(self.memory_cache)
+        return stats
+    
+    def _make_cache_key(self, data: bytes, file_extension: str, budget: Optional[int]) -> str:
+        """Cache key: sha256 nội dung file, định dạng, budget, PDF backend và parser version"""
+        return make_cache_key(
+            "parsed-text",
+            PARSER_VERSION,
+            hashlib.sha256(data).hexdigest(),
+            file_extension,
+            self.pdf_backend,
+            str(budget)
+        )
+    
+    def _get_cached(self, cache_key: str, record_miss: bool = True) -> Optional[ParseResult]:
+        """Tìm kết quả parse trong bộ nhớ rồi trên đĩa"""
+        if self.cache is None and self.memory_cache.max_items <= 0:
+            return None
+        
+        result = self.memory_cache.get(cache_key)
+        if result is None and self.cache is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                result = ParseResult(**json.loads(cached))
+                self.memory_cache.set(cache_key, result)
+        
+        if result is None:
+            if record_miss:
+                self.cache_stats.record(misses=1)
         else:
+            self.cache_stats.record(hits=1)
+        return result
+    
+    def _set_cached(self, cache_key: str, result: ParseResult) -> None:
+        self.memory_cache.set(cache_key, result)
+        if self.cache is not None:
+            self.cache.set(cache_key, json.dumps(asdict(result), ensure_ascii=False).encode("utf-8"))
+    
+    def detect_pdf_content(self, data: bytes, max_pages: int = 3) -> str:
+        """
+        Preflight nhanh: phân loại PDF dựa trên text layer và đối tượng ảnh của các trang đầu
+        (không chạy layout analysis toàn bộ file)
+        
+        Args:
+            data: Nội dung file PDF (bytes)
+            max_pages: Số trang đầu được kiểm tra
+            
+        Returns:
+            "text": các trang có text layer
+            "image": không trang nào có text layer (PDF scan/ảnh), đã kiểm tra toàn bộ file
+            "mixed": có cả trang text và trang chỉ có ảnh
+            "unknown": các trang đầu không có text layer nhưng còn trang chưa kiểm tra
+                (ví dụ trang bìa scan) - cần parse đầy đủ để kết luận
+        """
+        backend = self._pdf_backend_chain()[0]
+        
+        with PDF_BACKENDS[backend](data) as document:
+            page_count = document.page_count
+            pages = [document.page_layers(index) for index in range(min(max_pages, page_count))]
+        
+        text_pages = sum(1 for text_chars, _ in pages if text_chars >= MIN_TEXT_CHARS_PER_PAGE)
+        image_only_pages = sum(
+            1 for text_chars, image_count in pages
+            if text_chars < MIN_TEXT_CHARS_PER_PAGE and image_count > 0
+        )
+        
+        if text_pages == 0:
+            return "image" if len(pages) == page_count else "unknown"
+        if image_only_pages > 0:
+            return "mixed"
+        return "text"
+    
+    @staticmethod
+    def _char_budget(max_chars: Optional[int], max_tokens: Optional[int]) -> Optional[int]:
+        """Quy đổi budget về số ký tự (lấy giới hạn chặt hơn nếu có cả hai)"""
+        limits = [limit for limit in (max_chars, max_tokens and max_tokens * CHARS_PER_TOKEN) if limit]
+        return min(limits) if limits else None
+    
+    def _check_extension(self, ext: str) -> str:
+        """Chuẩn hóa phần mở rộng và kiểm tra định dạng được hỗ trợ"""
+        file_extension = ext.lower()
+        if file_extension and not file_extension.startswith('.'):
+            file_extension = '.' + file_extension
+        
+        if file_extension not in self.SUPPORTED_EXTENSIONS:
             raise ValueError(f"Định dạng file không được hỗ trợ: {file_extension}. Chỉ hỗ trợ .pdf và .docx")
+        return file_extension
     
-    def _parse_pdf(self, file_path: str) -> str:
-        """Trích xuất văn bản từ file PDF"""
-        text_parts = []
+    def _pdf_backend_chain(self) -> List[str]:
+        """Danh sách backend sẽ thử theo thứ tự, luôn kết thúc bằng pdfplumber"""
+        if self.pdf_backend == "auto":
+            chain = [name for name, backend in PDF_BACKENDS.items() if backend.available()]
+        elif PDF_BACKENDS[self.pdf_backend].available():
+            chain = [self.pdf_backend]
+        else:
+            logger.warning(f"PDF backend {self.pdf_backend} chưa được cài đặt, dùng {FALLBACK_PDF_BACKEND}")
+            chain = []
         
-        with pdfplumber.open(file_path) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text_parts.append(page_text)
+        if FALLBACK_PDF_BACKEND not in chain:
+            chain.append(FALLBACK_PDF_BACKEND)
+        return chain
+    
+    def _parse_pdf(self, data: bytes, budget: Optional[int] = None) -> ParseResult:
+        """Trích xuất văn bản từ file PDF, thử backend nhanh trước rồi fallback"""
+        chain = self._pdf_backend_chain()
+        result = None
         
-        raw_text = "\n".join(text_parts)
-        return self._clean_text(raw_text)
+        for backend in chain:
+            is_last = backend == chain[-1]
+            try:
+                result = self._extract_pdf(backend, data, budget)
+            except Exception as e:
+                if is_last:
+                    raise
+                logger.warning(f"PDF backend {backend} lỗi, thử backend tiếp theo: {str(e)}")
+                continue
+            
+            if is_last or not _needs_layout_fallback(result.text):
+                return result
+            logger.info(f"PDF backend {backend} không lấy được text hợp lệ, fallback về {chain[-1]}")
+        
+        return result
+    
+    def _extract_pdf(self, backend: str, data: bytes, budget: Optional[int] = None) -> ParseResult:
+        """Trích xuất text các trang bằng một backend cụ thể, dừng khi đủ budget"""
+        with PDF_BACKENDS[backend](data) as document:
+            page_count = document.page_count
+            # File nhỏ parse tuần tự: chi phí mở lại document ở mỗi worker không đáng
+            parallel = self.parallel_workers > 1 and page_count >= self.parallel_min_pages
+            if not parallel:
+                pages = []
+                collected = 0
+                for index in range(page_count):
+                    page_text = document.page_text(index)
+                    pages.append(page_text)
+                    collected += len(page_text)
+                    if budget is not None and collected >= budget:
+                        break
+        
+        if parallel:
+            pages = self._extract_pages_parallel(backend, data, page_count, budget)
+        
+        raw_text = "\n".join(page_text for page_text in pages if page_text)
+        return self._build_result(raw_text, backend, budget, page_count, len(pages))
     
-    def _parse_docx(self, file_path: str) -> str:
+    def _extract_pages_parallel(
+        self,
+        backend: str,
+        data: bytes,
+        page_count: int,
+        budget: Optional[int] = None
+    ) -> List[str]:
+        """Chia PDF theo dải trang cho process pool, ghép kết quả theo đúng thứ tự trang"""
+        chunk_size = math.ceil(page_count / self.parallel_workers)
+        ranges = [(start, min(start + chunk_size, page_count)) for start in range(0, page_count, chunk_size)]
+        
+        pool = self._get_process_pool()
+        futures = [pool.submit(_extract_page_range, backend, data, start, stop) for start, stop in ranges]
+        
+        pages: List[str] = []
+        collected = 0
+        try:
+            for future in futures:
+                range_pages = future.result()
+                pages.extend(range_pages)
+                collected += sum(len(page_text) for page_text in range_pages)
+                if budget is not None and collected >= budget:
+                    # Đủ budget: bỏ các dải trang phía sau chưa chạy
+                    for pending in futures:
+                        pending.cancel()
+                    break
+        except Exception as e:
+            for future in futures:
+                future.cancel()
+            if isinstance(e, BrokenProcessPool):
+                # Worker bị kill (OOM, crash): bỏ pool hỏng, lần sau tạo pool mới
+                with self._pool_lock:
+                    if self._process_pool is pool:
+                        self._process_pool = None
+            raise
+        return pages
+    
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        """Tạo process pool lần đầu cần dùng và tái sử dụng cho các lần parse sau"""
+        with self._pool_lock:
+            if self._process_pool is None:
+                # spawn: an toàn với process cha đang chạy nhiều thread (FastAPI, RabbitMQ worker)
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self.parallel_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._process_pool
+    
+    def close(self) -> None:
+        """Dừng process pool (nếu đã tạo)"""
+        with self._pool_lock:
+            if self._process_pool is not None:
+                self._process_pool.shutdown(wait=True)
+                self._process_pool = None
+    
+    def _parse_docx(self, data: bytes, budget: Optional[int] = None) -> ParseResult:
         """Trích xuất văn bản từ file DOCX"""
-        doc = Document(file_path)
+        doc = Document(io.BytesIO(data))
         text_parts = []
+        collected = 0
+        stopped_early = False
         
-        for paragraph in doc.paragraphs:
+        paragraphs = doc.paragraphs
+        for index, paragraph in enumerate(paragraphs):
             if paragraph.text.strip():
                 text_parts.append(paragraph.text)
+                collected += len(paragraph.text)
+                if budget is not None and collected >= budget:
+                    stopped_early = index < len(paragraphs) - 1
+                    break
         
         raw_text = "\n".join(text_parts)
-        return self._clean_text(raw_text)
+        return self._build_result(raw_text, "python-docx", budget, stopped_early=stopped_early)
+    
+    def _build_result(
+        self,
+        raw_text: str,
+        backend: str,
+        budget: Optional[int],
+        pages_total: int = 0,
+        pages_parsed: int = 0,
+        stopped_early: bool = False
+    ) -> ParseResult:
+        """Dọn dẹp text, cắt theo budget và đóng gói ParseResult"""
+        text = self._clean_text(raw_text)
+        truncated = stopped_early or pages_parsed < pages_total
+        
+        if budget is not None and len(text) > budget:
+            text = text[:budget].rstrip()
+            truncated = True
+        
+        return ParseResult(
+            text=text,
+            backend=backend,
+            pages_total=pages_total,
+            pages_parsed=pages_parsed,
+            truncated=truncated
+        )
     
     def _clean_text(self, text: str) -> str:
         """Dọn dẹp văn bản: loại bỏ khoảng trắng thừa, chuẩn hóa"""
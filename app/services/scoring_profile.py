@@ -0,0 +1,112 @@
+"""
+Scoring Profile
+
+Profile chấm điểm được tính sẵn lúc ingest: với mỗi list field được so khớp bằng
+embedding (xem SEMANTIC_SLOTS), lưu danh sách text và ma trận embedding float32 tương ứng.
+Khi match, ScoringService dùng trực tiếp các vector này thay vì gọi lại OpenAI API.
+"""
+
+import io
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from app.services.embedding_service import EmbeddingService
+from app.services.scoring_service_new import SEMANTIC_SLOTS
+
+
+def profile_fields() -> List[Tuple[str, str]]:
+    """Danh sách (category, field) được lưu trong profile"""
+    return [(category, field) for category, fields in SEMANTIC_SLOTS.values() for field in fields]
+
+
+def build_scoring_profile(structured_json: Dict[str, Any], embedding_service: EmbeddingService) -> Dict[str, Dict[str, Any]]:
+    """
+    Tính profile chấm điểm cho một document (một lần gọi embedding cho mọi field)
+
+    Args:
+        structured_json: Structured data của CV/JD
+        embedding_service: Service tạo embeddings
+
+    Returns:
+        Dict "category.field" -> {"texts": List[str], "vectors": np.ndarray (n x d, float32)}
+    """
+    return build_scoring_profiles([structured_json], embedding_service)[0]
+
+
+def build_scoring_profiles(
+    structured_jsons: List[Dict[str, Any]],
+    embedding_service: EmbeddingService
+) -> List[Dict[str, Dict[str, Any]]]:
+    """
+    Tính profile chấm điểm cho nhiều document với một lần gọi embedding
+    (text trùng nhau giữa các document chỉ được nhúng một lần)
+
+    Args:
+        structured_jsons: Structured data của các CV/JD
+        embedding_service: Service tạo embeddings
+
+    Returns:
+        List profile theo đúng thứ tự đầu vào
+    """
+    documents_field_texts = []
+    for structured_json in structured_jsons:
+        field_texts = {}
+        for category, field in profile_fields():
+            items = (structured_json.get(category) or {}).get(field) or []
+            if items:
+                field_texts[f"{category}.{field}"] = list(items)
+        documents_field_texts.append(field_texts)
+
+    unique_texts = list(dict.fromkeys(
+        text
+        for field_texts in documents_field_texts
+        for texts in field_texts.values()
+        for text in texts
+    ))
+    if not unique_texts:
+        return [{} for _ in structured_jsons]
+
+    embeddings = embedding_service.get_embeddings_batch(unique_texts)
+    vectors = dict(zip(unique_texts, np.asarray(embeddings, dtype=np.float32)))
+
+    return [
+        {
+            key: {"texts": texts, "vectors": np.stack([vectors[text] for text in texts])}
+            for key, texts in field_texts.items()
+        }
+        for field_texts in documents_field_texts
+    ]
+
+
+def profile_vectors(profile: Dict[str, Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """Chuyển profile thành lookup text -> vector"""
+    lookup = {}
+    for entry in profile.values():
+        lookup.update(zip(entry["texts"], entry["vectors"]))
+    return lookup
+
+
+def serialize_profile(profile: Dict[str, Dict[str, Any]]) -> bytes:
+    """Serialize profile thành blob .npz (không dùng pickle)"""
+    arrays = {}
+    for key, entry in profile.items():
+        arrays[f"{key}.vectors"] = np.asarray(entry["vectors"], dtype=np.float32)
+        arrays[f"{key}.texts"] = np.asarray(entry["texts"], dtype=np.str_)
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def deserialize_profile(blob: bytes) -> Dict[str, Dict[str, Any]]:
+    """Đọc profile từ blob .npz"""
+    profile: Dict[str, Dict[str, Any]] = {}
+    with np.load(io.BytesIO(blob), allow_pickle=False) as data:
+        for name in data.files:
+            key, kind = name.rsplit(".", 1)
+            entry = profile.setdefault(key, {})
+            if kind == "texts":
+                entry["texts"] = data[name].tolist()
+            else:
+                entry["vectors"] = data[name]
+    return profile
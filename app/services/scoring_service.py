@@ -1,7 +1,15 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+
+import numpy as np
 
 from app.services.embedding_service import EmbeddingService
 from app.services.scoring_service_new import EnhancedScoringService
+from app.services.scoring_profile import profile_vectors
+
+
+def to_percent(score: float) -> float:
+    """Convert a 0-1 score to the 0-100 scale reported by the API and RabbitMQ responses."""
+    return round(score * 100, 2)
 
 
 class ScoringService:
@@ -16,14 +24,49 @@ class ScoringService:
         Calculate CV-JD match score using the new structured schema exclusively.
 
         Args:
-            cv_data: Dict containing 'structured_json' using the new schema
-            jd_data: Dict containing 'structured_json' using the new schema
+            cv_data: Dict containing 'structured_json' using the new schema, and optionally
+                a precomputed 'scoring_profile'
+            jd_data: Dict containing 'structured_json' using the new schema, and optionally
+                a precomputed 'scoring_profile'
 
         Returns:
             Dict with total_score, breakdown per category, and weights.
         """
-        result = self.enhanced_service.calculate_enhanced_match_score(cv_data, jd_data)
+        result = self.enhanced_service.calculate_enhanced_match_score(
+            cv_data, jd_data, precomputed=self._precomputed_vectors([cv_data, jd_data])
+        )
+        return self._to_response(result)
+
+    def score_many(self, jd_data: Dict[str, Any], cv_data_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Score one JD against many CVs in a single vectorized pass.
+
+        Args:
+            jd_data: Dict containing 'structured_json' of the JD
+            cv_data_list: List of dicts containing 'structured_json' of each CV
+                (each may carry a precomputed 'scoring_profile', as may jd_data)
+
+        Returns:
+            List of results in the same format as calculate_match_score, in input order.
+        """
+        results = self.enhanced_service.score_many(
+            jd_data["structured_json"],
+            [cv_data["structured_json"] for cv_data in cv_data_list],
+            precomputed=self._precomputed_vectors([jd_data, *cv_data_list])
+        )
+        return [self._to_response(result) for result in results]
+
+    @staticmethod
+    def _precomputed_vectors(documents: List[Dict[str, Any]]) -> Optional[Dict[str, np.ndarray]]:
+        """Gộp embeddings từ scoring profile (nếu có) của các document"""
+        lookup: Dict[str, np.ndarray] = {}
+        for document in documents:
+            if document.get("scoring_profile"):
+                lookup.update(profile_vectors(document["scoring_profile"]))
+        return lookup or None
 
+    @staticmethod
+    def _to_response(result: Dict[str, Any]) -> Dict[str, Any]:
         response = {
             "total_score": result["total_score"],
             "breakdown": result["category_scores"],
@@ -3,11 +3,34 @@ Enhanced Scoring Service with detailed breakdown
 Implements new 6-category scoring system
 """
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from app.services.embedding_service import EmbeddingService
 
 
+# Trọng số cho từng nhóm hard skills (nhóm core skills có trọng số cao hơn)
+HARD_SKILL_WEIGHTS = [
+    ("programming_languages", 2.0),
+    ("technologies_frameworks", 1.5),
+    ("tools_software", 1.0),
+    ("certifications", 1.2),
+    ("industry_specific_skills", 1.3)
+]
+
+# Các danh sách được so khớp bằng embedding: slot -> (category, fields)
+SEMANTIC_SLOTS = {
+    "hard_skills": ("hard_skills", [field for field, _ in HARD_SKILL_WEIGHTS]),
+    "job_titles": ("work_experience", ["job_titles"]),
+    "key_responsibilities": ("responsibilities_achievements", ["key_responsibilities"]),
+    "soft_skills": ("soft_skills", [
+        "communication_teamwork",
+        "leadership_management",
+        "problem_solving",
+        "adaptability"
+    ]),
+    "majors": ("education_training", ["majors"])
+}
+
+
 class EnhancedScoringService:
     """
     Enhanced scoring service implementing the 6-category evaluation system:
@@ -38,13 +61,16 @@ class EnhancedScoringService:
             "additional_factors": 0.15        # 15.0%
         }
     
-    def calculate_enhanced_match_score(self, cv_data: Dict[str, Any], jd_data: Dict[str, Any]) -> Dict[str, Any]:
+    def calculate_enhanced_match_score(self, cv_data: Dict[str, Any], jd_data: Dict[str, Any],
+                                       precomputed: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, Any]:
         """
         Calculate comprehensive matching score using new structure
         
         Args:
             cv_data: Dictionary with 'embedding' and 'structured_json'
             jd_data: Dictionary with 'embedding' and 'structured_json'
+            precomputed: Optional text -> embedding lookup (from stored scoring profiles);
+                only texts missing from it are sent to the embedding service
             
         Returns:
             Detailed matching result with category breakdown
@@ -58,8 +84,47 @@ class EnhancedScoringService:
                 "Structured data must include new schema fields (hard_skills, work_experience, etc.)"
             )
         
+        # Embed toàn bộ text cần thiết cho 6 tiêu chí trong một lần gọi API
+        lookup = self._embed_texts(self._collect_semantic_texts(jd_struct, [cv_struct]), precomputed)
+        semantic_scores = self._semantic_scores(cv_struct, jd_struct, lookup)
+        
+        return self._build_result(cv_struct, jd_struct, semantic_scores)
+    
+    def score_many(self, jd_struct: Dict[str, Any], cv_structs: List[Dict[str, Any]],
+                   precomputed: Optional[Dict[str, np.ndarray]] = None) -> List[Dict[str, Any]]:
+        """
+        Score one JD against many CVs in a single vectorized pass
+        
+        All semantic fields of the JD and every CV are embedded in one batch; the
+        max-similarities of each semantic slot are computed with one matmul over
+        all candidates followed by segment reductions.
+        
+        Args:
+            jd_struct: Structured JSON of the Job Description
+            cv_structs: List of structured JSON of the CVs
+            precomputed: Optional text -> embedding lookup (from stored scoring profiles)
+            
+        Returns:
+            List of results (same format as calculate_enhanced_match_score), in input order
+        """
+        for cv_struct in cv_structs:
+            if not self._check_new_structure(cv_struct, jd_struct):
+                raise ValueError(
+                    "Structured data must include new schema fields (hard_skills, work_experience, etc.)"
+                )
+        
+        lookup = self._embed_texts(self._collect_semantic_texts(jd_struct, cv_structs), precomputed)
+        semantic_scores = self._batch_semantic_scores(jd_struct, cv_structs, lookup)
+        
+        return [
+            self._build_result(cv_struct, jd_struct, cv_semantic_scores)
+            for cv_struct, cv_semantic_scores in zip(cv_structs, semantic_scores)
+        ]
+    
+    def _build_result(self, cv_struct: Dict, jd_struct: Dict, semantic_scores: Dict[str, float]) -> Dict[str, Any]:
+        """Combine category scores into the final result"""
         # Use new detailed scoring
-        scores = self._calculate_detailed_scores(cv_struct, jd_struct)
+        scores = self._calculate_detailed_scores(cv_struct, jd_struct, semantic_scores)
         
         # Calculate total score
         total_score = sum(
@@ -79,38 +144,190 @@ class EnhancedScoringService:
         """Check if data has new structure"""
         return ("hard_skills" in cv_struct and "hard_skills" in jd_struct)
     
-    def _calculate_detailed_scores(self, cv_struct: Dict, jd_struct: Dict) -> Dict[str, float]:
+    def _slot_items(self, struct: Dict, slot: str) -> List[str]:
+        """Lấy toàn bộ text của một semantic slot (nối các field theo thứ tự)"""
+        category, fields = SEMANTIC_SLOTS[slot]
+        section = struct.get(category) or {}
+        items = []
+        for field in fields:
+            items.extend(section.get(field) or [])
+        return items
+    
+    def _collect_semantic_texts(self, jd_struct: Dict, cv_structs: List[Dict]) -> List[str]:
+        """
+        Gom toàn bộ text cần embed cho các semantic slot (đã loại trùng, giữ thứ tự)
+        
+        Chỉ các slot mà cả JD và CV đều có dữ liệu mới cần embedding.
+        """
+        texts: Dict[str, None] = {}
+        for slot in SEMANTIC_SLOTS:
+            jd_items = self._slot_items(jd_struct, slot)
+            if not jd_items:
+                continue
+            jd_added = False
+            for cv_struct in cv_structs:
+                cv_items = self._slot_items(cv_struct, slot)
+                if cv_items:
+                    texts.update(dict.fromkeys(cv_items))
+                    jd_added = True
+            if jd_added:
+                texts.update(dict.fromkeys(jd_items))
+        return list(texts)
+    
+    def _embed_texts(self, texts: List[str],
+                     precomputed: Optional[Dict[str, np.ndarray]] = None) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Embed danh sách text trong một lần gọi và chuẩn hóa về unit vector
+        
+        Text đã có trong precomputed không được gửi lên embedding service.
+        
+        Returns:
+            Dict text -> vector đã chuẩn hóa, hoặc None nếu gọi embedding thất bại
+            (các tiêu chí sẽ fallback về so khớp chính xác)
+        """
+        if not texts:
+            return {}
+        precomputed = precomputed or {}
+        try:
+            missing = [text for text in texts if text not in precomputed]
+            fetched = dict(zip(missing, self.embedding_service.get_embeddings_batch(missing))) if missing else {}
+            embeddings = [precomputed[text] if text in precomputed else fetched[text] for text in texts]
+            matrix = np.asarray(embeddings, dtype=np.float64)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms == 0, 1.0, norms)
+            return dict(zip(texts, matrix))
+        except Exception:
+            return None
+    
+    def _max_similarities(self, cv_items: List[str], jd_items: List[str], lookup: Dict[str, np.ndarray]) -> np.ndarray:
+        """Cosine similarity lớn nhất của mỗi item JD so với các item CV"""
+        jd_matrix = np.stack([lookup[item] for item in jd_items])
+        cv_matrix = np.stack([lookup[item] for item in cv_items])
+        return np.max(jd_matrix @ cv_matrix.T, axis=1)
+    
+    def _semantic_scores(self, cv_struct: Dict, jd_struct: Dict,
+                         lookup: Optional[Dict[str, np.ndarray]]) -> Dict[str, float]:
+        """
+        Tính điểm semantic cho các slot mà cả CV và JD đều có dữ liệu
+        
+        Returns:
+            Dict slot -> score. Slot vắng mặt nghĩa là dùng fallback (so khớp chính xác)
+        """
+        if lookup is None:
+            return {}
+        
+        scores = {}
+        for slot in SEMANTIC_SLOTS:
+            cv_items = self._slot_items(cv_struct, slot)
+            jd_items = self._slot_items(jd_struct, slot)
+            if not cv_items or not jd_items:
+                continue
+            
+            max_similarities = self._max_similarities(cv_items, jd_items, lookup)
+            if slot == "hard_skills":
+                jd_weights = self._hard_skill_weights(jd_struct.get("hard_skills") or {})
+                score = float(np.sum(max_similarities * jd_weights) / np.sum(jd_weights))
+                scores[slot] = max(0.0, min(1.0, score))
+            else:
+                scores[slot] = float(np.mean(max_similarities))
+        return scores
+    
+    def _batch_semantic_scores(self, jd_struct: Dict, cv_structs: List[Dict],
+                               lookup: Optional[Dict[str, np.ndarray]]) -> List[Dict[str, float]]:
+        """
+        Vectorized version of _semantic_scores for one JD and many CVs
+        
+        For each slot, the items of all candidates are laid out as contiguous
+        segments of one similarity matrix (JD items x CV items); np.maximum.reduceat
+        then yields the per-candidate max-similarities.
+        """
+        results: List[Dict[str, float]] = [{} for _ in cv_structs]
+        if lookup is None:
+            return results
+        
+        for slot in SEMANTIC_SLOTS:
+            jd_items = self._slot_items(jd_struct, slot)
+            if not jd_items:
+                continue
+            
+            owners = []        # Index của CV có dữ liệu cho slot
+            offsets = []       # Vị trí bắt đầu segment của từng CV
+            columns = []       # Cột (text duy nhất) ứng với từng item CV
+            column_index: Dict[str, int] = {}
+            for idx, cv_struct in enumerate(cv_structs):
+                cv_items = self._slot_items(cv_struct, slot)
+                if not cv_items:
+                    continue
+                owners.append(idx)
+                offsets.append(len(columns))
+                for item in cv_items:
+                    columns.append(column_index.setdefault(item, len(column_index)))
+            
+            if not owners:
+                continue
+            
+            # Similarity chỉ tính trên text duy nhất, sau đó gather theo segment
+            jd_matrix = np.stack([lookup[item] for item in jd_items])
+            unique_matrix = np.stack([lookup[item] for item in column_index])
+            similarities = (jd_matrix @ unique_matrix.T)[:, columns]
+            segment_max = np.maximum.reduceat(similarities, offsets, axis=1)
+            
+            if slot == "hard_skills":
+                jd_weights = self._hard_skill_weights(jd_struct.get("hard_skills") or {})
+                slot_scores = np.clip(jd_weights @ segment_max / np.sum(jd_weights), 0.0, 1.0)
+            else:
+                slot_scores = np.mean(segment_max, axis=0)
+            
+            for idx, score in zip(owners, slot_scores):
+                results[idx][slot] = float(score)
+        
+        return results
+    
+    def _hard_skill_weights(self, jd_skills: Dict) -> np.ndarray:
+        """Trọng số của từng hard skill trong JD, theo đúng thứ tự của slot hard_skills"""
+        weights = []
+        for category, weight in HARD_SKILL_WEIGHTS:
+            weights.extend([weight] * len(jd_skills.get(category) or []))
+        return np.asarray(weights, dtype=np.float64)
+    
+    def _calculate_detailed_scores(self, cv_struct: Dict, jd_struct: Dict,
+                                   semantic_scores: Dict[str, float]) -> Dict[str, float]:
         """Calculate scores for each category using new structure"""
         scores = {}
         
         # 1. Hard Skills (30.0%)
         scores["hard_skills"] = self._score_hard_skills(
             cv_struct.get("hard_skills", {}),
-            jd_struct.get("hard_skills", {})
+            jd_struct.get("hard_skills", {}),
+            semantic_scores.get("hard_skills")
         )
         
         # 2. Work Experience (25.0%)
         scores["work_experience"] = self._score_work_experience(
             cv_struct.get("work_experience", {}),
-            jd_struct.get("work_experience", {})
+            jd_struct.get("work_experience", {}),
+            semantic_scores.get("job_titles")
         )
         
         # 3. Responsibilities & Achievements (15.0%)
         scores["responsibilities"] = self._score_responsibilities(
             cv_struct.get("responsibilities_achievements", {}),
-            jd_struct.get("responsibilities_achievements", {})
+            jd_struct.get("responsibilities_achievements", {}),
+            semantic_scores.get("key_responsibilities")
         )
         
         # 4. Soft Skills (10.0%)
         scores["soft_skills"] = self._score_soft_skills(
             cv_struct.get("soft_skills", {}),
-            jd_struct.get("soft_skills", {})
+            jd_struct.get("soft_skills", {}),
+            semantic_scores.get("soft_skills")
         )
         
         # 5. Education & Training (5.0%)
         scores["education"] = self._score_education(
             cv_struct.get("education_training", {}),
-            jd_struct.get("education_training", {})
+            jd_struct.get("education_training", {}),
+            semantic_scores.get("majors")
         )
         
         # 6. Additional Factors (15.0%)
@@ -121,64 +338,28 @@ class EnhancedScoringService:
         
         return scores
     
-    def _score_hard_skills(self, cv_skills: Dict, jd_skills: Dict) -> float:
+    def _score_hard_skills(self, cv_skills: Dict, jd_skills: Dict, semantic_score: Optional[float] = None) -> float:
         """Score hard skills with emphasis on technical match"""
         all_cv_skills = []
         all_jd_skills = []
         
-        # Collect all skills with appropriate weights
-        skill_categories = [
-            ("programming_languages", 2.0),      # Higher weight for core skills
-            ("technologies_frameworks", 1.5),
-            ("tools_software", 1.0),
-            ("certifications", 1.2),
-            ("industry_specific_skills", 1.3)
-        ]
-        
-        for category, weight in skill_categories:
-            cv_items = cv_skills.get(category, [])
-            jd_items = jd_skills.get(category, [])
-            
-            # Add with weights
-            all_cv_skills.extend([(item, weight) for item in cv_items])
-            all_jd_skills.extend([(item, weight) for item in jd_items])
+        for category, _ in HARD_SKILL_WEIGHTS:
+            all_cv_skills.extend(cv_skills.get(category) or [])
+            all_jd_skills.extend(jd_skills.get(category) or [])
         
         if not all_jd_skills:
             return 1.0
         if not all_cv_skills:
             return 0.0
         
-        # Calculate weighted semantic similarity
-        try:
-            cv_skill_names = [s[0] for s in all_cv_skills]
-            jd_skill_names = [s[0] for s in all_jd_skills]
-            jd_weights = [s[1] for s in all_jd_skills]
-            
-            # Get embeddings
-            all_skills = cv_skill_names + jd_skill_names
-            embeddings = self.embedding_service.get_embeddings_batch(all_skills)
-            
-            cv_embeddings = embeddings[:len(cv_skill_names)]
-            jd_embeddings = embeddings[len(cv_skill_names):]
-            
-            # Calculate similarity matrix
-            similarity_matrix = cosine_similarity(jd_embeddings, cv_embeddings)
-            
-            # Get max similarity for each JD skill with weighting
-            max_similarities = np.max(similarity_matrix, axis=1)
-            weighted_similarities = max_similarities * jd_weights
-            
-            score = float(np.sum(weighted_similarities) / np.sum(jd_weights))
-            return max(0.0, min(1.0, score))
-            
-        except Exception:
-            # Fallback to simple matching
-            return self._simple_match_score(
-                [s[0] for s in all_cv_skills],
-                [s[0] for s in all_jd_skills]
-            )
+        # Weighted semantic similarity đã được tính sẵn từ embedding chung
+        if semantic_score is not None:
+            return semantic_score
+        
+        # Fallback to simple matching
+        return self._simple_match_score(all_cv_skills, all_jd_skills)
     
-    def _score_work_experience(self, cv_exp: Dict, jd_exp: Dict) -> float:
+    def _score_work_experience(self, cv_exp: Dict, jd_exp: Dict, title_semantic: Optional[float] = None) -> float:
         """Score work experience comprehensively"""
         scores = []
         
@@ -186,7 +367,7 @@ class EnhancedScoringService:
         cv_titles = cv_exp.get("job_titles", [])
         jd_titles = jd_exp.get("job_titles", [])
         if jd_titles:
-            title_score = self._semantic_list_match(cv_titles, jd_titles)
+            title_score = self._semantic_list_match(cv_titles, jd_titles, title_semantic)
             scores.append((title_score, 0.4))  # 40% weight for titles
         
         # Industry matching
@@ -213,7 +394,7 @@ class EnhancedScoringService:
         
         return weighted_score
     
-    def _score_responsibilities(self, cv_resp: Dict, jd_resp: Dict) -> float:
+    def _score_responsibilities(self, cv_resp: Dict, jd_resp: Dict, resp_semantic: Optional[float] = None) -> float:
         """Score responsibilities and achievements"""
         scores = []
         
@@ -221,7 +402,7 @@ class EnhancedScoringService:
         cv_responsibilities = cv_resp.get("key_responsibilities", [])
         jd_responsibilities = jd_resp.get("key_responsibilities", [])
         if jd_responsibilities:
-            resp_score = self._semantic_list_match(cv_responsibilities, jd_responsibilities)
+            resp_score = self._semantic_list_match(cv_responsibilities, jd_responsibilities, resp_semantic)
             scores.append((resp_score, 0.6))  # 60% for responsibilities
         
         # Achievements
@@ -245,7 +426,7 @@ class EnhancedScoringService:
         total_weight = sum(w for _, w in scores)
         return sum(s * w for s, w in scores) / total_weight if total_weight > 0 else 0.0
     
-    def _score_soft_skills(self, cv_soft: Dict, jd_soft: Dict) -> float:
+    def _score_soft_skills(self, cv_soft: Dict, jd_soft: Dict, semantic_score: Optional[float] = None) -> float:
         """Score soft skills"""
         all_cv_soft = []
         all_jd_soft = []
@@ -266,9 +447,9 @@ class EnhancedScoringService:
         if not all_cv_soft:
             return 0.5  # Soft skills often implicit
         
-        return self._semantic_list_match(all_cv_soft, all_jd_soft)
+        return self._semantic_list_match(all_cv_soft, all_jd_soft, semantic_score)
     
-    def _score_education(self, cv_edu: Dict, jd_edu: Dict) -> float:
+    def _score_education(self, cv_edu: Dict, jd_edu: Dict, major_semantic: Optional[float] = None) -> float:
         """Score education and training"""
         scores = []
         
@@ -283,7 +464,7 @@ class EnhancedScoringService:
         cv_majors = cv_edu.get("majors", [])
         jd_majors = jd_edu.get("majors", [])
         if jd_majors:
-            major_score = self._semantic_list_match(cv_majors, jd_majors)
+            major_score = self._semantic_list_match(cv_majors, jd_majors, major_semantic)
             scores.append((major_score, 0.3))
         
         # Additional courses (shows continuous learning)
@@ -329,26 +510,16 @@ class EnhancedScoringService:
         total_weight = sum(w for _, w in scores)
         return sum(s * w for s, w in scores) / total_weight if total_weight > 0 else 0.0
     
-    def _semantic_list_match(self, cv_list: List[str], jd_list: List[str]) -> float:
-        """Match two lists using semantic similarity"""
+    def _semantic_list_match(self, cv_list: List[str], jd_list: List[str],
+                             semantic_score: Optional[float] = None) -> float:
+        """Match two lists using precomputed semantic similarity, fallback to exact match"""
         if not jd_list:
             return 1.0
         if not cv_list:
             return 0.0
-        
-        try:
-            all_items = cv_list + jd_list
-            embeddings = self.embedding_service.get_embeddings_batch(all_items)
-            
-            cv_embeddings = embeddings[:len(cv_list)]
-            jd_embeddings = embeddings[len(cv_list):]
-            
-            similarity_matrix = cosine_similarity(jd_embeddings, cv_embeddings)
-            max_similarities = np.max(similarity_matrix, axis=1)
-            
-            return float(np.mean(max_similarities))
-        except Exception:
-            return self._simple_match_score(cv_list, jd_list)
+        if semantic_score is not None:
+            return semantic_score
+        return self._simple_match_score(cv_list, jd_list)
     
     def _simple_match_score(self, cv_list: List[str], jd_list: List[str]) -> float:
         """Simple exact match scoring"""
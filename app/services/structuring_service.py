@@ -1,30 +1,44 @@
 import json
+import unicodedata
 from datetime import datetime
 from pathlib import Path
 from openai import OpenAI
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+from app.services.cache import CacheStats, SQLiteCache, make_cache_key
+
+
+STRUCTURING_MODEL = "gpt-4o-mini"
+
+# Tăng version mỗi khi sửa system prompt/user message để cache cũ không còn được dùng
+PROMPT_VERSION = "v1"
 
 
 class StructuringService:
     """Dịch vụ cấu trúc hóa dữ liệu sử dụng GPT-4o-mini"""
     
-    def __init__(self, openai_client: OpenAI):
+    def __init__(self, openai_client: OpenAI, cache: Optional[SQLiteCache] = None):
         """
         Khởi tạo StructuringService
         
         Args:
             openai_client: Client OpenAI đã được khởi tạo
+            cache: Cache kết quả trích xuất (tùy chọn), key theo hash của
+                (text đã chuẩn hóa, JSON schema, model, prompt version)
         """
         self.client = openai_client
+        self.cache = cache
+        self.cache_stats = CacheStats()
     
-    def get_structured_data(self, text_content: str, schema: BaseModel) -> dict:
+    def get_structured_data(self, text_content: str, schema: BaseModel, use_cache: bool = True) -> dict:
         """
         Trích xuất và cấu trúc hóa dữ liệu từ văn bản sử dụng GPT-4o-mini
         
         Args:
             text_content: Văn bản thô cần phân tích
             schema: Pydantic model định nghĩa cấu trúc dữ liệu mong muốn
+            use_cache: False để bỏ qua cache và luôn gọi LLM (kết quả mới vẫn được ghi vào cache)
             
         Returns:
             Dictionary chứa dữ liệu đã được cấu trúc hóa
@@ -32,6 +46,16 @@ class StructuringService:
         # Lấy JSON schema từ Pydantic model
         json_schema = schema.model_json_schema()
         
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self._make_cache_key(text_content, json_schema)
+            if use_cache:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    self.cache_stats.record(hits=1)
+                    return json.loads(cached)
+                self.cache_stats.record(misses=1)
+        
         # Create system prompt in English
         system_prompt = f"""You are an expert in extracting structured data from CVs and Job Descriptions with extensive experience in recruitment and talent matching.
 
@@ -109,7 +133,7 @@ LEGACY FIELDS (for backward compatibility):
         try:
             # Gọi API Chat Completions
             response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
+                model=STRUCTURING_MODEL,
                 response_format={"type": "json_object"},
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -136,6 +160,9 @@ LEGACY FIELDS (for backward compatibility):
             # Parse JSON
             structured_data = json.loads(content)
             
+            if cache_key is not None:
+                self.cache.set(cache_key, json.dumps(structured_data, ensure_ascii=False).encode("utf-8"))
+            
             return structured_data
             
         except json.JSONDecodeError as e:
@@ -143,6 +170,16 @@ LEGACY FIELDS (for backward compatibility):
         except Exception as e:
             raise RuntimeError(f"Lỗi khi gọi OpenAI API: {e}")
 
+    def _make_cache_key(self, text_content: str, json_schema: Dict[str, Any]) -> str:
+        """Cache key: hash của text đã chuẩn hóa (NFC, gộp khoảng trắng), schema, model và prompt version"""
+        normalized_text = " ".join(unicodedata.normalize("NFC", text_content).split())
+        return make_cache_key(
+            normalized_text,
+            json.dumps(json_schema, sort_keys=True, ensure_ascii=False),
+            STRUCTURING_MODEL,
+            PROMPT_VERSION
+        )
+    
     def _dump_prompts(self, timestamp: str, payload: Dict[str, Any]) -> None:
         """
         Lưu prompts vào thư mục io_dump/prompts để tiện kiểm tra
@@ -1,7 +1,22 @@
 import chromadb
 import json
+import os
 from chromadb.config import Settings as ChromaSettings
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable
+
+from app.services.document_store import DocumentStore
+from app.services.embedding_matrix import EmbeddingMatrix
+from app.services.metadata_filters import flatten_filter_metadata
+from app.services.scoring_profile import serialize_profile, deserialize_profile
+
+# Số document tối đa mỗi lần ghi vào ChromaDB (dưới giới hạn max batch size của ChromaDB)
+WRITE_BATCH_SIZE = 1000
+
+# Số document mỗi trang khi đọc embeddings từ ChromaDB để bổ sung embedding matrix
+REBUILD_PAGE_SIZE = 5000
+
+# Đánh dấu document có structured data trong DocumentStore (document cũ lưu JSON string trong metadata)
+STORAGE_VERSION = 2
 
 
 class VectorStoreService:
@@ -30,10 +45,19 @@ class VectorStoreService:
             name="jd_collection",
             metadata={"description": "Collection lưu trữ Job Description embeddings và metadata"}
         )
+        
+        # Kho SQLite cạnh ChromaDB cho dữ liệu theo doc_id (structured data, scoring profiles)
+        self.document_store = DocumentStore(os.path.join(persist_directory, "documents.sqlite3"))
+        
+        # Snapshot embeddings dạng ma trận NumPy memory-mapped cho brute-force top-k / batch ranking
+        self.embedding_matrices = {
+            name: EmbeddingMatrix(os.path.join(persist_directory, "embedding_matrix", name))
+            for name in ("cv_collection", "jd_collection")
+        }
     
     def add_document(self, collection_name: str, doc_id: str, embedding: List[float], metadata: Dict[str, Any]) -> None:
         """
-        Thêm document vào collection
+        Thêm document vào collection (doc_id đã tồn tại sẽ được ghi đè)
         
         Args:
             collection_name: Tên collection ("cv_collection" hoặc "jd_collection")
@@ -41,27 +65,78 @@ class VectorStoreService:
             embedding: Vector nhúng của document
             metadata: Metadata chứa structured JSON và các thông tin khác
         """
-        collection = self._get_collection(collection_name)
+        self.upsert_documents(collection_name, [doc_id], [embedding], [metadata])
+    
+    def add_documents(
+        self,
+        collection_name: str,
+        doc_ids: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict[str, Any]]
+    ) -> None:
+        """
+        Thêm nhiều document vào collection (doc_id đã tồn tại sẽ được ghi đè)
         
-        # ChromaDB chỉ chấp nhận str, int, float, bool trong metadata
-        # Cần serialize các list/dict thành JSON string
-        sanitized_metadata = {}
-        for key, value in metadata.items():
-            if isinstance(value, (list, dict)):
-                # Chuyển list/dict thành JSON string
-                sanitized_metadata[key] = json.dumps(value, ensure_ascii=False)
-            elif value is None:
-                # Bỏ qua None
-                continue
-            else:
-                # Giữ nguyên str, int, float, bool
-                sanitized_metadata[key] = value
+        Args:
+            collection_name: Tên collection
+            doc_ids: Danh sách ID
+            embeddings: Danh sách vector nhúng, cùng thứ tự với doc_ids
+            metadatas: Danh sách metadata, cùng thứ tự với doc_ids
+        """
+        self.upsert_documents(collection_name, doc_ids, embeddings, metadatas)
+    
+    def upsert_documents(
+        self,
+        collection_name: str,
+        doc_ids: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict[str, Any]]
+    ) -> None:
+        """
+        Ghi nhiều document theo từng chunk (mỗi chunk một lần ghi vào ChromaDB)
         
-        collection.add(
-            embeddings=[embedding],
-            ids=[doc_id],
-            metadatas=[sanitized_metadata]
+        Structured data được lưu nguyên vẹn trong DocumentStore (một blob JSON mỗi doc),
+        metadata trong ChromaDB chỉ giữ các trường scalar nhỏ để filter.
+        
+        Args:
+            collection_name: Tên collection
+            doc_ids: Danh sách ID
+            embeddings: Danh sách vector nhúng, cùng thứ tự với doc_ids
+            metadatas: Danh sách metadata, cùng thứ tự với doc_ids
+        """
+        if not (len(doc_ids) == len(embeddings) == len(metadatas)):
+            raise ValueError("doc_ids, embeddings và metadatas phải có cùng số phần tử")
+        
+        collection = self._get_collection(collection_name)
+        
+        self.document_store.save_documents(
+            collection_name,
+            {
+                doc_id: json.dumps(metadata, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                for doc_id, metadata in zip(doc_ids, metadatas)
+            }
         )
+        
+        filter_metadatas = [self._filter_metadata(metadata) for metadata in metadatas]
+        for start in range(0, len(doc_ids), WRITE_BATCH_SIZE):
+            end = start + WRITE_BATCH_SIZE
+            collection.upsert(
+                embeddings=embeddings[start:end],
+                ids=doc_ids[start:end],
+                metadatas=filter_metadatas[start:end]
+            )
+        
+        self.embedding_matrices[collection_name].upsert(doc_ids, embeddings)
+    
+    def _filter_metadata(self, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Metadata cho ChromaDB: chỉ storage_version và các trường lọc có kiểu trích từ structured
+        data (xem metadata_filters). Các trường khác, nhất là thông tin cá nhân (họ tên, email,
+        số điện thoại), chỉ nằm trong DocumentStore
+        """
+        filter_metadata = {"storage_version": STORAGE_VERSION}
+        filter_metadata.update(flatten_filter_metadata(metadata))
+        return filter_metadata
     
     def get_document_by_id(self, collection_name: str, doc_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -74,38 +149,251 @@ class VectorStoreService:
         Returns:
             Dictionary chứa embedding và metadata, hoặc None nếu không tìm thấy
         """
+        return self.get_documents_by_ids(collection_name, [doc_id]).get(doc_id)
+    
+    def get_documents_by_ids(
+        self,
+        collection_name: str,
+        doc_ids: Iterable[str],
+        include_embeddings: bool = True
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Lấy nhiều document trong một truy vấn
+        
+        Args:
+            collection_name: Tên collection
+            doc_ids: Danh sách ID
+            include_embeddings: False để chỉ lấy metadata (nhẹ hơn)
+            
+        Returns:
+            Dict doc_id -> {"embedding", "metadata"} (ID không tồn tại sẽ không có trong kết quả)
+        """
         collection = self._get_collection(collection_name)
+        doc_ids = list(dict.fromkeys(doc_ids))
+        if not doc_ids:
+            return {}
         
         try:
-            result = collection.get(
-                ids=[doc_id],
-                include=["embeddings", "metadatas"]
-            )
-            
-            if result["ids"]:
-                raw_metadata = result["metadatas"][0]
-                
-                # Deserialize JSON strings về list/dict
-                deserialized_metadata = {}
-                for key, value in raw_metadata.items():
-                    if isinstance(value, str):
-                        # Thử parse JSON string
-                        try:
-                            deserialized_metadata[key] = json.loads(value)
-                        except (json.JSONDecodeError, TypeError):
-                            # Nếu không phải JSON, giữ nguyên string
-                            deserialized_metadata[key] = value
-                    else:
-                        deserialized_metadata[key] = value
-                
+            if not include_embeddings:
+                # Chỉ cần structured data: đọc từ DocumentStore, ChromaDB chỉ dùng cho document cũ
+                structured = self._load_structured(collection_name, doc_ids)
                 return {
-                    "embedding": result["embeddings"][0],
-                    "metadata": deserialized_metadata
+                    doc_id: {"embedding": None, "metadata": structured[doc_id]}
+                    for doc_id in doc_ids if doc_id in structured
                 }
-            return None
             
+            result = collection.get(ids=doc_ids, include=["embeddings", "metadatas"])
+            raw_metadatas = dict(zip(result["ids"], result["metadatas"]))
+            structured = self._load_structured(collection_name, result["ids"], raw_metadatas)
         except Exception as e:
             raise RuntimeError(f"Lỗi khi lấy document từ collection: {e}")
+        
+        return {
+            doc_id: {"embedding": embedding, "metadata": structured[doc_id]}
+            for doc_id, embedding in zip(result["ids"], result["embeddings"])
+        }
+    
+    def _load_structured(
+        self,
+        collection_name: str,
+        doc_ids: List[str],
+        raw_metadatas: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Lấy structured data của nhiều document: một truy vấn DocumentStore, mỗi doc một lần decode
+        
+        Document cũ (chưa có trong DocumentStore) được decode từ metadata JSON string trong ChromaDB.
+        
+        Args:
+            collection_name: Tên collection
+            doc_ids: Danh sách ID
+            raw_metadatas: Metadata ChromaDB đã lấy sẵn (doc_id -> metadata), None để tự truy vấn
+        """
+        blobs = self.document_store.get_documents(collection_name, doc_ids)
+        structured = {doc_id: json.loads(blob) for doc_id, blob in blobs.items()}
+        
+        legacy_ids = [doc_id for doc_id in doc_ids if doc_id not in structured]
+        if legacy_ids:
+            if raw_metadatas is None:
+                result = self._get_collection(collection_name).get(ids=legacy_ids, include=["metadatas"])
+                raw_metadatas = dict(zip(result["ids"], result["metadatas"]))
+            for doc_id in legacy_ids:
+                if doc_id in raw_metadatas:
+                    structured[doc_id] = self._deserialize_metadata(raw_metadatas[doc_id] or {})
+        
+        return structured
+    
+    def query_similar(self, collection_name: str, embedding: List[float], k: int = 50) -> List[Dict[str, Any]]:
+        """
+        Tìm k document gần nhất với embedding (ANN query trên index của ChromaDB)
+        
+        Args:
+            collection_name: Tên collection
+            embedding: Vector truy vấn
+            k: Số document tối đa cần lấy
+            
+        Returns:
+            List dict {"id", "distance", "metadata"} sắp xếp theo khoảng cách tăng dần
+        """
+        return self.query(collection_name, embedding, k=k)
+    
+    def query(
+        self,
+        collection_name: str,
+        embedding: List[float],
+        k: int = 50,
+        where: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Tìm k document gần nhất với embedding trong số các document thỏa where filter
+        (filter được ChromaDB áp dụng ngay trong lúc tìm kiếm)
+        
+        Args:
+            collection_name: Tên collection
+            embedding: Vector truy vấn
+            k: Số document tối đa cần lấy
+            where: Where filter của ChromaDB trên metadata (xem metadata_filters.build_where)
+            
+        Returns:
+            List dict {"id", "distance", "metadata"} sắp xếp theo khoảng cách tăng dần
+        """
+        collection = self._get_collection(collection_name)
+        
+        try:
+            n_results = min(k, collection.count())
+            if n_results <= 0:
+                return []
+            
+            result = collection.query(
+                query_embeddings=[embedding],
+                n_results=n_results,
+                where=where,
+                include=["metadatas", "distances"]
+            )
+            
+            hit_ids = result["ids"][0]
+            structured = self._load_structured(
+                collection_name,
+                hit_ids,
+                dict(zip(hit_ids, result["metadatas"][0]))
+            )
+            
+            return [
+                {
+                    "id": doc_id,
+                    "distance": distance,
+                    "metadata": structured.get(doc_id, {})
+                }
+                for doc_id, distance in zip(hit_ids, result["distances"][0])
+            ]
+            
+        except Exception as e:
+            raise RuntimeError(f"Lỗi khi truy vấn collection: {e}")
+    
+    def get_embedding_matrix(self, collection_name: str) -> EmbeddingMatrix:
+        """
+        Lấy embedding matrix của collection, bổ sung từ ChromaDB nếu matrix chưa có hoặc có ít
+        hàng hơn collection (ví dụ: document được thêm trước khi có embedding matrix)
+        
+        Số hàng lệch tạm thời do ghi đồng thời (ChromaDB ghi trước, matrix ghi sau) không làm
+        matrix bị xóa: hàng đã có được giữ nguyên, hàng thiếu được nối thêm.
+        
+        Args:
+            collection_name: Tên collection
+        """
+        collection = self._get_collection(collection_name)
+        matrix = self.embedding_matrices[collection_name]
+        matrix.backfill(collection.count(), self._iter_embedding_pages(collection))
+        return matrix
+    
+    @staticmethod
+    def _iter_embedding_pages(collection) -> Iterable[tuple]:
+        """Đọc (ids, embeddings) của collection theo trang"""
+        offset = 0
+        while True:
+            page = collection.get(include=["embeddings"], limit=REBUILD_PAGE_SIZE, offset=offset)
+            if not page["ids"]:
+                break
+            yield page["ids"], page["embeddings"]
+            offset += len(page["ids"])
+    
+    def search_embeddings(self, collection_name: str, embedding: List[float], k: int = 50) -> List[Dict[str, Any]]:
+        """
+        Brute-force top-k trên embedding matrix (cosine similarity, không qua index của ChromaDB)
+        
+        Kết quả cùng định dạng với query. Collection dùng khoảng cách L2 bình phương mặc định
+        của ChromaDB; với embedding đã chuẩn hóa (OpenAI) khoảng cách đó bằng 2 - 2 * cosine.
+        
+        Args:
+            collection_name: Tên collection
+            embedding: Vector truy vấn
+            k: Số document tối đa cần lấy
+            
+        Returns:
+            List dict {"id", "distance", "metadata"} sắp xếp theo khoảng cách tăng dần
+        """
+        matrix = self.get_embedding_matrix(collection_name)
+        hits = matrix.top_k(embedding, k)
+        documents = self.get_documents_by_ids(
+            collection_name, [doc_id for doc_id, _ in hits], include_embeddings=False
+        )
+        return [
+            {"id": doc_id, "distance": 2.0 - 2.0 * score, "metadata": documents[doc_id]["metadata"]}
+            for doc_id, score in hits
+            if doc_id in documents
+        ]
+    
+    def save_scoring_profile(self, collection_name: str, doc_id: str, profile: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Lưu scoring profile (ma trận embedding của các list field) của document
+        
+        Args:
+            collection_name: Tên collection
+            doc_id: ID của document
+            profile: Profile tạo bởi build_scoring_profile
+        """
+        self._get_collection(collection_name)
+        self.document_store.save_profile(collection_name, doc_id, serialize_profile(profile))
+    
+    def save_scoring_profiles(self, collection_name: str, profiles: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Lưu scoring profile của nhiều document trong một transaction
+        
+        Args:
+            collection_name: Tên collection
+            profiles: Dict doc_id -> profile
+        """
+        self._get_collection(collection_name)
+        self.document_store.save_profiles(
+            collection_name,
+            {doc_id: serialize_profile(profile) for doc_id, profile in profiles.items()}
+        )
+    
+    def get_scoring_profiles(self, collection_name: str, doc_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Lấy scoring profile của nhiều document
+        
+        Returns:
+            Dict doc_id -> profile (document chưa có profile sẽ không có trong kết quả)
+        """
+        self._get_collection(collection_name)
+        blobs = self.document_store.get_profiles(collection_name, doc_ids)
+        return {doc_id: deserialize_profile(blob) for doc_id, blob in blobs.items()}
+    
+    def _deserialize_metadata(self, raw_metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Deserialize JSON strings trong metadata về list/dict (định dạng cũ, trước DocumentStore)"""
+        deserialized_metadata = {}
+        for key, value in raw_metadata.items():
+            if isinstance(value, str):
+                # Thử parse JSON string
+                try:
+                    deserialized_metadata[key] = json.loads(value)
+                except (json.JSONDecodeError, TypeError):
+                    # Nếu không phải JSON, giữ nguyên string
+                    deserialized_metadata[key] = value
+            else:
+                deserialized_metadata[key] = value
+        return deserialized_metadata
     
     def _get_collection(self, collection_name: str):
         """Lấy collection theo tên"""
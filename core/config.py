@@ -35,7 +35,52 @@ class Settings(BaseSettings):
     RABBITMQ_HEARTBEAT: int = 600
     RABBITMQ_BLOCKED_CONNECTION_TIMEOUT: int = 300
     RABBITMQ_PREFETCH_COUNT: int = 1  # Process 1 message at a time
-    
+    RABBITMQ_CONSUMER_WORKERS: int = 1  # Số message xử lý đồng thời (prefetch tự tăng theo số worker)
+
+    # Ranking Configuration
+    RANK_SHORTLIST_MULTIPLIER: int = 3  # Shortlist = k * multiplier CV từ vector search trước khi rerank
+    RANK_MAX_K: int = 500
+    MATCH_BATCH_MAX_CVS: int = 5000  # Số cv_ids tối đa mỗi request POST /match/batch
+
+    # API Concurrency Configuration (các bước blocking chạy trong thread pool, giới hạn theo stage)
+    API_EXECUTOR_WORKERS: int = 32
+    API_PARSE_CONCURRENCY: int = 4  # Parse PDF/DOCX (CPU)
+    API_STRUCTURING_CONCURRENCY: int = 16  # Gọi chat completions
+    API_EMBEDDING_CONCURRENCY: int = 16  # Gọi embeddings (kể cả scoring profile)
+    API_STORE_CONCURRENCY: int = 8  # Đọc/ghi ChromaDB + DocumentStore
+    API_SCORING_CONCURRENCY: int = 8  # Chấm điểm CV-JD
+    API_BATCH_MAX_FILES: int = 200  # Số file tối đa mỗi request POST /process/cvs
+
+    # Job Configuration (POST /jobs/cv xử lý nền)
+    JOB_STORE_PATH: str = "./data/jobs.sqlite3"
+    JOB_WORKERS: int = 4  # Số job chạy đồng thời
+    JOB_CALLBACK_TIMEOUT_SECONDS: float = 10.0
+    JOB_LEASE_SECONDS: float = 60.0  # Job running không được gia hạn quá thời gian này mới bị worker khác xếp lại
+
+    # Parser Configuration
+    PDF_PARSER_BACKEND: str = "auto"  # auto | pymupdf | pypdfium2 | pdfplumber
+    PDF_PARALLEL_WORKERS: int = 4  # Số process parse PDF lớn theo dải trang, mọi backend (<= 1: tắt)
+    PDF_PARALLEL_MIN_PAGES: int = 12  # PDF nhỏ hơn ngưỡng này được parse tuần tự
+    PDF_PREFLIGHT_PAGES: int = 3  # Số trang đầu kiểm tra text layer trước khi parse (phát hiện PDF scan)
+    # Budget text CV (token, quy đổi bảo thủ 2 ký tự/token) dùng cho cả structuring và embedding.
+    # Phải <= giới hạn input của text-embedding-3-small (8191 token) kể cả với tiếng Việt có dấu.
+    # 0 = không giới hạn (CV quá dài sẽ lỗi ở bước embedding)
+    PARSER_MAX_TOKENS: int = 6000
+
+    # Cache Configuration
+    CACHE_DIR: str = "./cache"
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_MEMORY_ITEMS: int = 20000  # Số vector giữ trong bộ nhớ (LRU)
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 500000  # Số vector tối đa lưu trên đĩa
+    STRUCTURING_CACHE_ENABLED: bool = True
+    STRUCTURING_CACHE_MAX_ENTRIES: int = 50000
+    STRUCTURING_CACHE_TTL_SECONDS: int = 30 * 24 * 3600  # 30 ngày
+    PARSER_CACHE_ENABLED: bool = True
+    PARSER_CACHE_MEMORY_ITEMS: int = 256  # Số kết quả parse giữ trong bộ nhớ (LRU)
+    PARSER_CACHE_MAX_ENTRIES: int = 20000
+    RABBITMQ_BRANCH_WORKERS: int = 4  # Số thread xử lý nhánh JD song song với nhánh CV
+    JD_MEMO_MAX_ITEMS: int = 256  # Số JD (structured data + embedding) giữ trong bộ nhớ của RabbitMQ worker
+
     model_config = ConfigDict(
         env_file="config.env",
         env_file_encoding="utf-8"
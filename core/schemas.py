@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 
 class HardSkills(BaseModel):
@@ -207,6 +207,44 @@ class ScoreResponse(BaseModel):
     breakdown: ScoreBreakdown
 
 
+class RankedCandidate(BaseModel):
+    cv_id: str
+    total_score: float = Field(description="Điểm tổng hợp (0-100)")
+    vector_distance: float = Field(description="Khoảng cách vector giữa CV và JD trong ChromaDB")
+    breakdown: ScoreBreakdown
+
+
+class RankResponse(BaseModel):
+    jd_id: str
+    shortlist_size: int = Field(description="Số CV lấy từ vector search trước khi rerank")
+    candidates: List[RankedCandidate]
+
+
+class MatchBatchRequest(BaseModel):
+    jd_id: str
+    cv_ids: List[str]
+    offset: int = Field(default=0, ge=0, description="Vị trí bắt đầu trong danh sách đã sắp xếp")
+    limit: Optional[int] = Field(default=None, ge=1, description="Số kết quả tối đa (None: tất cả)")
+
+
+class MatchBatchItem(BaseModel):
+    cv_id: str
+    total_score: float = Field(description="Điểm tổng hợp (0-100)")
+    breakdown: ScoreBreakdown
+
+
+class MatchBatchResponse(BaseModel):
+    jd_id: str
+    total: int = Field(description="Số CV được chấm điểm (trước khi phân trang)")
+    offset: int
+    limit: Optional[int] = None
+    missing_cv_ids: List[str] = Field(
+        default_factory=list,
+        description="CV không tồn tại hoặc lưu theo schema cũ (không chấm điểm được)"
+    )
+    results: List[MatchBatchItem] = Field(description="Sắp xếp theo total_score giảm dần")
+
+
 class ProcessResponse(BaseModel):
     doc_id: str
     structured_data: StructuredData
@@ -215,3 +253,32 @@ class ProcessResponse(BaseModel):
 class JDInput(BaseModel):
     text: str
 
+
+class BatchFileResult(BaseModel):
+    filename: str
+    doc_id: Optional[str] = None
+    structured_data: Optional[StructuredData] = None
+    stage: Optional[str] = Field(default=None, description="Stage bị lỗi: validate | parse | structuring | embedding | store")
+    error: Optional[str] = None
+
+
+class BatchProcessResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BatchFileResult] = Field(description="Kết quả theo đúng thứ tự file upload")
+
+
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: str
+
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    kind: str
+    status: str = Field(description="queued | running | succeeded | failed")
+    timings: Dict[str, float] = Field(default_factory=dict, description="Thời gian (ms) từng stage")
+    result: Optional[ProcessResponse] = None
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
@@ -1,6 +1,9 @@
 """Test cases cho API endpoints"""
 import pytest
 import json
+import asyncio
+import threading
+import time
 from fastapi.testclient import TestClient
 from unittest.mock import patch, MagicMock, Mock
 import tempfile
@@ -8,6 +11,8 @@ import os
 import uuid
 
 from app.api.main import app
+from app.api.executor import StageExecutor
+from app.api.jobs import JobRunner, StageTimer
 from core.schemas import StructuredData
 from tests.test_data import SAMPLE_CV_TEXT, SAMPLE_JD_TEXT
 
@@ -73,7 +78,7 @@ class TestProcessCV:
                                   mock_structuring, mock_parser, client, mock_openai):
         """Test xử lý CV thành công"""
         # Mock parser
-        mock_parser.parse_file.return_value = SAMPLE_CV_TEXT
+        mock_parser.parse_bytes.return_value = SAMPLE_CV_TEXT
         
         # Mock structuring
         mock_structuring.get_structured_data.return_value = {
@@ -108,6 +113,9 @@ class TestProcessCV:
             assert "doc_id" in data
             assert "structured_data" in data
             mock_vector_store.add_document.assert_called_once()
+            # File được parse trực tiếp từ bộ nhớ
+            mock_parser.parse_bytes.assert_called_once()
+            assert mock_parser.parse_bytes.call_args[0] == (b"fake pdf content", ".pdf")
         
         finally:
             if os.path.exists(tmp_file_path):
@@ -134,6 +142,143 @@ class TestProcessCV:
                 os.remove(tmp_file_path)
 
 
+class TestProcessCVStream:
+    """Test POST /process/cv/stream endpoint (Server-Sent Events)"""
+    
+    @staticmethod
+    def _events(body):
+        events = []
+        for block in body.strip().split("\n\n"):
+            lines = dict(line.split(": ", 1) for line in block.split("\n"))
+            events.append((lines["event"], json.loads(lines["data"])))
+        return events
+    
+    @patch('app.api.main.parser_service')
+    @patch('app.api.main.structuring_service')
+    @patch('app.api.main.embedding_service')
+    @patch('app.api.main.vector_store_service')
+    def test_stream_emits_stage_events(self, mock_vector_store, mock_embedding,
+                                       mock_structuring, mock_parser, client):
+        """Mỗi stage hoàn tất gửi một event, structured_data có ngay sau structuring"""
+        mock_parser.parse_bytes.return_value = SAMPLE_CV_TEXT
+        mock_structuring.get_structured_data.return_value = {"full_name": "Nguyễn Văn A"}
+        mock_embedding.get_embedding.return_value = [0.1] * 100
+        
+        response = client.post(
+            "/process/cv/stream",
+            files={"file": ("test.pdf", b"fake pdf content", "application/pdf")}
+        )
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = self._events(response.text)
+        assert [name for name, _ in events] == ["parsed", "structured", "embedded", "stored"]
+        assert events[1][1]["structured_data"]["full_name"] == "Nguyễn Văn A"
+        assert events[3][1]["doc_id"] == mock_vector_store.add_document.call_args.kwargs["doc_id"]
+    
+    @patch('app.api.main.parser_service')
+    @patch('app.api.main.structuring_service')
+    def test_stream_reports_stage_error(self, mock_structuring, mock_parser, client):
+        """Lỗi ở một stage gửi event error rồi kết thúc stream"""
+        mock_parser.parse_bytes.return_value = SAMPLE_CV_TEXT
+        mock_structuring.get_structured_data.side_effect = RuntimeError("rate limit")
+        
+        response = client.post(
+            "/process/cv/stream",
+            files={"file": ("test.pdf", b"fake pdf content", "application/pdf")}
+        )
+        
+        events = self._events(response.text)
+        assert [name for name, _ in events] == ["parsed", "error"]
+        assert events[1][1]["stage"] == "structuring"
+
+
+class TestProcessCVs:
+    """Test POST /process/cvs endpoint"""
+    
+    @patch('app.api.main.build_scoring_profiles')
+    @patch('app.api.main.parser_service')
+    @patch('app.api.main.structuring_service')
+    @patch('app.api.main.embedding_service')
+    @patch('app.api.main.vector_store_service')
+    def test_process_cvs_partial_failures(self, mock_vector_store, mock_embedding,
+                                          mock_structuring, mock_parser, mock_profiles, client):
+        """Lỗi của từng file được trả về riêng, các file còn lại ghi trong một lần"""
+        def parse(content, extension, max_tokens=None):
+            if content == b"broken":
+                raise ValueError("Không thể đọc PDF")
+            return content.decode()
+        
+        mock_parser.parse_bytes.side_effect = parse
+        mock_structuring.get_structured_data.return_value = {"full_name": "Nguyễn Văn A"}
+        mock_embedding.get_embeddings_batch.side_effect = lambda texts: [[0.1] * 10 for _ in texts]
+        mock_profiles.side_effect = lambda jsons, service: [{} for _ in jsons]
+        
+        response = client.post(
+            "/process/cvs",
+            files=[
+                ("files", ("a.pdf", b"CV A", "application/pdf")),
+                ("files", ("b.txt", b"CV B", "text/plain")),
+                ("files", ("c.pdf", b"broken", "application/pdf")),
+                ("files", ("d.docx", b"CV D", "application/octet-stream")),
+            ]
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["succeeded"], data["failed"]) == (2, 2)
+        assert [result["filename"] for result in data["results"]] == ["a.pdf", "b.txt", "c.pdf", "d.docx"]
+        assert [result["stage"] for result in data["results"]] == [None, "validate", "parse", None]
+        
+        # Embedding một lần cho cả batch, ghi vector store một lần
+        mock_embedding.get_embeddings_batch.assert_called_once_with(["CV A", "CV D"])
+        mock_vector_store.upsert_documents.assert_called_once()
+        doc_ids = mock_vector_store.upsert_documents.call_args[0][1]
+        assert doc_ids == [data["results"][0]["doc_id"], data["results"][3]["doc_id"]]
+    
+    @patch('app.api.main.build_scoring_profiles')
+    @patch('app.api.main.parser_service')
+    @patch('app.api.main.structuring_service')
+    @patch('app.api.main.embedding_service')
+    @patch('app.api.main.vector_store_service')
+    def test_process_cvs_invalid_structured_data(self, mock_vector_store, mock_embedding,
+                                                 mock_structuring, mock_parser, mock_profiles, client):
+        """Structured data sai schema chỉ làm lỗi file đó, các file khác vẫn được lưu"""
+        mock_parser.parse_bytes.side_effect = lambda content, extension, max_tokens=None: content.decode()
+        mock_structuring.get_structured_data.side_effect = lambda text, schema: (
+            {"full_name": ["không", "hợp", "lệ"]} if text == "CV B" else {"full_name": "Nguyễn Văn A"}
+        )
+        mock_embedding.get_embeddings_batch.side_effect = lambda texts: [[0.1] * 10 for _ in texts]
+        mock_profiles.side_effect = lambda jsons, service: [{} for _ in jsons]
+        
+        response = client.post(
+            "/process/cvs",
+            files=[
+                ("files", ("a.pdf", b"CV A", "application/pdf")),
+                ("files", ("b.pdf", b"CV B", "application/pdf")),
+            ]
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["succeeded"], data["failed"]) == (1, 1)
+        assert data["results"][1]["stage"] == "structuring"
+        # CV lỗi không được lưu
+        assert len(mock_vector_store.upsert_documents.call_args[0][1]) == 1
+    
+    def test_process_cvs_too_many_files(self, client):
+        with patch('app.api.main.settings.API_BATCH_MAX_FILES', 1):
+            response = client.post(
+                "/process/cvs",
+                files=[
+                    ("files", ("a.pdf", b"A", "application/pdf")),
+                    ("files", ("b.pdf", b"B", "application/pdf")),
+                ]
+            )
+        
+        assert response.status_code == 400
+
+
 class TestProcessJD:
     """Test POST /process/jd endpoint"""
     
@@ -240,3 +385,255 @@ class TestMatchCVJD:
         assert response.status_code == 404
         assert "Không tìm thấy" in response.json()["detail"]
 
+
+
+class TestMatchBatch:
+    """Test POST /match/batch endpoint"""
+    
+    @patch('app.api.main.vector_store_service')
+    @patch('app.api.main.scoring_service')
+    def test_match_batch_sorted_and_paginated(self, mock_scoring, mock_vector_store, client):
+        """Một lần đọc hàng loạt CV, một lượt score_many, kết quả sắp xếp và phân trang"""
+        def get_documents(collection_name, doc_ids, include_embeddings=True):
+            if collection_name == "jd_collection":
+                return {"jd_1": {"embedding": None, "metadata": {"hard_skills": {}}}}
+            return {
+                doc_id: {"embedding": None, "metadata": {"hard_skills": {}}}
+                for doc_id in doc_ids if doc_id != "cv_missing"
+            }
+        
+        mock_vector_store.get_documents_by_ids.side_effect = get_documents
+        mock_vector_store.get_scoring_profiles.return_value = {}
+        mock_scoring.score_many.return_value = [
+            {"total_score": score, "breakdown": {"hard_skills": score}} for score in (0.2, 0.9, 0.5)
+        ]
+        
+        response = client.post("/match/batch", json={
+            "jd_id": "jd_1",
+            "cv_ids": ["cv_a", "cv_b", "cv_missing", "cv_c"],
+            "offset": 0,
+            "limit": 2
+        })
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 3
+        assert data["missing_cv_ids"] == ["cv_missing"]
+        assert [item["cv_id"] for item in data["results"]] == ["cv_b", "cv_c"]
+        assert [item["total_score"] for item in data["results"]] == [90.0, 50.0]
+        assert all(0 <= item["breakdown"]["hard_skills_score"] <= 100 for item in data["results"])
+        
+        mock_scoring.score_many.assert_called_once()
+        assert len(mock_scoring.score_many.call_args[0][1]) == 3
+        cv_read = mock_vector_store.get_documents_by_ids.call_args_list[1]
+        assert cv_read.args[1] == ["cv_a", "cv_b", "cv_missing", "cv_c"]
+    
+    @patch('app.api.main.vector_store_service')
+    def test_match_batch_jd_not_found(self, mock_vector_store, client):
+        mock_vector_store.get_documents_by_ids.return_value = {}
+        
+        response = client.post("/match/batch", json={"jd_id": "missing", "cv_ids": ["cv_a"]})
+        
+        assert response.status_code == 404
+
+
+class TestRankCandidates:
+    """Test GET /rank/{jd_id} endpoint"""
+    
+    @patch('app.api.main.vector_store_service')
+    @patch('app.api.main.scoring_service')
+    def test_rank_candidates_success(self, mock_scoring, mock_vector_store, client):
+        """Không có điều kiện lọc: shortlist brute-force trên embedding matrix được rerank theo total_score"""
+        mock_vector_store.get_document_by_id.return_value = {
+            "embedding": [0.1] * 100,
+            "metadata": {"hard_skills": {"programming_languages": ["Python"]}}
+        }
+        mock_vector_store.search_embeddings.return_value = [
+            {"id": "cv_a", "distance": 0.1, "metadata": {"hard_skills": {}}},
+            {"id": "cv_b", "distance": 0.2, "metadata": {"hard_skills": {}}},
+            {"id": "cv_legacy", "distance": 0.3, "metadata": {"skills": ["Python"]}},
+        ]
+        mock_scoring.score_many.return_value = [
+            {"total_score": 0.4, "breakdown": {"hard_skills": 0.4}},
+            {"total_score": 0.9, "breakdown": {"hard_skills": 0.9}},
+        ]
+        
+        response = client.get("/rank/jd_id_456?k=1")
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["shortlist_size"] == 2
+        assert [c["cv_id"] for c in data["candidates"]] == ["cv_b"]
+        # Cùng thang 0-100 với RabbitMQ response
+        assert data["candidates"][0]["total_score"] == 90.0
+        assert data["candidates"][0]["breakdown"]["hard_skills_score"] == 90.0
+        for candidate in data["candidates"]:
+            assert 0 <= candidate["total_score"] <= 100
+            assert all(0 <= score <= 100 for score in candidate["breakdown"].values())
+        mock_vector_store.search_embeddings.assert_called_once()
+        assert mock_vector_store.search_embeddings.call_args.args[0] == "cv_collection"
+        mock_vector_store.query.assert_not_called()
+        mock_scoring.score_many.assert_called_once()
+    
+    @patch('app.api.main.vector_store_service')
+    @patch('app.api.main.scoring_service')
+    def test_rank_candidates_with_filters(self, mock_scoring, mock_vector_store, client):
+        """Điều kiện lọc được chuyển thành where filter cho vector search"""
+        mock_vector_store.get_document_by_id.return_value = {"embedding": [0.1] * 100, "metadata": {}}
+        mock_vector_store.query.return_value = []
+        mock_scoring.score_many.return_value = []
+        
+        response = client.get("/rank/jd_id_456?min_years=3&min_degree=bachelor&languages=en")
+        
+        assert response.status_code == 200
+        mock_vector_store.search_embeddings.assert_not_called()
+        assert mock_vector_store.query.call_args.kwargs["where"] == {"$and": [
+            {"total_years": {"$gte": 3.0}},
+            {"degree_level": {"$gte": 2}},
+            {"lang_en": {"$eq": True}},
+        ]}
+    
+    def test_rank_candidates_invalid_degree(self, client):
+        """min_degree không hợp lệ"""
+        response = client.get("/rank/jd_id_456?min_degree=kindergarten")
+        
+        assert response.status_code == 400
+    
+    @patch('app.api.main.vector_store_service')
+    def test_rank_candidates_jd_not_found(self, mock_vector_store, client):
+        """Test với JD không tồn tại"""
+        mock_vector_store.get_document_by_id.return_value = None
+        
+        response = client.get("/rank/nonexistent_jd")
+        
+        assert response.status_code == 404
+        assert "Không tìm thấy" in response.json()["detail"]
+
+
+class TestStageExecutor:
+    """Test StageExecutor"""
+    
+    def test_stage_limit_bounds_concurrency(self):
+        """Số tác vụ chạy đồng thời của một stage không vượt quá giới hạn"""
+        executor = StageExecutor(max_workers=8, stage_limits={"parse": 2})
+        lock = threading.Lock()
+        state = {"running": 0, "peak": 0}
+        
+        def work(value):
+            with lock:
+                state["running"] += 1
+                state["peak"] = max(state["peak"], state["running"])
+            time.sleep(0.05)
+            with lock:
+                state["running"] -= 1
+            return value * 2
+        
+        async def run_all():
+            return await asyncio.gather(*[executor.run("parse", work, i) for i in range(6)])
+        
+        try:
+            results = asyncio.run(run_all())
+        finally:
+            executor.executor.shutdown(wait=True)
+        
+        assert results == [0, 2, 4, 6, 8, 10]
+        assert state["peak"] == 2
+
+
+class TestJobs:
+    """Test job nền: POST /jobs/cv, GET /jobs/{job_id}"""
+    
+    @patch('app.api.main.job_runner')
+    @patch('app.api.main.job_store')
+    def test_submit_cv_job(self, mock_job_store, mock_job_runner, client):
+        """Job được tạo và trả về 202 ngay"""
+        mock_job_store.create_job.return_value = "job_1"
+        
+        response = client.post(
+            "/jobs/cv",
+            files={"file": ("cv.pdf", b"%PDF-1.4", "application/pdf")},
+            data={"callback_url": "https://example.com/hook"}
+        )
+        
+        assert response.status_code == 202
+        assert response.json() == {"job_id": "job_1", "status": "queued"}
+        assert mock_job_store.create_job.call_args.kwargs["callback_url"] == "https://example.com/hook"
+        mock_job_runner.submit.assert_called_once_with("job_1")
+    
+    def test_submit_cv_job_invalid_callback(self, client):
+        """callback_url không phải http/https"""
+        response = client.post(
+            "/jobs/cv",
+            files={"file": ("cv.pdf", b"%PDF-1.4", "application/pdf")},
+            data={"callback_url": "ftp://example.com"}
+        )
+        
+        assert response.status_code == 400
+    
+    @patch('app.api.main.job_store')
+    def test_get_job_not_found(self, mock_job_store, client):
+        mock_job_store.get_job.return_value = None
+        
+        response = client.get("/jobs/missing")
+        
+        assert response.status_code == 404
+    
+    @patch('app.api.main.build_scoring_profile')
+    @patch('app.api.main.parser_service')
+    @patch('app.api.main.structuring_service')
+    @patch('app.api.main.embedding_service')
+    @patch('app.api.main.vector_store_service')
+    def test_cv_job_uses_job_id_as_doc_id(self, mock_vector_store, mock_embedding,
+                                          mock_structuring, mock_parser, mock_profile):
+        """Chạy lại job (sau khi khởi động lại) ghi đè cùng document thay vì tạo bản sao"""
+        from app.api.main import _run_cv_job
+        
+        mock_parser.parse_bytes.return_value = SAMPLE_CV_TEXT
+        mock_structuring.get_structured_data.return_value = {"full_name": "Nguyễn Văn A"}
+        mock_embedding.get_embedding.return_value = [0.1] * 10
+        
+        first = _run_cv_job("job_1", b"data", "cv.pdf", StageTimer())
+        second = _run_cv_job("job_1", b"data", "cv.pdf", StageTimer())
+        
+        assert first["doc_id"] == second["doc_id"] == "job_1"
+        assert [call.kwargs["doc_id"] for call in mock_vector_store.add_document.call_args_list] == ["job_1", "job_1"]
+    
+    def test_runner_records_timings_and_calls_back(self, tmp_path):
+        """JobRunner chạy pipeline, lưu timings/kết quả và gọi callback"""
+        from app.services.job_store import JobStore
+        
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        job_id = store.create_job("cv", b"data", filename="cv.pdf", callback_url="https://example.com/hook")
+        
+        def pipeline(job_id, content, filename, timer):
+            with timer.stage("parse"):
+                assert content == b"data"
+            return {"doc_id": job_id}
+        
+        runner = JobRunner(store, pipelines={"cv": pipeline}, workers=1)
+        with patch('app.api.jobs.requests.post') as mock_post:
+            runner.submit(job_id)
+            runner.shutdown()
+        
+        job = store.get_job(job_id)
+        assert job["status"] == "succeeded"
+        assert job["result"] == {"doc_id": job_id}
+        assert set(job["timings"]) == {"parse", "total"}
+        assert mock_post.call_args.args[0] == "https://example.com/hook"
+        assert mock_post.call_args.kwargs["json"]["status"] == "succeeded"
+    
+    def test_runner_skips_job_claimed_elsewhere(self, tmp_path):
+        """Job đã được worker khác nhận không bị chạy lần hai"""
+        from app.services.job_store import JobStore
+        
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        job_id = store.create_job("cv", b"data")
+        assert store.claim_job(job_id, "other-host:1")
+        
+        pipeline = MagicMock()
+        runner = JobRunner(store, pipelines={"cv": pipeline}, workers=1)
+        runner.submit(job_id)
+        runner.shutdown()
+        
+        pipeline.assert_not_called()
+        assert store.get_job(job_id)["status"] == "running"
@@ -0,0 +1,104 @@
+"""Test cases cho RabbitMQ Consumer"""
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+
+from app.rabbitmq.consumer import RabbitMQConsumer
+
+
+def make_consumer(worker_count):
+    """RabbitMQConsumer với connection, producer và handlers đã được mock"""
+    with patch('app.rabbitmq.consumer.RabbitMQConnection'), \
+         patch('app.rabbitmq.consumer.RabbitMQProducer'), \
+         patch('app.rabbitmq.consumer.MessageHandlers'):
+        return RabbitMQConsumer(worker_count=worker_count)
+
+
+def make_delivery(payload, delivery_tag=1):
+    method = MagicMock(delivery_tag=delivery_tag)
+    properties = MagicMock(correlation_id="corr-1")
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+    return method, properties, body
+
+
+class TestProcessMessage:
+    """Test phân loại kết quả xử lý message"""
+
+    @pytest.fixture
+    def consumer(self):
+        return make_consumer(worker_count=1)
+
+    def test_success_acks_with_response(self, consumer):
+        response = {"applicationId": 1, "isSuccess": True}
+        consumer.message_handlers.handle_message.return_value = (True, response, None)
+        _, properties, body = make_delivery({"applicationId": 1})
+
+        assert consumer._process_message(properties, body) == (response, True)
+
+    def test_invalid_json_acks_with_error_response(self, consumer):
+        _, properties, body = make_delivery(b"not json")
+
+        response, ack = consumer._process_message(properties, body)
+
+        assert ack is True
+        assert response["isSuccess"] is False
+        assert "Invalid JSON format" in response["error"]
+
+    def test_system_error_nacks_without_response(self, consumer):
+        consumer.message_handlers.handle_message.return_value = (
+            False, {"error": "Failed to download CV file"}, "SYSTEM_ERROR"
+        )
+        _, properties, body = make_delivery({"applicationId": 1})
+
+        assert consumer._process_message(properties, body) == (None, False)
+
+
+class TestConcurrentConsumer:
+    """Test chế độ nhiều worker"""
+
+    def test_ack_is_scheduled_on_connection_thread(self):
+        consumer = make_consumer(worker_count=2)
+        response = {"applicationId": 1, "isSuccess": True}
+        consumer.message_handlers.handle_message.return_value = (True, response, None)
+        channel = MagicMock()
+        method, properties, body = make_delivery({"applicationId": 1}, delivery_tag=7)
+
+        consumer._on_message_callback(channel, method, properties, body)
+        consumer.executor.shutdown(wait=True)
+
+        # Worker thread không gọi trực tiếp API của pika
+        channel.basic_ack.assert_not_called()
+        consumer.producer.send_direct_response.assert_not_called()
+
+        add_callback = consumer.connection_manager.connection.add_callback_threadsafe
+        add_callback.assert_called_once()
+        add_callback.call_args[0][0]()
+
+        consumer.producer.send_direct_response.assert_called_once_with(response)
+        channel.basic_ack.assert_called_once_with(delivery_tag=7)
+
+    def test_single_worker_processes_inline(self):
+        consumer = make_consumer(worker_count=1)
+        consumer.message_handlers.handle_message.return_value = (
+            False, {"error": "boom"}, "SYSTEM_ERROR"
+        )
+        channel = MagicMock()
+        method, properties, body = make_delivery({"applicationId": 1}, delivery_tag=3)
+
+        consumer._on_message_callback(channel, method, properties, body)
+
+        assert consumer.executor is None
+        channel.basic_nack.assert_called_once_with(delivery_tag=3, requeue=True)
+
+    def test_send_failure_nacks(self):
+        """Không gửi được response -> NACK (re-queue), lỗi không thoát khỏi callback"""
+        consumer = make_consumer(worker_count=1)
+        consumer.message_handlers.handle_message.return_value = (True, {"applicationId": 1}, None)
+        consumer.producer.send_direct_response.side_effect = RuntimeError("channel closed")
+        channel = MagicMock()
+        method, properties, body = make_delivery({"applicationId": 1}, delivery_tag=5)
+
+        consumer._on_message_callback(channel, method, properties, body)
+
+        channel.basic_ack.assert_not_called()
+        channel.basic_nack.assert_called_once_with(delivery_tag=5, requeue=True)
@@ -0,0 +1,114 @@
+"""Test cases cho bulk ingestion CLI"""
+import json
+import os
+from unittest.mock import MagicMock
+
+from app.ingest import BulkIngestor, discover_files, load_completed
+
+
+class TestManifest:
+    """Test tìm file và đọc manifest"""
+
+    def test_discover_files_filters_supported_extensions(self, tmp_path):
+        tmp_dir = str(tmp_path)
+        os.makedirs(os.path.join(tmp_dir, "nested"))
+        for name in ["a.pdf", "b.DOCX", "notes.txt", os.path.join("nested", "c.pdf")]:
+            open(os.path.join(tmp_dir, name), "wb").close()
+
+        files = discover_files(tmp_dir)
+
+        assert [os.path.relpath(path, tmp_dir) for path in files] == [
+            "a.pdf", "b.DOCX", os.path.join("nested", "c.pdf")
+        ]
+
+    def test_load_completed_skips_errors_and_partial_lines(self, tmp_path):
+        manifest_path = str(tmp_path / "manifest.jsonl")
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"path": "a.pdf", "status": "ok"}) + "\n")
+            f.write(json.dumps({"path": "b.pdf", "status": "error"}) + "\n")
+            f.write('{"path": "c.pdf", "sta')
+
+        assert load_completed(manifest_path) == {"a.pdf"}
+
+
+class TestBulkIngestor:
+    """Test xử lý một batch"""
+
+    def test_process_batch_batches_embeddings(self):
+        structuring = MagicMock()
+        structuring.get_structured_data.return_value = {"hard_skills": {}}
+        embedding = MagicMock()
+        embedding.get_embeddings_batch.side_effect = lambda texts: [[0.1] * 4 for _ in texts]
+        vector_store = MagicMock()
+        ingestor = BulkIngestor(structuring, embedding, vector_store, structuring_concurrency=2)
+
+        parsed = [
+            {"path": "a.pdf", "sha256": "aa", "text": "CV A"},
+            {"path": "b.pdf", "sha256": "bb", "text": "CV B"},
+            {"path": "c.pdf", "error": "ValueError: broken"},
+        ]
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(2) as pool:
+            entries = ingestor._process_batch(parsed, pool)
+
+        statuses = {entry["path"]: entry["status"] for entry in entries}
+        assert statuses == {"a.pdf": "ok", "b.pdf": "ok", "c.pdf": "error"}
+        # Toàn văn của cả batch được nhúng trong một lần gọi
+        embedding.get_embeddings_batch.assert_called_once_with(["CV A", "CV B"])
+        # Mỗi batch ghi vào vector store một lần
+        vector_store.upsert_documents.assert_called_once()
+        assert len(vector_store.upsert_documents.call_args[0][1]) == 2
+
+    def test_identical_files_in_batch_are_deduplicated(self):
+        """File trùng nội dung chỉ được xử lý một lần, bản trùng ghi skipped trong manifest"""
+        structuring = MagicMock()
+        structuring.get_structured_data.return_value = {"hard_skills": {}}
+        embedding = MagicMock()
+        embedding.get_embeddings_batch.side_effect = lambda texts: [[0.1] * 4 for _ in texts]
+        vector_store = MagicMock()
+        ingestor = BulkIngestor(structuring, embedding, vector_store, structuring_concurrency=2)
+
+        parsed = [
+            {"path": "a.pdf", "sha256": "aa", "text": "CV A"},
+            {"path": "a_copy.pdf", "sha256": "aa", "text": "CV A"},
+            {"path": "b.pdf", "sha256": "bb", "text": "CV B"},
+        ]
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(2) as pool:
+            entries = ingestor._process_batch(parsed, pool)
+
+        by_path = {entry["path"]: entry for entry in entries}
+        assert {path: entry["status"] for path, entry in by_path.items()} == {
+            "a.pdf": "ok", "a_copy.pdf": "skipped", "b.pdf": "ok"
+        }
+        assert by_path["a_copy.pdf"]["duplicate_of"] == "a.pdf"
+        assert by_path["a_copy.pdf"]["doc_id"] == by_path["a.pdf"]["doc_id"]
+        # doc_id trong một lần upsert không trùng nhau
+        doc_ids = vector_store.upsert_documents.call_args[0][1]
+        assert len(doc_ids) == len(set(doc_ids)) == 2
+        assert structuring.get_structured_data.call_count == 2
+
+    def test_invalid_structured_data_is_not_stored(self):
+        """Structured data sai schema chỉ làm lỗi document đó, các document khác vẫn được lưu"""
+        structuring = MagicMock()
+        structuring.get_structured_data.side_effect = lambda text, schema: (
+            {"full_name": ["không", "hợp", "lệ"]} if text == "CV B" else {"full_name": "Nguyễn Văn A"}
+        )
+        embedding = MagicMock()
+        embedding.get_embeddings_batch.side_effect = lambda texts: [[0.1] * 4 for _ in texts]
+        vector_store = MagicMock()
+        ingestor = BulkIngestor(structuring, embedding, vector_store, structuring_concurrency=2)
+
+        parsed = [
+            {"path": "a.pdf", "sha256": "aa", "text": "CV A"},
+            {"path": "b.pdf", "sha256": "bb", "text": "CV B"},
+        ]
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(2) as pool:
+            entries = ingestor._process_batch(parsed, pool)
+
+        by_path = {entry["path"]: entry for entry in entries}
+        assert by_path["a.pdf"]["status"] == "ok"
+        assert (by_path["b.pdf"]["status"], by_path["b.pdf"]["stage"]) == ("error", "structuring")
+        embedding.get_embeddings_batch.assert_called_once_with(["CV A"])
+        assert len(vector_store.upsert_documents.call_args[0][1]) == 1
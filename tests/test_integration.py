@@ -85,7 +85,7 @@ class TestFullWorkflow:
         """Test workflow đầy đủ: Upload CV -> Process JD -> Match"""
         
         # Setup mocks
-        mock_parser.parse_file.return_value = SAMPLE_CV_TEXT
+        mock_parser.parse_bytes.return_value = SAMPLE_CV_TEXT
         mock_structuring.get_structured_data.return_value = {
             "full_name": "Nguyễn Văn A",
             "skills": ["Python", "JavaScript"],
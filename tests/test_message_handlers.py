@@ -0,0 +1,133 @@
+"""Test cases cho RabbitMQ MessageHandlers"""
+import threading
+import pytest
+from unittest.mock import MagicMock, patch
+
+from app.rabbitmq.message_handlers import MessageHandlers
+
+
+SAMPLE_MESSAGE = {
+    "applicationId": 12345,
+    "fileUrl": "https://example.com/cv.pdf",
+    "version": 1,
+    "jobTitle": "Senior Python Developer",
+    "jobDescription": "We are looking for a Python developer",
+}
+
+
+@pytest.fixture
+def handlers():
+    """MessageHandlers với các services đã được mock"""
+    with patch('app.rabbitmq.message_handlers.OpenAI'):
+        instance = MessageHandlers()
+    instance.structuring_service = MagicMock()
+    instance.embedding_service = MagicMock()
+    instance.scoring_service = MagicMock()
+    instance._download_and_parse_cv = MagicMock(return_value="CV text")
+    yield instance
+    instance.branch_executor.shutdown(wait=True)
+
+
+class TestHandleMessage:
+    """Test handle_message"""
+
+    def test_success_runs_both_branches(self, handlers):
+        """CV và JD được xử lý, kết quả chấm điểm được trả về"""
+        handlers.structuring_service.get_structured_data.return_value = {"hard_skills": {}}
+        handlers.embedding_service.get_embedding.return_value = [0.1] * 10
+        handlers.scoring_service.calculate_match_score.return_value = {
+            "total_score": 0.5,
+            "breakdown": {"hard_skills": 0.5}
+        }
+
+        success, response, error_type = handlers.handle_message(dict(SAMPLE_MESSAGE))
+
+        assert success is True
+        assert error_type is None
+        assert response["data"]["matchScore"] == 50.0
+        assert handlers.structuring_service.get_structured_data.call_count == 2
+
+    def test_jd_data_error_cancels_cv_branch(self, handlers):
+        """Lỗi dữ liệu ở nhánh JD được trả về và nhánh CV dừng trước bước tiếp theo"""
+        jd_done = threading.Event()
+        run_jd_branch = handlers._run_jd_branch
+
+        def jd_branch(*args):
+            try:
+                return run_jd_branch(*args)
+            finally:
+                jd_done.set()
+
+        def slow_parse(file_url):
+            # Chờ nhánh JD lỗi xong rồi mới trả về
+            jd_done.wait(timeout=5)
+            return "CV text"
+
+        def structuring(text, schema):
+            if text.startswith("JOB TITLE"):
+                raise RuntimeError("maximum context length exceeded")
+            return {"hard_skills": {}}
+
+        handlers._run_jd_branch = jd_branch
+        handlers._download_and_parse_cv = MagicMock(side_effect=slow_parse)
+        handlers.structuring_service.get_structured_data.side_effect = structuring
+
+        success, response, error_type = handlers.handle_message(dict(SAMPLE_MESSAGE))
+
+        assert success is False
+        assert error_type == "DATA_ERROR"
+        assert "Job description is too long" in response["error"]
+        # Nhánh CV không tiếp tục sang bước structuring
+        assert handlers.structuring_service.get_structured_data.call_count == 1
+        handlers.embedding_service.get_embedding.assert_not_called()
+
+    def test_cv_download_error_is_system_error(self, handlers):
+        """Lỗi download CV vẫn được phân loại SYSTEM_ERROR"""
+        handlers._download_and_parse_cv = MagicMock(return_value=None)
+        handlers.structuring_service.get_structured_data.return_value = {"hard_skills": {}}
+
+        success, response, error_type = handlers.handle_message(dict(SAMPLE_MESSAGE))
+
+        assert success is False
+        assert error_type == "SYSTEM_ERROR"
+        assert "Failed to download CV file" in response["error"]
+
+
+class TestDownloadAndParseCV:
+    """Test _download_and_parse_cv"""
+
+    def test_image_only_pdf_rejected_before_parsing(self):
+        with patch('app.rabbitmq.message_handlers.OpenAI'):
+            instance = MessageHandlers()
+        instance.parser_service = MagicMock()
+        instance.parser_service.get_cached.return_value = None
+        instance.parser_service.detect_pdf_content.return_value = "image"
+        download = MagicMock(content=b"%PDF-1.4", headers={"Content-Type": "application/pdf"})
+
+        try:
+            with patch('app.rabbitmq.message_handlers.requests.get', return_value=download):
+                result = instance._download_and_parse_cv("https://example.com/cv.pdf")
+        finally:
+            instance.branch_executor.shutdown(wait=True)
+
+        assert result[0] == "PARSE_ERROR"
+        instance.parser_service.parse_document.assert_not_called()
+
+    def test_cached_pdf_skips_preflight(self):
+        from app.services.parser_service import ParseResult
+
+        with patch('app.rabbitmq.message_handlers.OpenAI'):
+            instance = MessageHandlers()
+        instance.parser_service = MagicMock()
+        instance.parser_service.get_cached.return_value = ParseResult(text="CV text", backend="pymupdf")
+        download = MagicMock(content=b"%PDF-1.4", headers={"Content-Type": "application/pdf"})
+
+        try:
+            with patch('app.rabbitmq.message_handlers.requests.get', return_value=download):
+                result = instance._download_and_parse_cv("https://example.com/cv.pdf")
+        finally:
+            instance.branch_executor.shutdown(wait=True)
+
+        assert result == "CV text"
+        instance.parser_service.detect_pdf_content.assert_not_called()
+        instance.parser_service.parse_document.assert_not_called()
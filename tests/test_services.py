@@ -1,19 +1,40 @@
 """Test cases cho các services"""
 import pytest
 import os
+import io
 import tempfile
 from unittest.mock import Mock, MagicMock, patch
 import json
 
-from app.services.parser_service import ParserService
+from app.services.parser_service import ParserService, _PdfDocument
 from app.services.structuring_service import StructuringService
-from app.services.embedding_service import EmbeddingService
+from app.services.embedding_service import EmbeddingService, EmbeddingCache
+from app.services.cache import SQLiteCache, SingleFlightCache
 from app.services.vector_store import VectorStoreService
 from app.services.scoring_service import ScoringService
 from core.schemas import StructuredData
 from tests.test_data import SAMPLE_CV_TEXT, SAMPLE_JD_TEXT
 
 
+class FakePdfDocument(_PdfDocument):
+    """PDF backend giả: test ghi đè pages / page_text / page_layers khi cần"""
+    name = "fake"
+    pages = 1
+    
+    def __init__(self, data):
+        pass
+    
+    @property
+    def page_count(self):
+        return self.pages
+    
+    def page_text(self, index):
+        return ""
+    
+    def page_layers(self, index):
+        return (0, 0)
+
+
 class TestParserService:
     """Test ParserService"""
     
@@ -48,6 +69,185 @@ class TestParserService:
         
         with pytest.raises(FileNotFoundError):
             parser.parse_file("nonexistent_file.pdf")
+    
+    def test_parse_bytes_docx(self):
+        """Test parse DOCX trực tiếp từ bytes (không ghi file tạm)"""
+        from docx import Document
+        
+        document = Document()
+        document.add_paragraph("  Nguyễn Văn A  ")
+        document.add_paragraph("Python Developer")
+        buffer = io.BytesIO()
+        document.save(buffer)
+        
+        parser = ParserService()
+        text = parser.parse_bytes(buffer.getvalue(), "docx")
+        
+        assert text == "Nguyễn Văn A\nPython Developer"
+    
+    def test_pdf_backend_falls_back_to_pdfplumber(self):
+        """Backend native không lấy được text -> fallback về pdfplumber"""
+        from app.services import parser_service as parser_module
+        
+        parser = ParserService(pdf_backend="pymupdf")
+        calls = []
+        
+        def fake_extract(backend, data):
+            calls.append(backend)
+            text = "" if backend == "pymupdf" else "Nguyễn Văn A"
+            return parser_module.ParseResult(text=text, backend=backend, pages_total=1, pages_parsed=1)
+        
+        with patch.object(parser_module._PyMuPDFDocument, "available", return_value=True), \
+             patch.object(parser, "_extract_pdf", side_effect=fake_extract):
+            result = parser.parse_document(b"%PDF-1.4", ".pdf")
+        
+        assert calls == ["pymupdf", "pdfplumber"]
+        assert result.backend == "pdfplumber"
+        assert result.text == "Nguyễn Văn A"
+    
+    def test_large_pdf_parsed_in_page_order_across_workers(self):
+        """PDF lớn được chia theo dải trang (mọi backend, kể cả pdfplumber) và ghép lại đúng thứ tự"""
+        from concurrent.futures import ThreadPoolExecutor
+        from app.services import parser_service as parser_module
+        
+        class FakeDocument(FakePdfDocument):
+            pages = 5
+            
+            def page_text(self, index):
+                return f"Page {index}"
+        
+        parser = ParserService(pdf_backend="pdfplumber", parallel_workers=2, parallel_min_pages=3)
+        
+        with patch.dict(parser_module.PDF_BACKENDS, {"pdfplumber": FakeDocument}), \
+             patch.object(parser, "_get_process_pool", return_value=ThreadPoolExecutor(2)) as get_pool:
+            result = parser._extract_pdf("pdfplumber", b"%PDF-1.4")
+            get_pool.assert_called_once()
+            
+            # Dưới ngưỡng parallel_min_pages: parse tuần tự
+            parser.parallel_min_pages = 10
+            sequential = parser._extract_pdf("pdfplumber", b"%PDF-1.4")
+            get_pool.assert_called_once()
+        
+        assert result.text == "Page 0\nPage 1\nPage 2\nPage 3\nPage 4"
+        assert result.pages_parsed == 5
+        assert sequential.text == result.text
+    
+    def test_budget_stops_extraction_early(self):
+        """Dừng parse khi đủ budget, trả về text đã cắt và cờ truncated"""
+        from app.services import parser_service as parser_module
+        
+        pages_read = []
+        
+        class FakeDocument(FakePdfDocument):
+            pages = 10
+            
+            def page_text(self, index):
+                pages_read.append(index)
+                return "x" * 30
+        
+        parser = ParserService(pdf_backend="pdfplumber")
+        
+        with patch.dict(parser_module.PDF_BACKENDS, {"fake": FakeDocument}):
+            result = parser._extract_pdf("fake", b"%PDF-1.4", budget=50)
+        
+        assert pages_read == [0, 1]
+        assert len(result.text) <= 50
+        assert result.truncated is True
+        assert (result.pages_parsed, result.pages_total) == (2, 10)
+    
+    @pytest.mark.parametrize("layers, page_count, expected", [
+        ([(0, 1), (0, 1), (0, 1)], 3, "image"),
+        # Trang bìa scan, text ở trang sau: không được kết luận là PDF ảnh
+        ([(0, 1), (0, 1), (0, 1), (500, 0)], 4, "unknown"),
+        ([(500, 0), (0, 2), (300, 1)], 40, "mixed"),
+        ([(500, 0), (800, 1), (300, 0)], 40, "text"),
+    ])
+    def test_detect_pdf_content(self, layers, page_count, expected):
+        """Preflight phân loại PDF theo text layer và ảnh của các trang đầu"""
+        from app.services import parser_service as parser_module
+        
+        class FakeDocument(FakePdfDocument):
+            pages = page_count
+            
+            def page_layers(self, index):
+                return layers[index]
+        
+        parser = ParserService(pdf_backend="pdfplumber")
+        
+        with patch.dict(parser_module.PDF_BACKENDS, {"pdfplumber": FakeDocument}):
+            assert parser.detect_pdf_content(b"%PDF-1.4", max_pages=3) == expected
+    
+    def test_incomplete_pdf_backend_rejected(self):
+        """Backend thiếu method bị từ chối ngay khi khởi tạo"""
+        class IncompleteDocument(_PdfDocument):
+            def __init__(self, data):
+                pass
+            
+            @property
+            def page_count(self):
+                return 1
+        
+        with pytest.raises(TypeError):
+            IncompleteDocument(b"%PDF-1.4")
+    
+    def test_char_budget_from_tokens(self):
+        """Quy đổi budget token sang ký tự"""
+        assert ParserService._char_budget(None, None) is None
+        assert ParserService._char_budget(None, 100) == 200
+        assert ParserService._char_budget(150, 100) == 150
+    
+    def test_max_budget_vietnamese_text_fits_embedding_limit(self):
+        """Text tiếng Việt cắt theo PARSER_MAX_TOKENS vẫn dưới giới hạn 8191 token của model embedding"""
+        tiktoken = pytest.importorskip("tiktoken")
+        from core.config import settings
+        
+        sample = (
+            "Kỹ sư phần mềm với 5 năm kinh nghiệm phát triển hệ thống xử lý dữ liệu lớn. "
+            "Thành thạo Python, FastAPI, PostgreSQL; từng dẫn dắt nhóm 6 người triển khai "
+            "nền tảng tuyển dụng, tối ưu truy vấn giúp giảm 40% thời gian phản hồi.\n"
+        )
+        budget = ParserService._char_budget(None, settings.PARSER_MAX_TOKENS)
+        text = (sample * (budget // len(sample) + 1))[:budget]
+        
+        encoding = tiktoken.get_encoding("cl100k_base")
+        assert len(encoding.encode(text)) < 8191
+    
+    def test_parsed_text_cache_by_content_hash(self, tmp_path):
+        """File giống hệt nhau chỉ parse một lần, cache đĩa dùng lại được sau khi khởi động lại"""
+        from app.services.parser_service import ParseResult
+        
+        db_path = str(tmp_path / "parsed_text.sqlite3")
+        parsed = ParseResult(text="Nguyễn Văn A", backend="python-docx")
+        
+        parser = ParserService(cache=SQLiteCache(db_path), memory_items=16)
+        assert parser.get_cached(b"same file", ".docx") is None
+        with patch.object(parser, "_parse_docx", return_value=parsed) as parse_docx:
+            assert parser.parse_bytes(b"same file", ".docx") == "Nguyễn Văn A"
+            assert parser.parse_bytes(b"same file", ".docx") == "Nguyễn Văn A"
+        
+        assert parse_docx.call_count == 1
+        assert parser.get_cache_stats()["hits"] == 1
+        
+        restarted = ParserService(cache=SQLiteCache(db_path))
+        with patch.object(restarted, "_parse_docx") as parse_docx:
+            result = restarted.parse_document(b"same file", "docx")
+        
+        parse_docx.assert_not_called()
+        assert result == parsed
+        assert restarted.get_cached(b"same file", ".docx") == parsed
+        assert restarted.get_cached(b"same file", ".docx", max_chars=5) is None
+    
+    def test_invalid_pdf_backend(self):
+        """Backend không hợp lệ"""
+        with pytest.raises(ValueError, match="PDF backend không hợp lệ"):
+            ParserService(pdf_backend="unknown")
+    
+    def test_parse_bytes_invalid_extension(self):
+        """Test parse bytes với định dạng không hợp lệ"""
+        parser = ParserService()
+        
+        with pytest.raises(ValueError, match="Định dạng file không được hỗ trợ"):
+            parser.parse_bytes(b"Test content", ".txt")
 
 
 class TestStructuringService:
@@ -97,6 +297,28 @@ class TestStructuringService:
         
         with pytest.raises(ValueError, match="Không thể parse JSON"):
             service.get_structured_data(SAMPLE_CV_TEXT, StructuredData)
+    
+    def test_get_structured_data_uses_cache(self, tmp_path):
+        """Text giống nhau (khác khoảng trắng) chỉ gọi LLM một lần, trừ khi bypass cache"""
+        mock_client = MagicMock()
+        mock_response = MagicMock()
+        mock_response.choices = [MagicMock()]
+        mock_response.choices[0].message.content = json.dumps({"skills": ["Python"]})
+        mock_client.chat.completions.create.return_value = mock_response
+        
+        cache = SQLiteCache(str(tmp_path / "structuring.sqlite3"), ttl_seconds=3600)
+        service = StructuringService(mock_client, cache=cache)
+        
+        first = service.get_structured_data(SAMPLE_CV_TEXT, StructuredData)
+        second = service.get_structured_data("  " + SAMPLE_CV_TEXT.replace("\n", "\n\n"), StructuredData)
+        
+        assert first == second == {"skills": ["Python"]}
+        assert mock_client.chat.completions.create.call_count == 1
+        assert service.cache_stats.as_dict()["hits"] == 1
+        
+        service.get_structured_data(SAMPLE_CV_TEXT, StructuredData, use_cache=False)
+        assert mock_client.chat.completions.create.call_count == 2
+        cache.close()
 
 
 class TestEmbeddingService:
@@ -151,6 +373,223 @@ class TestEmbeddingService:
             input=texts
         )
 
+    def test_embeddings_batch_uses_cache(self, tmp_path):
+        """Chỉ các text chưa cache (đã loại trùng) mới được gửi lên API"""
+        mock_client = MagicMock()
+        mock_client.embeddings.create.side_effect = lambda model, input: MagicMock(
+            data=[MagicMock(embedding=[float(len(text)), 0.5]) for text in input]
+        )
+
+        cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"))
+        service = EmbeddingService(mock_client, cache=cache)
+
+        first = service.get_embeddings_batch(["Python", "Docker", "Python"])
+        mock_client.embeddings.create.assert_called_once_with(
+            model="text-embedding-3-small",
+            input=["Python", "Docker"]
+        )
+        assert first[0] == first[2] == [6.0, 0.5]
+
+        second = service.get_embeddings_batch(["Docker", "Git"])
+        assert mock_client.embeddings.create.call_count == 2
+        assert mock_client.embeddings.create.call_args.kwargs["input"] == ["Git"]
+        assert second == [[6.0, 0.5], [3.0, 0.5]]
+
+        assert service.get_embedding("Python") == [6.0, 0.5]
+        assert mock_client.embeddings.create.call_count == 2
+        assert cache.get_stats()["hits"] == 2
+        cache.disk.close()
+
+    def test_embedding_cache_persists_to_disk(self, tmp_path):
+        """Vector được đọc lại từ SQLite khi cache trong bộ nhớ trống"""
+        db_path = str(tmp_path / "embeddings.sqlite3")
+
+        cache = EmbeddingCache(db_path)
+        key = cache.make_key("text-embedding-3-small", "Team leadership")
+        cache.set_many({key: [0.25, -0.5]})
+        cache.disk.close()
+
+        reopened = EmbeddingCache(db_path)
+        assert reopened.get_many([key]) == {key: [0.25, -0.5]}
+        assert reopened.get_stats()["misses"] == 0
+        reopened.disk.close()
+
+
+class TestSingleFlightCache:
+    """Test SingleFlightCache (JD memoization trong RabbitMQ handler)"""
+    
+    def test_concurrent_duplicates_compute_once(self):
+        """Các request trùng key chạy đồng thời chỉ tính một lần"""
+        import threading
+        import time
+        
+        memo = SingleFlightCache(max_items=2)
+        calls = []
+        
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return {"jd": "structured"}
+        
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(memo.get_or_compute("jd", compute)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert len(calls) == 1
+        assert results == [{"jd": "structured"}] * 5
+        assert memo.get_or_compute("jd", compute) == {"jd": "structured"}
+        assert len(calls) == 1
+    
+    def test_exceptions_are_not_cached(self):
+        """Lỗi được trả về cho caller nhưng lần gọi sau sẽ tính lại"""
+        memo = SingleFlightCache()
+        
+        def failing():
+            raise RuntimeError("maximum context length")
+        
+        with pytest.raises(RuntimeError, match="maximum context length"):
+            memo.get_or_compute("jd", failing)
+        assert memo.get_or_compute("jd", lambda: "ok") == "ok"
+
+
+class TestMetadataFilters:
+    """Test trích metadata lọc từ structured data"""
+    
+    def test_flatten_filter_metadata(self):
+        from app.services.metadata_filters import flatten_filter_metadata
+        
+        metadata = flatten_filter_metadata({
+            "work_experience": {"total_years": 4},
+            "education_training": {"degrees": ["Cử nhân Công nghệ thông tin", "Master of Science"]},
+            "additional_factors": {
+                "languages": ["English (IELTS 7.0)", "Tiếng Việt"],
+                "relocation_willingness": True,
+                "travel_willingness": None
+            }
+        })
+        
+        assert metadata == {
+            "total_years": 4.0,
+            "degree_level": 3,
+            "lang_en": True,
+            "lang_vi": True,
+            "relocation_willingness": True
+        }
+
+
+class TestEmbeddingMatrix:
+    """Test EmbeddingMatrix (snapshot embeddings memory-mapped)"""
+    
+    def test_upsert_top_k_and_reload(self, tmp_path):
+        """Ghi mới, ghi đè, tự tăng capacity và đọc lại từ đĩa"""
+        import numpy as np
+        from app.services.embedding_matrix import EmbeddingMatrix
+        
+        prefix = str(tmp_path / "cv_collection")
+        matrix = EmbeddingMatrix(prefix)
+        matrix.INITIAL_CAPACITY = 2
+        
+        matrix.upsert(["a", "b"], [[1.0, 0.0], [0.0, 1.0]])
+        matrix.upsert(["c", "a"], [[0.6, 0.8], [0.0, -1.0]])  # "a" bị ghi đè, capacity tăng
+        
+        assert len(matrix) == 3
+        assert [doc_id for doc_id, _ in matrix.top_k([0.0, 2.0], k=2)] == ["b", "c"]
+        
+        reopened = EmbeddingMatrix(prefix)
+        ids, vectors = reopened.snapshot()
+        assert ids == ["a", "b", "c"]
+        assert np.allclose(vectors[0], [0.0, -1.0])
+        assert reopened.top_k([1.0, 0.0], k=1)[0][0] == "c"
+    
+    def test_writers_sharing_files_do_not_overwrite_rows(self, tmp_path):
+        """Hai instance (như hai process) ghi xen kẽ: mỗi lần ghi đọc lại snapshot trước khi nối hàng"""
+        import numpy as np
+        from app.services.embedding_matrix import EmbeddingMatrix
+        
+        prefix = str(tmp_path / "cv_collection")
+        api_writer = EmbeddingMatrix(prefix)
+        ingest_writer = EmbeddingMatrix(prefix)
+        
+        api_writer.upsert(["a"], [[1.0, 0.0]])
+        ingest_writer.upsert(["b"], [[0.0, 1.0]])
+        api_writer.upsert(["c"], [[0.6, 0.8]])
+        
+        ids, vectors = EmbeddingMatrix(prefix).snapshot()
+        assert ids == ["a", "b", "c"]
+        assert np.allclose(vectors, [[1.0, 0.0], [0.0, 1.0], [0.6, 0.8]])
+    
+    def test_backfill_only_appends_missing_rows(self, tmp_path):
+        """Matrix đủ hàng không đọc lại nguồn; matrix thiếu hàng được nối thêm, không bị xóa"""
+        from app.services.embedding_matrix import EmbeddingMatrix
+        
+        matrix = EmbeddingMatrix(str(tmp_path / "cv_collection"))
+        matrix.upsert(["a"], [[1.0, 0.0]])
+        
+        def pages():
+            raise AssertionError("không được đọc nguồn khi matrix đủ hàng")
+            yield
+        
+        assert matrix.backfill(1, pages()) is False
+        assert matrix.backfill(2, [(["a", "b"], [[1.0, 0.0], [0.0, 1.0]])]) is True
+        
+        ids, _ = matrix.snapshot()
+        assert ids == ["a", "b"]
+
+
+class TestJobStore:
+    """Test JobStore (trạng thái job nền)"""
+    
+    def test_lifecycle_and_requeue(self, tmp_path):
+        """Job chưa xong được xếp lại, job xong không còn giữ payload"""
+        from app.services.job_store import JobStore
+        
+        db_path = str(tmp_path / "jobs.sqlite3")
+        store = JobStore(db_path)
+        done_id = store.create_job("cv", b"done", filename="a.pdf")
+        running_id = store.create_job("cv", b"running", filename="b.pdf", callback_url="http://hook")
+        
+        assert store.claim_job(done_id, "host:1")
+        store.mark_succeeded(done_id, {"doc_id": "cv_1"}, {"parse": 1.5})
+        assert store.claim_job(running_id, "host:1")
+        store.close()
+        
+        # Khởi động lại: job đang chạy dở (lease đã hết hạn) được đưa về queued
+        reopened = JobStore(db_path)
+        assert reopened.requeue_unfinished(lease_seconds=0) == [running_id]
+        assert reopened.get_job(running_id)["status"] == "queued"
+        assert reopened.get_payload(running_id) == b"running"
+        
+        done = reopened.get_job(done_id)
+        assert done["status"] == "succeeded"
+        assert done["result"] == {"doc_id": "cv_1"}
+        assert done["timings"] == {"parse": 1.5}
+        assert reopened.get_payload(done_id) is None
+    
+    def test_claim_and_lease(self, tmp_path):
+        """Job chỉ được một worker nhận; job của worker còn gia hạn lease không bị xếp lại"""
+        from app.services.job_store import JobStore
+        
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        job_id = store.create_job("cv", b"data")
+        
+        assert store.claim_job(job_id, "host:1")
+        assert not store.claim_job(job_id, "host:2")
+        
+        # Worker khác khởi động: lease còn hạn -> job vẫn running, không chạy lại
+        assert store.requeue_unfinished(lease_seconds=60) == []
+        assert store.get_job(job_id)["status"] == "running"
+        
+        store.renew_leases([job_id], "host:1")
+        assert store.requeue_unfinished(lease_seconds=0) == [job_id]
+        assert store.claim_job(job_id, "host:2")
+        store.close()
+
 
 class TestVectorStoreService:
     """Test VectorStoreService"""
@@ -219,6 +658,69 @@ class TestVectorStoreService:
                 except PermissionError:
                     time.sleep(0.2)
     
+    @pytest.fixture
+    def vector_store(self, tmp_path):
+        """VectorStoreService trên thư mục tạm (pytest tự dọn)"""
+        service = VectorStoreService(persist_directory=str(tmp_path))
+        yield service
+        service.document_store.close()
+    
+    def test_upsert_and_get_documents_by_ids(self, vector_store):
+        """Test ghi nhiều document, ghi đè doc_id đã có và lấy nhiều document một lần"""
+        vector_store.add_documents(
+            "cv_collection",
+            ["cv_1", "cv_2"],
+            [[0.1] * 8, [0.2] * 8],
+            [{"name": "A"}, {"name": "B"}]
+        )
+        # Ingest lại cùng doc_id không lỗi mà ghi đè
+        vector_store.add_document("cv_collection", "cv_2", [0.3] * 8, {"name": "B2"})
+        
+        documents = vector_store.get_documents_by_ids("cv_collection", ["cv_1", "cv_2", "missing"])
+        
+        assert set(documents) == {"cv_1", "cv_2"}
+        assert documents["cv_2"]["metadata"] == {"name": "B2"}
+        assert vector_store.cv_collection.count() == 2
+    
+    def test_search_embeddings_backfills_matrix(self, vector_store):
+        """Document ghi thẳng vào ChromaDB (chưa có trong matrix) vẫn được brute-force search tìm thấy"""
+        vector_store.add_document("cv_collection", "cv_a", [1.0] + [0.0] * 7, {"name": "A"})
+        vector_store.cv_collection.add(
+            ids=["cv_legacy"], embeddings=[[0.0, 1.0] + [0.0] * 6], metadatas=[{"name": "Legacy"}]
+        )
+        
+        hits = vector_store.search_embeddings("cv_collection", [0.0, 1.0] + [0.0] * 6, k=2)
+        
+        assert [hit["id"] for hit in hits] == ["cv_legacy", "cv_a"]
+        assert hits[0]["distance"] == pytest.approx(0.0, abs=1e-6)
+        assert hits[1]["metadata"] == {"name": "A"}
+    
+    def test_structured_data_stored_outside_chroma_metadata(self, vector_store):
+        """Structured data nằm trong DocumentStore, metadata ChromaDB không chứa PII; đọc được document cũ"""
+        metadata = {
+            "full_name": "Nguyễn Văn A",
+            "email": "a@example.com",
+            "phone": "0900000000",
+            "hard_skills": {"programming_languages": ["Python"]}
+        }
+        
+        vector_store.add_document("cv_collection", "cv_new", [0.1] * 8, metadata)
+        raw = vector_store.cv_collection.get(ids=["cv_new"], include=["metadatas"])["metadatas"][0]
+        assert "hard_skills" not in raw
+        assert not {"full_name", "email", "phone"} & set(raw)
+        
+        # Document cũ: list/dict lưu dạng JSON string trong metadata ChromaDB
+        vector_store.cv_collection.add(
+            ids=["cv_legacy"],
+            embeddings=[[0.2] * 8],
+            metadatas=[{"full_name": "B", "hard_skills": json.dumps({"programming_languages": ["Go"]})}]
+        )
+        
+        documents = vector_store.get_documents_by_ids("cv_collection", ["cv_new", "cv_legacy"], include_embeddings=False)
+        
+        assert documents["cv_new"]["metadata"] == metadata
+        assert documents["cv_legacy"]["metadata"]["hard_skills"] == {"programming_languages": ["Go"]}
+    
     def test_get_collection_invalid_name(self):
         """Test với collection name không hợp lệ"""
         import shutil
@@ -334,3 +836,89 @@ class TestScoringService:
         with pytest.raises(ValueError, match="Structured data must include new schema fields"):
             scoring_service.calculate_match_score(cv_data, jd_data)
 
+
+    def test_calculate_match_score_single_embedding_call(self):
+        """All semantic categories share one deduplicated embedding batch."""
+        mock_embedding_service = MagicMock()
+        mock_embedding_service.get_embeddings_batch.side_effect = (
+            lambda texts: [[float(len(text)), 1.0] for text in texts]
+        )
+
+        scoring_service = ScoringService(mock_embedding_service)
+        payload = self._build_structured_payload()
+
+        scoring_service.calculate_match_score(
+            {"embedding": [0.1] * 10, "structured_json": payload},
+            {"embedding": [0.2] * 10, "structured_json": payload},
+        )
+
+        mock_embedding_service.get_embeddings_batch.assert_called_once()
+        texts = mock_embedding_service.get_embeddings_batch.call_args.args[0]
+        assert len(texts) == len(set(texts))
+        assert {"Python", "Senior Software Engineer", "Design APIs",
+                "Fast learner", "Computer Science"} <= set(texts)
+
+    def test_score_many_matches_single_pair(self):
+        """Vectorized batch scoring matches the single-pair path."""
+        import numpy as np
+
+        def fake_embeddings(texts):
+            vectors = []
+            for text in texts:
+                rng = np.random.RandomState(sum(ord(ch) for ch in text) % (2 ** 31))
+                vectors.append(rng.normal(size=16).tolist())
+            return vectors
+
+        mock_embedding_service = MagicMock()
+        mock_embedding_service.get_embeddings_batch.side_effect = fake_embeddings
+        scoring_service = ScoringService(mock_embedding_service)
+
+        jd_payload = self._build_structured_payload()
+        cv_full = self._build_structured_payload()
+        cv_partial = self._build_structured_payload()
+        cv_partial["hard_skills"] = {"programming_languages": ["Go"], "tools_software": ["Kubernetes"]}
+        cv_partial["soft_skills"] = {}
+        cv_partial["education_training"]["majors"] = ["Mathematics", "Physics"]
+        cv_empty = {"hard_skills": {}}
+
+        jd_data = {"embedding": [0.2] * 10, "structured_json": jd_payload}
+        cv_list = [
+            {"embedding": [0.1] * 10, "structured_json": cv}
+            for cv in (cv_full, cv_partial, cv_empty)
+        ]
+
+        batch_results = scoring_service.score_many(jd_data, cv_list)
+        assert mock_embedding_service.get_embeddings_batch.call_count == 1
+
+        for cv_data, batch_result in zip(cv_list, batch_results):
+            single_result = scoring_service.calculate_match_score(cv_data, jd_data)
+            assert batch_result["total_score"] == pytest.approx(single_result["total_score"], abs=1e-6)
+            for category, score in single_result["breakdown"].items():
+                assert batch_result["breakdown"][category] == pytest.approx(score, abs=1e-9)
+
+    def test_match_with_scoring_profiles_needs_no_embedding_calls(self):
+        """Stored scoring profiles cover every semantic field, so no API call is made."""
+        from app.services.scoring_profile import (
+            build_scoring_profile, serialize_profile, deserialize_profile
+        )
+
+        profile_embedding_service = MagicMock()
+        profile_embedding_service.get_embeddings_batch.side_effect = (
+            lambda texts: [[float(len(text)), 1.0] for text in texts]
+        )
+        payload = self._build_structured_payload()
+        profile = deserialize_profile(
+            serialize_profile(build_scoring_profile(payload, profile_embedding_service))
+        )
+        assert profile["hard_skills.programming_languages"]["texts"] == ["Python", "JavaScript"]
+        assert profile["hard_skills.programming_languages"]["vectors"].shape == (2, 2)
+
+        mock_embedding_service = MagicMock()
+        scoring_service = ScoringService(mock_embedding_service)
+        result = scoring_service.calculate_match_score(
+            {"embedding": [0.1] * 10, "structured_json": payload, "scoring_profile": profile},
+            {"embedding": [0.2] * 10, "structured_json": payload, "scoring_profile": profile},
+        )
+
+        mock_embedding_service.get_embeddings_batch.assert_not_called()
+        assert result["breakdown"]["hard_skills"] == pytest.approx(1.0)